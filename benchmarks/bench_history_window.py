@@ -0,0 +1,49 @@
+import os
+import sys
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from evaluator import EVALUATION_SUITE
+from ollama_launch_2_1 import ConversationWindow, EstigiaCore, model
+
+# ==========================================
+# BENCHMARK: VENTANA DE HISTORIAL Y REUTILIZACIÓN DE KV-CACHE (requiere Ollama)
+# ==========================================
+# Mantiene una conversación larga con dos políticas de desalojo:
+#   - "deslizante": low_water ~ 1.0, se recorta un poco en cada turno (como el antiguo max_history)
+#   - "por bloques": low_water = 0.5, se recorta mucho pero muy de vez en cuando
+# Para cada turno se registra el TTFT y cuántos tokens del prompt tuvo que evaluar Ollama
+# (prompt_eval_count): si el prefijo se reutiliza, solo se evalúan los tokens nuevos.
+
+MAX_CONTEXT_TOKENS = 768
+ROUNDS = 2
+
+
+def run(policy, low_water):
+    core = EstigiaCore(model_name=model, max_context_tokens=MAX_CONTEXT_TOKENS)
+    core.set_language("1")
+    core.history = ConversationWindow(core.ui["sys"], max_tokens=MAX_CONTEXT_TOKENS, low_water=low_water)
+
+    questions = [q for qs in EVALUATION_SUITE.values() for q in qs] * ROUNDS
+    for q in questions:
+        core.chat(q)
+
+    stats = core.turn_stats
+    print(f"\n--- Política: {policy} (low_water={low_water}) ---")
+    print(f"{'Turno':>5} {'Prompt est.':>12} {'Evaluados':>10} {'Desalojo':>9} {'TTFT (s)':>9}")
+    for i, st in enumerate(stats, 1):
+        print(f"{i:>5} {st['prompt_tokens_est']:>12} {str(st['prompt_eval_count']):>10} "
+              f"{'sí' if st['evicted'] else '':>9} {st['ttft']:>9.2f}")
+    ttfts = [st["ttft"] for st in stats]
+    print(f"TTFT medio: {statistics.mean(ttfts):.2f}s | mediana: {statistics.median(ttfts):.2f}s | "
+          f"desalojos: {sum(st['evicted'] for st in stats)}")
+
+
+def main():
+    run("deslizante", 0.95)
+    run("por bloques", 0.5)
+
+
+if __name__ == "__main__":
+    main()
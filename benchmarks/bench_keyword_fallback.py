@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ollama_launch_2_1 import TELEMETRY_KEYWORDS, KeywordMatcher
+
+# ==========================================
+# MICRO-BENCHMARK: FALLBACK POR PALABRAS CLAVE
+# ==========================================
+# Compara la cadena original de `any(w in p for w in [...])` con la regex
+# compilada de KeywordMatcher sobre prompts cortos y textos largos pegados.
+#
+# Nota: en CPython `str.__contains__` es una búsqueda en C muy rápida, así que en
+# textos muy largos la cadena original sigue siendo más rápida que un único
+# recorrido con `re`. La regex gana en los prompts cortos (el caso habitual en
+# el quiosco) y, sobre todo, deja de mandar chat a telemetría por error.
+
+PARAGRAPH = (
+    "Hola Estigia, esta mañana he leído un artículo larguísimo sobre la misión y quería "
+    "contarte lo que más me ha gustado: la parte en la que explican cómo se diseñan los "
+    "paneles solares y cómo se prueba todo en la cámara de vacío antes del lanzamiento. "
+)
+
+PROMPTS = {
+    "corto_chat": "¿Cuál es tu película favorita?",
+    "corto_telemetria": "What is your mean anomaly right now?",
+    "largo_chat_2KB": PARAGRAPH * 8,
+    "largo_chat_16KB": PARAGRAPH * 64,
+    "largo_con_intent_16KB": PARAGRAPH * 64 + " Por cierto, ¿cuál es tu inclinación?",
+}
+
+# Frases de chat que la cadena original enviaba por error a telemetría
+FALSE_POSITIVES = [
+    "¿Qué vas a hacer mañana?",          # "ma" dentro de "mañana"
+    "Do you like mathematics?",          # "ma" dentro de "mathematics"
+    "Show me a photo of Earth",          # "hot" dentro de "photo"
+    "What time=now?",                    # "e=" dentro de "time="
+    "I love chemistry",                  # control: chat sin palabras clave
+]
+
+
+def legacy_predict(prompt):
+    p = prompt.lower()
+    for category, words in TELEMETRY_KEYWORDS:
+        if any(w in p for w in list(words)):
+            return category
+    return "GENERAL_CHAT"
+
+
+def bench(fn, text, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(text)
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    matcher = KeywordMatcher()
+
+    def compiled_predict(prompt):
+        category = matcher.match(prompt)
+        return category if category is not None else "GENERAL_CHAT"
+
+    print(f"{'Prompt':<24} {'Bytes':>7} {'Cadena p50 (µs)':>16} {'Regex p50 (µs)':>15} {'Mejora':>8}")
+    print("-" * 74)
+    for name, text in PROMPTS.items():
+        repeat = 2000 if len(text) < 1000 else 300
+        legacy_p50, _ = bench(legacy_predict, text, repeat)
+        compiled_p50, _ = bench(compiled_predict, text, repeat)
+        print(f"{name:<24} {len(text.encode('utf-8')):>7} {legacy_p50 * 1e6:>16.1f} "
+              f"{compiled_p50 * 1e6:>15.1f} {legacy_p50 / compiled_p50:>7.1f}x")
+
+    print("\nRutado de frases de chat (cadena original -> regex compilada):")
+    for text in FALSE_POSITIVES:
+        print(f"  {text!r:<34} {legacy_predict(text):<24} -> {compiled_predict(text)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import os
+import sys
+import json
+import random
+import subprocess
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from benchmarks.bench_predict_batch import CORPUS
+from evaluator import EVALUATION_SUITE
+from linear_scorer import DEFAULT_LINEAR_PATH, DEFAULT_MODEL_PATH, LinearIntentScorer
+
+# ==========================================
+# PARIDAD Y ARRANQUE: joblib/scikit-learn vs exportación lineal (NumPy)
+# ==========================================
+# 1. Comprueba que LinearIntentScorer da exactamente las mismas etiquetas que
+#    classifier.predict sobre un corpus de prueba.
+# 2. Mide tiempo de arranque y memoria residente (RSS) de cada ruta en
+#    un proceso Python limpio.
+
+STARTUP_SNIPPETS = {
+    "joblib + scikit-learn": (
+        "import warnings, joblib\n"
+        "warnings.simplefilter('ignore')\n"
+        f"clf = joblib.load({DEFAULT_MODEL_PATH!r})\n"
+    ),
+    "exportación lineal": (
+        "from linear_scorer import LinearIntentScorer\n"
+        f"clf = LinearIntentScorer({DEFAULT_LINEAR_PATH!r})\n"
+    ),
+}
+
+MEASURE_TEMPLATE = """
+import time, resource
+t0 = time.perf_counter()
+{snippet}
+t_load = time.perf_counter() - t0
+t0 = time.perf_counter()
+clf.predict(["what is your temperature?"])
+t_first = time.perf_counter() - t0
+try:
+    # RSS actual; ru_maxrss puede heredar el pico del proceso padre tras fork+exec
+    with open("/proc/self/status") as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+except OSError:
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+import json; print(json.dumps({{"load": t_load, "first_predict": t_first, "rss_kb": rss_kb}}))
+"""
+
+
+def build_corpus(n_random=2000, seed=0):
+    corpus = list(CORPUS)
+    for questions in EVALUATION_SUITE.values():
+        corpus.extend(questions)
+
+    # Frases sintéticas mezclando palabras del propio corpus
+    rng = random.Random(seed)
+    words = " ".join(corpus).split()
+    for _ in range(n_random):
+        corpus.append(" ".join(rng.choice(words) for _ in range(rng.randint(1, 25))))
+    corpus.extend(["", "?!", "12345", "TEMPERATURA TEMPERATURA altitud"])
+    return corpus
+
+
+def check_parity():
+    import joblib
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        pipeline = joblib.load(DEFAULT_MODEL_PATH)
+    scorer = LinearIntentScorer(DEFAULT_LINEAR_PATH, source_path=DEFAULT_MODEL_PATH)
+
+    corpus = build_corpus()
+    expected = list(pipeline.predict(corpus))
+    got = list(scorer.predict(corpus))
+    mismatches = [(t, e, g) for t, e, g in zip(corpus, expected, got) if e != g]
+    max_diff = abs(pipeline.decision_function(corpus) - scorer.decision_function(corpus)).max()
+
+    print(f"Paridad de etiquetas: {len(corpus) - len(mismatches)}/{len(corpus)} idénticas "
+          f"(máx. diferencia en decision_function: {max_diff:.2e})")
+    for text, e, g in mismatches[:10]:
+        print(f"  ❌ {text!r}: sklearn={e} numpy={g}")
+    return not mismatches
+
+
+def measure_startup(repeat=3):
+    print(f"\n{'Ruta':<24} {'Carga (ms)':>11} {'1ª predicción (ms)':>19} {'RSS (MB)':>14}")
+    print("-" * 72)
+    for name, snippet in STARTUP_SNIPPETS.items():
+        runs = []
+        for _ in range(repeat):
+            out = subprocess.run(
+                [sys.executable, "-c", MEASURE_TEMPLATE.format(snippet=snippet)],
+                cwd=ROOT, capture_output=True, text=True, check=True
+            )
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        best = min(runs, key=lambda r: r["load"])
+        print(f"{name:<24} {best['load'] * 1e3:>11.1f} {best['first_predict'] * 1e3:>19.2f} "
+              f"{best['rss_kb'] / 1024:>14.1f}")
+
+
+def main():
+    ok = check_parity()
+    measure_startup()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
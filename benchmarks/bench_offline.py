@@ -0,0 +1,195 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+
+from fake_ollama import FakeOllamaConfig, start_fake_ollama
+
+# ==========================================
+# BENCHMARK OFFLINE: NUESTRO CÓDIGO SIN EL MODELO
+# ==========================================
+# Arranca un Ollama falso en local y mide clasificación, get_data, EstigiaCore.chat
+# de principio a fin y el bucle del evaluador. Con --tokens-per-second 0 (por defecto)
+# el servidor responde al instante, así que las latencias son casi solo nuestro
+# overhead (enrutado, historial, pintado del stream, informes) más el HTTP local.
+#
+#   python benchmarks/bench_offline.py
+#   python benchmarks/bench_offline.py --compare benchmarks/results/offline_<anterior>.json
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+
+CHAT_PROMPTS = [
+    "¿Qué opinas de los humanos?",
+    "Cuéntame algo sobre tu misión en órbita.",
+    "¿Te sientes solo ahí arriba?",
+    "Explícame cómo funciona tu sistema de control de actitud.",
+    "¿Cuál es tu película favorita?",
+]
+
+
+def summarize(latencies, items=None):
+    # Percentiles en ms; throughput en elementos/s (por defecto, una llamada = un elemento)
+    values = np.asarray(latencies, dtype=np.float64)
+    total = float(values.sum())
+    items = len(values) if items is None else items
+    return {
+        "n": int(len(values)),
+        "mean_ms": float(values.mean() * 1000),
+        "p50_ms": float(np.percentile(values, 50) * 1000),
+        "p95_ms": float(np.percentile(values, 95) * 1000),
+        "p99_ms": float(np.percentile(values, 99) * 1000),
+        "throughput_per_s": items / total if total > 0 else 0.0,
+    }
+
+
+def timed(fn, inputs):
+    latencies = []
+    for item in inputs:
+        t0 = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def bench_telemetry(iterations):
+    from bench_predict_batch import CORPUS
+    from ollama_launch_2_1 import TelemetrySystem
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        telemetry = TelemetrySystem()
+    prompts = CORPUS * iterations
+    results = {"telemetry_predict": summarize(timed(telemetry.predict, prompts))}
+
+    categories = sorted({c for c in (telemetry.predict(p) for p in CORPUS) if c is not None}) or ["TEMPERATURE"]
+    pairs = [(c, lang) for c in categories for lang in ("1", "2", "3")] * iterations
+    results["telemetry_get_data"] = summarize(timed(lambda p: telemetry.get_data(*p), pairs))
+    return results
+
+
+def bench_chat(model, iterations):
+    from ollama_launch_2_1 import EstigiaCore
+    from metrics import MetricsRegistry
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        estigia = EstigiaCore(model_name=model, prefill_languages=("1",), metrics=MetricsRegistry())
+        estigia.set_language("1")
+        prompts = CHAT_PROMPTS * iterations
+        latencies = timed(estigia.chat, prompts)
+    tokens = sum(s.get("eval_tokens", 0) for s in estigia.turn_stats)
+    result = summarize(latencies)
+    result["tokens_per_s"] = tokens / sum(latencies)
+    result["evictions"] = estigia.history.evictions
+    return {"estigia_chat": result}
+
+
+def bench_evaluator(model, iterations):
+    import evaluator
+
+    queries = sum(len(q) for q in evaluator.EVALUATION_SUITE.values())
+    with tempfile.TemporaryDirectory() as output_dir:
+        latencies = timed(
+            lambda _: evaluator.run_evaluation(model, "1", evaluator.OPTION_SETS["default"],
+                                               output_dir=output_dir, log=lambda *_: None),
+            range(iterations)
+        )
+    result = summarize(latencies, items=queries * iterations)
+    result["queries_per_run"] = queries
+    return {"evaluator_run": result}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(base_path, current, threshold=0.10):
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    print(f"\n📊 Comparación con {base_path} (commit {base['meta'].get('commit')})")
+    print(f"{'benchmark':<22}{'métrica':<10}{'antes':>12}{'ahora':>12}{'cambio':>10}")
+    regressions = 0
+    for name, now in current["benchmarks"].items():
+        before = base["benchmarks"].get(name)
+        if not before:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            delta = (now[key] - before[key]) / before[key] if before[key] else 0.0
+            flag = " ⚠️" if delta > threshold else ""
+            regressions += bool(flag)
+            print(f"{name:<22}{key[:-3]:<10}{before[key]:>12.3f}{now[key]:>12.3f}{delta:>+9.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks sin red contra un Ollama falso.")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--model", default="estigia-fake")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--first-token-latency", type=float, default=0.0)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None, help="JSON de una ejecución anterior")
+    args = parser.parse_args()
+
+    config = FakeOllamaConfig(tokens_per_second=args.tokens_per_second,
+                              prefill_tokens_per_second=args.prefill_tokens_per_second,
+                              first_token_latency=args.first_token_latency)
+    server = start_fake_ollama(config=config)
+    # El cliente por defecto de ollama lee OLLAMA_HOST al importarse
+    os.environ["OLLAMA_HOST"] = server.host
+
+    benchmarks = {}
+    benchmarks.update(bench_telemetry(args.iterations))
+    benchmarks.update(bench_chat(args.model, args.iterations))
+    benchmarks.update(bench_evaluator(args.model, max(1, args.iterations // 10)))
+    server.shutdown()
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "iterations": args.iterations,
+            "fake_ollama": vars(config),
+        },
+        "benchmarks": benchmarks,
+    }
+
+    print(f"\n{'benchmark':<22}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>12}")
+    for name, r in benchmarks.items():
+        print(f"{name:<22}{r['n']:>6}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}"
+              f"{r['throughput_per_s']:>12.1f}")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"offline_{time.strftime('%Y%m%d_%H%M%S')}_{results['meta']['commit'] or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Resultados guardados en {output}")
+
+    if args.compare:
+        regressions = compare(args.compare, results)
+        if regressions:
+            print(f"\n⚠️ {regressions} métricas empeoran más de un 10%")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_ollama import start_fake_ollama
+from metrics import MetricsRegistry
+from ollama_client import LLMUnavailable, OllamaClient
+
+# ==========================================
+# BENCHMARK: CLIENTE DE OLLAMA (POOL KEEP-ALIVE Y CORTOCIRCUITO)
+# ==========================================
+# Peticiones cortas contra el Ollama falso reutilizando la conexión frente a abrir una
+# nueva en cada petición, y lo que tarda en fallar una llamada con Ollama caído antes
+# de abrirse el circuito (reintentos) y después (en el acto).
+#
+#   python benchmarks/bench_ollama_client.py
+
+MESSAGES = [{"role": "user", "content": "¿Qué tal por ahí arriba?"}]
+
+
+def percentiles(latencies):
+    values = np.asarray(latencies) * 1000
+    return f"p50 {np.percentile(values, 50):6.2f} ms | p95 {np.percentile(values, 95):6.2f} ms"
+
+
+def one_request(client):
+    client.chat(model="estigia-fake", messages=MESSAGES, options={"num_predict": 4})
+
+
+def main(requests=300):
+    server = start_fake_ollama()
+
+    # Conexión persistente: un cliente para todas las peticiones
+    client = OllamaClient(server.host, metrics=MetricsRegistry())
+    one_request(client)
+    connections = server.connections
+    latencies = []
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        one_request(client)
+        latencies.append(time.perf_counter() - t0)
+    stats = client.connection_stats()
+    print(f"pool keep-alive      {percentiles(latencies)} | conexiones nuevas: {server.connections - connections}")
+    print(f"   estimación del cliente: {stats['reused']} reutilizadas x {stats['mean_connect'] * 1000:.2f} ms de connect "
+          f"≈ {stats['saved'] * 1000:.1f} ms ahorrados")
+    client.close()
+
+    # Referencia: mismo cliente, pero sin keep-alive (una conexión TCP nueva por petición)
+    fresh = OllamaClient(server.host, keepalive_expiry=0, metrics=MetricsRegistry())
+    one_request(fresh)
+    connections = server.connections
+    latencies = []
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        one_request(fresh)
+        latencies.append(time.perf_counter() - t0)
+    print(f"conexión por petición {percentiles(latencies)} | conexiones nuevas: {server.connections - connections}")
+    fresh.close()
+
+    # Ollama caído: reintentos hasta abrir el circuito, luego fallo inmediato
+    port = server.server_address[1]
+    server.shutdown()
+    server.server_close()
+    down = OllamaClient(f"127.0.0.1:{port}", retries=2, backoff=0.05, metrics=MetricsRegistry())
+    for label in ("circuito cerrado (reintentos)", "circuito abierto"):
+        t0 = time.perf_counter()
+        try:
+            one_request(down)
+        except LLMUnavailable:
+            pass
+        print(f"\n{label:<30} falla en {(time.perf_counter() - t0) * 1000:8.3f} ms | estado: {down.breaker.state}")
+    down.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from orbit import OrbitPropagator, solve_kepler
+
+# ==========================================
+# BENCHMARK: propagador orbital (un instante vs lotes de instantes)
+# ==========================================
+
+
+def percentiles(latencies):
+    values = np.asarray(latencies) * 1e6
+    return f"p50 {np.percentile(values, 50):7.1f} µs | p95 {np.percentile(values, 95):7.1f} µs"
+
+
+def main(repeats=2000):
+    orbit = OrbitPropagator()
+    now = time.time()
+
+    # Precisión del solver: residuo de la ecuación de Kepler
+    M = np.random.default_rng(0).uniform(0, 2 * np.pi, 100_000)
+    for e in (0.0012, 0.1, 0.7):
+        E = solve_kepler(M, e)
+        print(f"Kepler e={e:<7} max |E - e·sinE - M| = {np.abs(E - e * np.sin(E) - M).max():.2e}")
+
+    # Un instante sin caché (cada llamada cae en un segundo distinto)
+    latencies = []
+    for k in range(repeats):
+        t0 = time.perf_counter()
+        orbit.state(now + k)
+        latencies.append(time.perf_counter() - t0)
+    print(f"\nstate() sin caché       {percentiles(latencies)}")
+
+    # Un instante con caché (lo que ve get_data en un mismo segundo)
+    orbit.state(now)
+    latencies = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        orbit.state(now)
+        latencies.append(time.perf_counter() - t0)
+    print(f"state() con caché       {percentiles(latencies)}")
+
+    # Lotes: instantes por segundo
+    print()
+    for n in (1_000, 10_000, 100_000, 1_000_000):
+        times = now + np.arange(n, dtype=np.float64)
+        t0 = time.perf_counter()
+        orbit.propagate(times)
+        dt = time.perf_counter() - t0
+        print(f"propagate({n:>9,})   {dt * 1000:8.2f} ms | {n / dt:12,.0f} instantes/s")
+
+    # Bucle de Python equivalente, como referencia
+    n = 1_000
+    t0 = time.perf_counter()
+    for k in range(n):
+        orbit.propagate([now + k])
+    dt = time.perf_counter() - t0
+    print(f"bucle de {n:,} llamadas   {dt * 1000:8.2f} ms | {n / dt:12,.0f} instantes/s")
+
+    for step in (60.0, 10.0):
+        t0 = time.perf_counter()
+        orbit.ground_track(now, step=step)
+        print(f"ground_track(paso {step:>4.0f}s) {(time.perf_counter() - t0) * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ollama_launch_2_1 import TelemetryBatcher, TelemetrySystem
+
+# ==========================================
+# BENCHMARK: predict() vs predict_batch() vs TelemetryBatcher
+# ==========================================
+
+CORPUS = [
+    "Buenos días Estigia!!",
+    "¿Qué temperatura tienes ahora mismo?",
+    "What is your altitude?",
+    "¿Cuál es tu excentricidad orbital?",
+    "Tell me your inclination",
+    "What's the RAAN right now?",
+    "¿Cuál es tu argumento de perigeo?",
+    "True anomaly please",
+    "¿Y la anomalía media?",
+    "How much current is the OBC drawing?",
+    "¿Cuál es tu película favorita?",
+    "Explícame cómo funciona tu sistema de control de actitud.",
+    "What is your battery state of charge?",
+    "Hoy he tenido un día horrible, todo me sale mal en la Tierra.",
+]
+
+
+def main(copies=50, threads=8):
+    telemetry = TelemetrySystem()
+    prompts = CORPUS * copies
+    n = len(prompts)
+
+    t0 = time.perf_counter()
+    single = [telemetry.predict(p) for p in prompts]
+    t_single = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    batched = telemetry.predict_batch(prompts)
+    t_batch = time.perf_counter() - t0
+
+    # Llamadas concurrentes desde varios hilos a través del micro-batcher,
+    # sin ventana (solo lo que ya está en cola) y esperando 2 ms a que lleguen más
+    micro = {}
+    for window_ms in (0.0, 2.0):
+        batcher = TelemetryBatcher(telemetry, window_ms=window_ms)
+        results = [None] * n
+
+        def worker(offset):
+            for i in range(offset, n, threads):
+                results[i] = batcher.predict(prompts[i])
+
+        t0 = time.perf_counter()
+        pool = [threading.Thread(target=worker, args=(k,)) for k in range(threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        micro[window_ms] = (time.perf_counter() - t0, results)
+        batcher.close()
+
+    # Una sola petición cada vez (el caso normal del servidor): sale sin esperar la ventana
+    batcher = TelemetryBatcher(telemetry, window_ms=2.0)
+    t0 = time.perf_counter()
+    for p in prompts:
+        batcher.predict(p)
+    t_alone = time.perf_counter() - t0
+    batcher.close()
+
+    print(f"\nPrompts clasificados: {n}")
+    print(f"  predict() uno a uno      : {t_single * 1e3:8.1f} ms  ({t_single / n * 1e6:7.1f} µs/prompt)")
+    print(f"  predict_batch()          : {t_batch * 1e3:8.1f} ms  ({t_batch / n * 1e6:7.1f} µs/prompt)")
+    for window_ms, (t_micro, _) in micro.items():
+        print(f"  TelemetryBatcher ({threads} hilos, ventana {window_ms:g} ms): {t_micro * 1e3:8.1f} ms  "
+              f"({t_micro / n * 1e6:7.1f} µs/prompt)")
+    print(f"  TelemetryBatcher (1 hilo, ventana 2 ms): {t_alone * 1e3:8.1f} ms  ({t_alone / n * 1e6:7.1f} µs/prompt)")
+    same = all(list(single) == results for _, results in micro.values())
+    print(f"  Etiquetas idénticas      : batch={list(single) == list(batched)} micro={same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_store import SessionStore
+
+# ==========================================
+# BENCHMARK: registro de sesiones (write-behind) y reanudación por la cola
+# ==========================================
+# Coste que ve el bucle de tokens al registrar un turno (encolar) frente a hacer un
+# commit por turno, y tiempo de retomar una sesión larga leyendo solo la cola que
+# cabe en la ventana frente a leer la conversación entera.
+
+ANSWER = "Desde aquí arriba la Tierra se ve preciosa y los sensores funcionan de maravilla. " * 3
+
+
+def turn_messages(k):
+    return [{"role": "user", "content": f"Pregunta número {k}, ¿qué tal la órbita?"},
+            {"role": "assistant", "content": ANSWER}]
+
+
+def percentiles(latencies):
+    values = np.asarray(latencies) * 1e6
+    return f"p50 {np.percentile(values, 50):8.1f} µs | p95 {np.percentile(values, 95):8.1f} µs"
+
+
+def main(turns=5000, window_tokens=1536):
+    with tempfile.TemporaryDirectory() as tmp:
+        # Write-behind: record_turn solo encola
+        store = SessionStore(os.path.join(tmp, "behind.sqlite"))
+        session_id = store.new_session("1", "estigia")
+        latencies = []
+        for k in range(turns):
+            t0 = time.perf_counter()
+            store.record_turn(session_id, "llm", "1", turn_messages(k), prompt=f"Pregunta {k}",
+                              metrics={"ttft": 0.4, "eval_tokens": 60})
+            latencies.append(time.perf_counter() - t0)
+        store.flush()
+        print(f"record_turn (write-behind)  {percentiles(latencies)} | "
+              f"lotes: {store.stats['batches']} | escritura total {store.stats['write_time'] * 1000:.0f} ms")
+
+        # Referencia: un commit por turno en el hilo que genera
+        sync = SessionStore(os.path.join(tmp, "sync.sqlite"), max_batch=1)
+        sync_id = sync.new_session("1", "estigia")
+        latencies = []
+        for k in range(min(turns, 1000)):
+            t0 = time.perf_counter()
+            sync.record_turn(sync_id, "llm", "1", turn_messages(k), prompt=f"Pregunta {k}",
+                             metrics={"ttft": 0.4, "eval_tokens": 60})
+            sync.flush()
+            latencies.append(time.perf_counter() - t0)
+        print(f"record_turn + commit        {percentiles(latencies)}")
+        sync.close()
+
+        # Reanudación: cola que cabe en la ventana vs todos los turnos
+        latencies = []
+        for _ in range(50):
+            t0 = time.perf_counter()
+            tail = store.load_tail(session_id, window_tokens)
+            latencies.append(time.perf_counter() - t0)
+        print(f"\nload_tail ({tail['turns']:>3} de {turns} turnos) {percentiles(latencies)}")
+        latencies = []
+        for _ in range(5):
+            t0 = time.perf_counter()
+            rows = store._db.execute("SELECT messages FROM turns WHERE session_id = ? ORDER BY seq",
+                                     (session_id,)).fetchall()
+            [json.loads(raw) for (raw,) in rows]
+            latencies.append(time.perf_counter() - t0)
+        print(f"leer la sesión completa       {percentiles(latencies)}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
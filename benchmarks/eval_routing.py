@@ -0,0 +1,112 @@
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ollama_launch_2_1 import TelemetrySystem
+
+# ==========================================
+# EVALUACIÓN: enrutado por márgenes vs enrutado original
+# ==========================================
+# Original: cualquier etiqueta distinta de GENERAL_CHAT con respuesta en get_data va a
+# la ruta rápida; todo lo demás, al LLM. Nuevo: TelemetrySystem.route (umbrales sobre
+# decision_function, varias intents por pregunta y contexto para los casos dudosos).
+# Cada prompt lleva las intents que debería contestar (vacío = charla para el LLM).
+
+CORPUS = [
+    ("What is your temperature?", {"GET_TEMP"}),
+    ("How hot is it up there?", {"GET_TEMP"}),
+    ("¿Qué temperatura tienes?", {"GET_TEMP"}),
+    ("Quina temperatura tens?", {"GET_TEMP"}),
+    ("What is your altitude?", {"ORBIT_GET_ALT"}),
+    ("¿A qué altitud estás?", {"ORBIT_GET_ALT"}),
+    ("Tell me your inclination", {"ORBIT_GET_INCLINATION"}),
+    ("What's the RAAN right now?", {"ORBIT_GET_RAAN"}),
+    ("¿Cuál es tu argumento de perigeo?", {"ORBIT_GET_PERIGEE"}),
+    ("True anomaly please", {"ORBIT_GET_TRUE_ANOMALY"}),
+    ("¿Y la anomalía media?", {"ORBIT_GET_MEAN_ANOMALY"}),
+    ("How much current is the OBC drawing?", {"TRISKEL_GET_CURRENT"}),
+    ("What's your temperature and altitude?", {"GET_TEMP", "ORBIT_GET_ALT"}),
+    ("What is your eccentricity and RAAN", {"ORBIT_GET_ECCENTRICITY", "ORBIT_GET_RAAN"}),
+    ("¿Cuál es tu altitud y tu inclinación?", {"ORBIT_GET_ALT", "ORBIT_GET_INCLINATION"}),
+    ("Temperatura y corriente, por favor", {"GET_TEMP", "TRISKEL_GET_CURRENT"}),
+    ("¿Cuál fue la temperatura máxima en los últimos 10 minutos?", {"GET_TEMP"}),
+    ("Average current over the last hour", {"TRISKEL_GET_CURRENT"}),
+    ("Buenos días Estigia!!", set()),
+    ("Hola, ¿cómo estás?", set()),
+    ("¿Qué opinas de los humanos?", set()),
+    ("¿Cuál es tu película favorita?", set()),
+    ("Explícame cómo funciona tu sistema de control de actitud.", set()),
+    ("Hoy he tenido un día horrible, todo me sale mal en la Tierra.", set()),
+    ("¿Te sientes solo ahí arriba?", set()),
+    ("Tell me a joke about astronauts", set()),
+    ("What do you dream about?", set()),
+    ("What is your battery state of charge?", set()),
+]
+
+
+def baseline(telemetry, prompt, lang):
+    category = telemetry.predict(prompt)
+    data = telemetry.get_data(category, lang)
+    return ("telemetry", {category}) if data else ("llm", set())
+
+
+def gated(telemetry, prompt, lang):
+    decision = telemetry.route(prompt)
+    if decision.route == "telemetry" and telemetry.answer(decision, lang, prompt):
+        return "telemetry", set(decision.categories)
+    return decision.route, set(decision.categories)
+
+
+def evaluate(name, router, telemetry, lang="1"):
+    counts = {"llm": 0, "context": 0, "telemetry": 0, "complete": 0, "wrong": 0, "missed": 0}
+    for prompt, expected in CORPUS:
+        route, categories = router(telemetry, prompt, lang)
+        counts[route] += 1
+        if route == "telemetry":
+            if categories - expected or not expected:
+                counts["wrong"] += 1          # contesta con un sensor que no se ha pedido
+            elif categories == expected:
+                counts["complete"] += 1
+        elif expected:
+            counts["missed"] += 1             # pregunta de sensores que acaba en el LLM
+    llm_calls = counts["llm"] + counts["context"]
+    print(f"{name:<10} LLM: {llm_calls:>2} (con contexto: {counts['context']:>2}) | "
+          f"telemetría: {counts['telemetry']:>2} (completas: {counts['complete']:>2}, erróneas: {counts['wrong']}) | "
+          f"intents de sensores al LLM: {counts['missed']}")
+    return llm_calls
+
+
+def main(repeats=200):
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        telemetry = TelemetrySystem()
+        cold = TelemetrySystem(memo_size=0)
+    expected_telemetry = sum(1 for _, expected in CORPUS if expected)
+    print(f"Prompts: {len(CORPUS)} ({expected_telemetry} de telemetría, "
+          f"{sum(len(e) > 1 for _, e in CORPUS)} con varias intents)\n")
+
+    before = evaluate("original", baseline, telemetry)
+    after = evaluate("márgenes", gated, telemetry)
+    print(f"\nLlamadas al LLM evitadas: {before - after} de {before} ({(before - after) / before:.0%})")
+
+    # Coste del enrutado: primera vez (decision_function) vs decisiones memorizadas
+    prompts = [p for p, _ in CORPUS]
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        for p in prompts:
+            cold.route(p)
+    t_cold = (time.perf_counter() - t0) / (repeats * len(prompts))
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        for p in prompts:
+            telemetry.route(p)
+    t_memo = (time.perf_counter() - t0) / (repeats * len(prompts))
+    print(f"route(): {t_cold * 1e6:.1f} µs sin memoria | {t_memo * 1e6:.1f} µs memorizado "
+          f"(aciertos: {telemetry.memo_stats['hits']}/{telemetry.memo_stats['hits'] + telemetry.memo_stats['misses']})")
+
+
+if __name__ == "__main__":
+    main()
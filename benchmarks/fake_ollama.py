@@ -0,0 +1,222 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==========================================
+# SERVIDOR OLLAMA FALSO (SIN RED NI MODELO)
+# ==========================================
+# Habla el protocolo de /api/chat y /api/generate (con y sin streaming) y devuelve
+# tokens enlatados a un ritmo configurable, con los mismos campos de tiempos que
+# Ollama (load_duration, prompt_eval_duration, eval_duration...). Sirve para medir
+# el coste de nuestro propio código sin depender de la velocidad del modelo.
+#
+#   python benchmarks/fake_ollama.py --port 11435 --tokens-per-second 10
+#   OLLAMA_HOST=127.0.0.1:11435 python ollama_launch_2_1.py
+
+NS = 1e9
+
+DEFAULT_RESPONSE = ("¡Hola! Soy Estigia, el CubeSat de la UPV. Desde aquí arriba la Tierra "
+                    "se ve preciosa y los sensores funcionan de maravilla.")
+
+
+def split_tokens(text):
+    # Trozos tipo token: cada palabra con el espacio que la sigue
+    tokens = []
+    for i, word in enumerate(text.split(" ")):
+        tokens.append(word if i == 0 else " " + word)
+    return [t for t in tokens if t]
+
+
+class FakeOllamaConfig:
+    def __init__(self, response=DEFAULT_RESPONSE, tokens_per_second=0.0, prefill_tokens_per_second=0.0,
+                 first_token_latency=0.0, load_time=0.0, chars_per_token=3.0):
+        self.response = response
+        self.tokens_per_second = tokens_per_second                  # 0 = sin espera entre tokens
+        self.prefill_tokens_per_second = prefill_tokens_per_second  # 0 = prefill instantáneo
+        self.first_token_latency = first_token_latency              # latencia fija antes del primer token
+        self.load_time = load_time                                  # solo la primera petición de cada modelo
+        self.chars_per_token = chars_per_token
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, FakeOllamaHandler)
+        self.config = config
+        self.loaded_models = set()
+        self.requests = {"/api/chat": 0, "/api/generate": 0}
+        self.disconnects = 0     # streams cortados por el cliente antes de terminar
+        self.connections = 0     # conexiones TCP aceptadas (con keep-alive, menos que peticiones)
+        self._lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    @property
+    def host(self):
+        return f"{self.server_address[0]}:{self.server_address[1]}"
+
+    def take_load_time(self, model):
+        with self._lock:
+            if model in self.loaded_models:
+                return 0.0
+            self.loaded_models.add(model)
+            return self.config.load_time
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Muchas escrituras pequeñas por respuesta: sin TCP_NODELAY, Nagle + ACK retardado añaden ~40 ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path in ("/api/tags", "/api/ps"):
+            self._send_json({"models": [{"name": m, "model": m} for m in sorted(self.server.loaded_models)]})
+        elif path == "/api/version":
+            self._send_json({"version": "0.0.0-fake"})
+        elif path == "/":
+            self._send_json({"status": "Ollama is running"})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if path not in self.server.requests:
+            self._send_json({"error": "not found"}, status=404)
+            return
+        with self.server._lock:
+            self.server.requests[path] += 1
+        self._generate(path, body)
+
+    def _generate(self, path, body):
+        config = self.server.config
+        model = body.get("model", "")
+        stream = body.get("stream", True)
+        is_chat = path == "/api/chat"
+
+        if is_chat:
+            prompt_text = "".join(m.get("content", "") for m in body.get("messages") or [])
+        else:
+            prompt_text = (body.get("system") or "") + (body.get("prompt") or "")
+        prompt_tokens = max(1, int(len(prompt_text) / config.chars_per_token))
+
+        tokens = split_tokens(config.response)
+        num_predict = (body.get("options") or {}).get("num_predict")
+        if num_predict is not None and num_predict >= 0:
+            tokens = tokens[:num_predict]
+        # Una petición de carga (generate sin prompt) no genera nada
+        if not is_chat and not body.get("prompt"):
+            tokens = []
+
+        load = self.server.take_load_time(model)
+        prefill = prompt_tokens / config.prefill_tokens_per_second if config.prefill_tokens_per_second else 0.0
+        per_token = 1.0 / config.tokens_per_second if config.tokens_per_second else 0.0
+        time.sleep(load + prefill + config.first_token_latency)
+
+        start = time.perf_counter()
+        if stream:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for i, token in enumerate(tokens):
+                    if i and per_token:
+                        time.sleep(per_token)
+                    self._write_chunk(self._chunk(model, is_chat, token, done=False))
+            except (BrokenPipeError, ConnectionResetError):
+                # Como Ollama: si el cliente cierra la conexión, se deja de generar
+                with self.server._lock:
+                    self.server.disconnects += 1
+                self.close_connection = True
+                return
+        elif per_token and len(tokens) > 1:
+            time.sleep(per_token * (len(tokens) - 1))
+        decode = time.perf_counter() - start
+
+        final = self._chunk(model, is_chat, "" if stream else "".join(tokens), done=True)
+        final.update({
+            "done_reason": "stop" if num_predict is None or len(tokens) < num_predict else "length",
+            "total_duration": int((load + prefill + config.first_token_latency + decode) * NS),
+            "load_duration": int(load * NS),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prefill * NS),
+            "eval_count": len(tokens),
+            # Nunca 0 si hubo tokens, para que tokens/s sea finito
+            "eval_duration": int(max(decode, 1e-6) * NS) if tokens else 0,
+        })
+        if stream:
+            self._write_chunk(final)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        else:
+            self._send_json(final)
+
+    def _chunk(self, model, is_chat, content, done):
+        chunk = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "done": done}
+        if is_chat:
+            chunk["message"] = {"role": "assistant", "content": content}
+        else:
+            chunk["response"] = content
+        return chunk
+
+    def _write_chunk(self, obj):
+        data = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, obj, status=200):
+        data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_fake_ollama(host="127.0.0.1", port=0, config=None):
+    """Arranca el servidor en un hilo aparte; `server.host` se puede pasar como OLLAMA_HOST."""
+    server = FakeOllamaServer((host, port), config or FakeOllamaConfig())
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor Ollama falso para pruebas y benchmarks sin red.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens-per-second", type=float, default=10.0)
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--first-token-latency", type=float, default=0.0)
+    parser.add_argument("--load-time", type=float, default=1.0)
+    parser.add_argument("--response", default=DEFAULT_RESPONSE)
+    args = parser.parse_args()
+
+    config = FakeOllamaConfig(args.response, args.tokens_per_second, args.prefill_tokens_per_second,
+                              args.first_token_latency, args.load_time)
+    server = FakeOllamaServer((args.host, args.port), config)
+    print(f"🧪 Fake Ollama listening on {server.host} (OLLAMA_HOST={server.host})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
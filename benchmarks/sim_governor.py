@@ -0,0 +1,65 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_ollama import FakeOllamaConfig, start_fake_ollama
+
+# ==========================================
+# SIMULACIÓN: gobernador térmico con un SoC que se calienta y se enfría
+# ==========================================
+# Ollama falso + fichero de temperatura falso (mismo formato que /sys/class/thermal:
+# milésimas de ºC). Muestra en qué turno cambia cada ajuste y por qué.
+
+# (temperatura ºC, tokens/s del Ollama falso) por turno
+PROFILE = [(55, 12), (62, 11), (71, 9), (74, 7), (82, 3), (79, 3.5), (72, 6),
+           (64, 9), (60, 11), (58, 12), (56, 12), (55, 12)]
+RESPONSE = " ".join(["palabra"] * 300)
+
+
+def main():
+    server = start_fake_ollama(config=FakeOllamaConfig(response=RESPONSE, tokens_per_second=0))
+    os.environ["OLLAMA_HOST"] = server.host
+
+    from governor import AdaptiveGovernor
+    from metrics import MetricsRegistry
+    from ollama_launch_2_1 import EstigiaCore
+
+    with tempfile.TemporaryDirectory() as tmp:
+        thermal = os.path.join(tmp, "temp")
+        log = []
+        # Enfriamiento sin espera entre turnos para que la simulación sea rápida
+        governor = AdaptiveGovernor("estigia-fake", light_model="estigia-fake-mini", thermal_path=thermal,
+                                    cooldown=0.0, log=log.append)
+        with contextlib.redirect_stdout(io.StringIO()):
+            estigia = EstigiaCore(model_name="estigia-fake", prefill_languages=(), metrics=MetricsRegistry(),
+                                  governor=governor)
+            estigia.set_language("1")
+
+        print(f"{'turno':>5} {'ºC':>5} {'t/s':>5} {'nivel':>5} {'modelo':<18} {'num_predict':>11} "
+              f"{'contexto':>8} {'tokens':>6}")
+        for turn, (temp, speed) in enumerate(PROFILE, 1):
+            with open(thermal, "w") as f:
+                f.write(f"{int(temp * 1000)}\n")
+            with contextlib.redirect_stdout(io.StringIO()):
+                estigia.chat(f"Pregunta número {turn}")
+            # El Ollama falso responde al instante: se sustituye la velocidad medida por la del perfil
+            governor._speeds[-1] = speed
+            settings = governor.settings
+            print(f"{turn:>5} {temp:>5} {speed:>5} {governor.level:>5} {settings.model:<18} "
+                  f"{str(settings.num_predict):>11} {settings.max_context_tokens:>8} "
+                  f"{estigia.turn_stats[-1]['eval_tokens']:>6}")
+
+    print("\nCambios registrados:")
+    for line in log:
+        print(" ", line.strip())
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,587 @@
+import argparse
+import asyncio
+import json
+import re
+import time
+import uuid
+from collections import OrderedDict
+
+from metrics import REGISTRY, LLMMetrics
+from ollama_client import OllamaClient
+from response_cache import ResponseCache
+from session_store import SessionStore
+from telemetry_store import open_source
+from ollama_launch_2_1 import PROMPTS, ConversationWindow, TelemetryBatcher, TelemetrySystem, model
+
+# ==========================================
+# SERVIDOR MULTI-SESIÓN (HTTP + SSE)
+# ==========================================
+# Endpoints:
+#   GET    /health                 -> estado de la cola, sesiones activas y conexión con Ollama
+#   GET    /metrics                -> histogramas en formato de texto de Prometheus
+#   POST   /sessions               -> {"lang": "1"} crea una sesión
+#                                     (con --session-store, una sesión desconocida se retoma del disco)
+#   POST   /sessions/<id>/lang     -> {"lang": "2"} cambia idioma (borra historial)
+#   DELETE /sessions/<id>          -> cierra la sesión
+#   POST   /chat                   -> {"session_id": ..., "message": ...} respuesta en streaming (SSE)
+
+MAX_BODY_BYTES = 64 * 1024
+
+HTTP_STATUS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Session:
+    def __init__(self, session_id, lang_choice, max_context_tokens):
+        self.session_id = session_id
+        self.max_context_tokens = max_context_tokens
+        self.in_flight = 0
+        self.last_seen = time.monotonic()
+        self.set_language(lang_choice)
+
+    def set_language(self, lang_choice):
+        # Igual que EstigiaCore.set_language: cambiar de idioma borra la conversación
+        self.lang_choice = lang_choice if lang_choice in PROMPTS else "3"
+        self.ui = PROMPTS[self.lang_choice]
+        self.history = ConversationWindow(self.ui["sys"], max_tokens=self.max_context_tokens)
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+
+class Turn:
+    def __init__(self, session, text, stream_buffer):
+        self.session = session
+        self.text = text
+        # Cola acotada: si el cliente lee lento, el worker espera en vez de acumular tokens
+        self.events = asyncio.Queue(maxsize=stream_buffer)
+        self.cancelled = False
+        self.enqueued_at = time.perf_counter()
+
+
+class EstigiaServer:
+    def __init__(self, model_name=model, host=None, workers=2, queue_size=32,
+                 session_concurrency=1, idle_timeout=600.0, max_sessions=256,
+                 max_context_tokens=1536, stream_buffer=64, batch_window_ms=0.0,
+                 keep_alive="30m", response_cache=None, metrics=REGISTRY, telemetry_source=None,
+                 session_store=None):
+        self.model_name = model_name
+        self.workers = workers
+        self.session_concurrency = session_concurrency
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.max_context_tokens = max_context_tokens
+        self.stream_buffer = stream_buffer
+        self.keep_alive = keep_alive
+        self.response_cache = response_cache
+        self.metrics = metrics
+        # Registro persistente de turnos: tras reiniciar el quiosco las sesiones se retoman de aquí
+        self.session_store = session_store
+
+        self.telemetry = TelemetrySystem(source=telemetry_source)
+        # Los turnos que llegan casi a la vez se clasifican en un único lote
+        self.batcher = TelemetryBatcher(self.telemetry, window_ms=batch_window_ms, method="route_batch")
+        # Pool keep-alive (una conexión por worker), reintentos y cortocircuito
+        self.llm = OllamaClient(host=host, max_connections=max(4, workers), metrics=metrics)
+        self.sessions = OrderedDict()
+        self.queue = None
+        self.queue_size = queue_size
+        self.stats = {"served": 0, "rejected_queue": 0, "rejected_session": 0, "evicted": 0, "resumed": 0}
+        self._tasks = []
+
+    # --- Ciclo de vida ---
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.llm.start_health_checks()
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+        self._tasks.append(asyncio.create_task(self._evict_idle_sessions()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self.batcher.close()
+        await self.llm.aclose()
+        if self.session_store is not None:
+            self.session_store.close()
+        if self.response_cache is not None:
+            self.response_cache.close()
+
+    # --- Sesiones ---
+
+    def _make_room(self):
+        # Si se alcanza el límite se descarta la sesión inactiva más antigua (LRU)
+        while len(self.sessions) >= self.max_sessions:
+            victim = next((s for s in self.sessions.values() if s.in_flight == 0), None)
+            if victim is None:
+                raise HTTPError(503, "too many active sessions")
+            del self.sessions[victim.session_id]
+            self.stats["evicted"] += 1
+
+    def create_session(self, lang_choice="3"):
+        self._make_room()
+        session = Session(uuid.uuid4().hex, lang_choice, self.max_context_tokens)
+        self.sessions[session.session_id] = session
+        if self.session_store is not None:
+            self.session_store.new_session(session.lang_choice, self.model_name, session_id=session.session_id)
+        return session
+
+    def _load_session(self, session_id):
+        # Sesión expulsada o anterior a un reinicio: solo se leen los turnos que caben en la ventana.
+        # Corre en un hilo: SQLite no debe parar el bucle que reparte los tokens de las demás sesiones
+        info = self.session_store.session_info(session_id)
+        if info is None:
+            return None
+        session = Session(session_id, info["lang"], self.max_context_tokens)
+        tail = self.session_store.load_tail(session_id, session.history.max_tokens - session.history.tokens)
+        for message in tail["messages"]:
+            session.history.append(message)
+        return session
+
+    async def _resume_session(self, session_id):
+        if self.session_store is None:
+            return None
+        session = await asyncio.to_thread(self._load_session, session_id)
+        if session is None:
+            return None
+        if session_id in self.sessions:
+            # Otra petición la retomó mientras se leía
+            return self.sessions[session_id]
+        self._make_room()
+        self.sessions[session_id] = session
+        self.stats["resumed"] += 1
+        return session
+
+    def _record(self, session, route, messages, prompt=None, metrics=None):
+        if self.session_store is not None:
+            self.session_store.record_turn(session.session_id, route, session.lang_choice, messages,
+                                           prompt=prompt, metrics=metrics)
+
+    async def get_session(self, session_id):
+        session = self.sessions.get(session_id) or await self._resume_session(session_id)
+        if session is None:
+            raise HTTPError(404, "unknown session")
+        session.touch()
+        self.sessions.move_to_end(session_id)
+        return session
+
+    async def _evict_idle_sessions(self):
+        interval = max(1.0, min(self.idle_timeout / 4, 60.0))
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for session_id, session in list(self.sessions.items()):
+                if session.in_flight == 0 and now - session.last_seen > self.idle_timeout:
+                    del self.sessions[session_id]
+                    self.stats["evicted"] += 1
+
+    # --- Cola de turnos ---
+
+    def _check_queue(self):
+        if self.queue.full():
+            self.stats["rejected_queue"] += 1
+            raise HTTPError(503, "server busy, retry later")
+
+    def submit(self, session, text):
+        if session.in_flight >= self.session_concurrency:
+            self.stats["rejected_session"] += 1
+            raise HTTPError(429, "session already has a request in progress")
+
+        self._check_queue()
+        turn = Turn(session, text, self.stream_buffer)
+        self.queue.put_nowait(turn)
+
+        session.in_flight += 1
+        return turn
+
+    async def _worker(self):
+        while True:
+            turn = await self.queue.get()
+            try:
+                if not turn.cancelled:
+                    await self._run_turn(turn)
+                    self.stats["served"] += 1
+            except Exception as e:
+                await self._emit(turn, "error", {"error": str(e)})
+            finally:
+                turn.session.in_flight -= 1
+                turn.session.touch()
+                await self._emit(turn, None, None)
+                self.queue.task_done()
+
+    async def _emit(self, turn, event, data):
+        if turn.cancelled:
+            return
+        await turn.events.put((event, data))
+
+    async def _run_turn(self, turn):
+        session = turn.session
+
+        # Ruta rápida: clasificador de telemetría (micro-lotes en un hilo aparte)
+        tel_start_time = time.perf_counter()
+        decision = await asyncio.wrap_future(self.batcher.submit(turn.text))
+        self.metrics.record_classifier(time.perf_counter() - tel_start_time, ",".join(decision.categories) or "GENERAL_CHAT",
+                                       lang=session.lang_choice, route=decision.route, reason=decision.reason)
+        sensor_data = None
+        if decision.route == "telemetry":
+            sensor_data = self.telemetry.answer(decision, session.lang_choice, turn.text)
+        tel_time = time.perf_counter() - tel_start_time
+
+        if sensor_data:
+            self.metrics.inc("estigia_turns_total", route="telemetry")
+            assistant_message = {'role': 'assistant', 'content': sensor_data}
+            session.history.append(assistant_message)
+            self._record(session, "telemetry", [assistant_message], prompt=turn.text,
+                         metrics={"total": tel_time, "categories": decision.categories})
+            await self._emit(turn, "telemetry", {"categories": decision.categories, "content": sensor_data})
+            await self._emit(turn, "done", {"route": "telemetry", "time": tel_time})
+            return
+
+        # Intents dudosas: el LLM contesta con los valores de telemetría como contexto
+        context = None
+        if decision.route == "context":
+            context = self.telemetry.answer(decision, session.lang_choice, turn.text)
+
+        # Ruta cognitiva: primero la caché de respuestas (si está activada y no hay contexto)
+        cache_key = None
+        if self.response_cache is not None and context is None:
+            cache_key = self.response_cache.key(self.model_name, session.lang_choice, turn.text,
+                                                session.history.messages())
+            # SQLite fuera del bucle: un commit en la SD no debe frenar los demás streams
+            cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+            if cached is not None:
+                self.metrics.inc("estigia_turns_total", route="cache")
+                messages = [{'role': 'user', 'content': turn.text}, {'role': 'assistant', 'content': cached}]
+                for message in messages:
+                    session.history.append(message)
+                self._record(session, "cache", messages, prompt=turn.text)
+                for token in re.findall(r"\S+\s*|\s+", cached):
+                    await self._emit(turn, "token", {"content": token})
+                await self._emit(turn, "done", {"route": "cache", "time": time.perf_counter() - tel_start_time,
+                                                "cache_hits": self.response_cache.stats["hits"]})
+                return
+
+        # Streaming desde Ollama
+        content = turn.text
+        if context is not None:
+            content = f"{turn.text}\n\n[{PROMPTS[session.lang_choice]['ui_ctx']}: {context}]"
+        user_message = {'role': 'user', 'content': content}
+        session.history.append(user_message)
+        prompt_tokens = session.history.tokens
+
+        start_time = time.perf_counter()
+        first_token_time = None
+        parts = []
+        final_chunk = {}
+
+        try:
+            stream = await self.llm.astream_chat(
+                model=self.model_name,
+                messages=session.history.messages(),
+                keep_alive=self.keep_alive
+            )
+        except Exception as e:
+            # No solo Ollama caído (LLMUnavailable): un 4xx como modelo inexistente también acaba
+            # aquí, y sin respuesta el mensaje de usuario quedaría huérfano en el historial
+            return await self._fallback(turn, decision, context, user_message, e, tel_start_time)
+        error = None
+        try:
+            async for chunk in stream:
+                if turn.cancelled:
+                    break
+                if first_token_time is None:
+                    first_token_time = time.perf_counter()
+                token = chunk['message']['content']
+                parts.append(token)
+                if chunk.get('done'):
+                    final_chunk = chunk
+                await self._emit(turn, "token", {"content": token})
+        except Exception as e:
+            if not parts:
+                return await self._fallback(turn, decision, context, user_message, e, tel_start_time)
+            # Cortada a mitad de respuesta: lo ya enviado queda en el historial, marcado como
+            # interrumpido, para que el siguiente turno no encadene dos mensajes de usuario
+            error = e
+
+        end_time = time.perf_counter()
+        full_response = "".join(parts)
+        interrupted = turn.cancelled or error is not None
+        content = full_response.rstrip() + " …" if error is not None else full_response
+        assistant_message = {'role': 'assistant', 'content': content}
+        session.history.append(assistant_message)
+        if cache_key is not None and not interrupted and final_chunk.get("done_reason") != "length":
+            await asyncio.to_thread(self.response_cache.put, cache_key, full_response)
+
+        ttft = first_token_time - start_time if first_token_time else 0
+        metrics = LLMMetrics.from_response(final_chunk, ttft=ttft, total=end_time - start_time)
+        route = "interrupted" if error is not None else "cancelled" if turn.cancelled else decision.route
+        self._record(session, route, [user_message, assistant_message], prompt=turn.text, metrics=metrics.as_dict())
+        if error is not None:
+            self.metrics.inc("estigia_turns_total", route="interrupted")
+            await self._emit(turn, "error", {"error": str(error), "interrupted": True})
+            await self._emit(turn, "done", {"route": "interrupted", "time": end_time - tel_start_time})
+            return
+        if final_chunk:
+            self.metrics.record_llm(metrics, model=self.model_name, lang=session.lang_choice,
+                                    context=context is not None)
+        await self._emit(turn, "done", {
+            "route": decision.route,
+            "queue_wait": start_time - turn.enqueued_at,
+            "prompt_tokens_est": prompt_tokens,
+            **metrics.as_dict(),
+        })
+
+    async def _fallback(self, turn, decision, context, user_message, error, started):
+        # Ollama caído (o circuito abierto): contesta la vía rápida con lo que pueda
+        session, lang = turn.session, turn.session.lang_choice
+        fallback = context or self.telemetry.fallback_answer(decision, lang, turn.text) or PROMPTS[lang]["ui_offline"]
+        assistant_message = {'role': 'assistant', 'content': fallback}
+        session.history.append(assistant_message)
+        self.metrics.inc("estigia_turns_total", route="fallback")
+        self._record(session, "fallback", [user_message, assistant_message], prompt=turn.text)
+        await self._emit(turn, "telemetry", {"categories": decision.categories, "content": fallback,
+                                             "fallback": True, "error": str(error)})
+        await self._emit(turn, "done", {"route": "fallback", "time": time.perf_counter() - started})
+
+    # --- HTTP ---
+
+    async def handle_connection(self, reader, writer):
+        try:
+            try:
+                method, path, body = await _read_request(reader)
+                await self._route(method, path, body, writer)
+            except HTTPError as e:
+                await _write_json(writer, e.status, {"error": e.message})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body, writer):
+        parts = [p for p in path.split("?")[0].split("/") if p]
+
+        if parts == ["health"] and method == "GET":
+            return await _write_json(writer, 200, {
+                "model": self.model_name,
+                "sessions": len(self.sessions),
+                "queued": self.queue.qsize(),
+                "queue_size": self.queue_size,
+                **self.stats,
+                "cache": dict(self.response_cache.stats) if self.response_cache is not None else None,
+                "ollama": self.llm.connection_stats(),
+            })
+
+        if parts == ["metrics"] and method == "GET":
+            return await _write_text(writer, 200, self.metrics.prometheus_text(),
+                                     "text/plain; version=0.0.4; charset=utf-8")
+
+        if parts == ["sessions"] and method == "POST":
+            session = self.create_session(str(body.get("lang", "3")))
+            return await _write_json(writer, 201, {"session_id": session.session_id,
+                                                   "lang": session.ui["lang"]})
+
+        if len(parts) == 2 and parts[0] == "sessions" and method == "DELETE":
+            session = await self.get_session(parts[1])
+            del self.sessions[session.session_id]
+            if self.session_store is not None:
+                self.session_store.reset(session.session_id, session.lang_choice)
+            return await _write_json(writer, 200, {"closed": session.session_id})
+
+        if len(parts) == 3 and parts[0] == "sessions" and parts[2] == "lang" and method == "POST":
+            session = await self.get_session(parts[1])
+            if session.in_flight:
+                raise HTTPError(429, "session already has a request in progress")
+            session.set_language(str(body.get("lang", "3")))
+            if self.session_store is not None:
+                self.session_store.reset(session.session_id, session.lang_choice)
+            return await _write_json(writer, 200, {"session_id": session.session_id,
+                                                   "lang": session.ui["lang"]})
+
+        if parts == ["chat"] and method == "POST":
+            message = str(body.get("message", "")).strip()
+            if not message:
+                raise HTTPError(400, "empty message")
+            if body.get("session_id"):
+                session = await self.get_session(body["session_id"])
+            else:
+                # Sin hueco en la cola no se crea la sesión: un 503 no deja sesiones huérfanas
+                self._check_queue()
+                session = self.create_session(str(body.get("lang", "3")))
+            turn = self.submit(session, message)
+            return await self._stream_turn(turn, writer)
+
+        raise HTTPError(404 if parts else 405, "no such endpoint")
+
+    async def _stream_turn(self, turn, writer):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream; charset=utf-8\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        try:
+            await _write_sse(writer, "session", {"session_id": turn.session.session_id})
+            while True:
+                item = await turn.events.get()
+                if item == (None, None):
+                    break
+                await _write_sse(writer, *item)
+        except ConnectionError:
+            # El visitante se ha ido: se aborta la generación y se libera la cola
+            turn.cancelled = True
+            while not turn.events.empty():
+                turn.events.get_nowait()
+
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        raise asyncio.IncompleteReadError(b"", None)
+    try:
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", 0) or 0)
+    except ValueError:
+        raise HTTPError(400, "invalid content-length")
+    if length < 0:
+        raise HTTPError(400, "invalid content-length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "request body too large")
+
+    body = {}
+    if length:
+        raw = await reader.readexactly(length)
+        try:
+            body = json.loads(raw.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            raise HTTPError(400, "body must be JSON")
+        if not isinstance(body, dict):
+            raise HTTPError(400, "body must be a JSON object")
+    return method.upper(), path, body
+
+
+async def _write_json(writer, status, payload):
+    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {HTTP_STATUS.get(status, '')}\r\n"
+        f"Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(data)}\r\n"
+        f"Connection: close\r\n"
+    )
+    if status in (429, 503):
+        head += "Retry-After: 1\r\n"
+    writer.write(head.encode("latin-1") + b"\r\n" + data)
+    await writer.drain()
+
+
+async def _write_text(writer, status, text, content_type):
+    data = text.encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status} {HTTP_STATUS.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(data)}\r\n"
+        f"Connection: close\r\n\r\n".encode("latin-1") + data
+    )
+    await writer.drain()
+
+
+async def _write_sse(writer, event, data):
+    payload = json.dumps(data, ensure_ascii=False)
+    writer.write(f"event: {event}\ndata: {payload}\n\n".encode("utf-8"))
+    await writer.drain()
+
+
+async def serve(args):
+    server = EstigiaServer(
+        model_name=args.model,
+        host=args.ollama_host,
+        workers=args.workers,
+        queue_size=args.queue_size,
+        session_concurrency=args.session_concurrency,
+        idle_timeout=args.idle_timeout,
+        max_sessions=args.max_sessions,
+        max_context_tokens=args.max_context_tokens,
+        batch_window_ms=args.batch_window_ms,
+        keep_alive=args.keep_alive,
+        response_cache=ResponseCache(args.response_cache) if args.response_cache else None,
+        telemetry_source=open_source(args.telemetry_source),
+        session_store=SessionStore(args.session_store) if args.session_store else None,
+    )
+    REGISTRY.jsonl_path = args.metrics_jsonl
+    await server.start()
+    listener = await asyncio.start_server(server.handle_connection, args.host, args.port)
+    print(f"🛰️ Estigia server listening on http://{args.host}:{args.port} "
+          f"(workers: {args.workers}, queue: {args.queue_size})")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estigia multi-session chat server (HTTP + SSE).")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--model", default=model)
+    parser.add_argument("--ollama-host", default=None, help="URL de Ollama (por defecto, la de la librería)")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="Generaciones simultáneas contra Ollama (ajustar a OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--queue-size", type=int, default=32, help="Turnos en espera antes de responder 503")
+    parser.add_argument("--session-concurrency", type=int, default=1, help="Turnos simultáneos por sesión")
+    parser.add_argument("--idle-timeout", type=float, default=600.0, help="Segundos hasta expulsar una sesión inactiva")
+    parser.add_argument("--max-sessions", type=int, default=256)
+    parser.add_argument("--max-context-tokens", type=int, default=1536,
+                        help="Presupuesto de tokens del historial de cada sesión")
+    parser.add_argument("--batch-window-ms", type=float, default=0.0,
+                        help="Espera extra para agrupar clasificaciones concurrentes "
+                             "(0 = solo se agrupan las que ya están en cola)")
+    parser.add_argument("--keep-alive", default="30m", help="Tiempo que Ollama mantiene el modelo cargado")
+    parser.add_argument("--response-cache", default=None, metavar="PATH",
+                        help="Activa la caché de respuestas persistente (SQLite) en PATH")
+    parser.add_argument("--metrics-jsonl", default=None, metavar="PATH",
+                        help="Guarda cada turno (LLM y clasificador) como una línea JSON en PATH")
+    parser.add_argument("--telemetry-source", default=None, metavar="SOURCE",
+                        help="Pase grabado (JSONL) o udp://host:puerto; por defecto, telemetría simulada")
+    parser.add_argument("--session-store", default=None, metavar="PATH",
+                        help="Guarda cada turno en PATH (SQLite WAL) y retoma las sesiones tras un reinicio")
+    args = parser.parse_args()
+
+    print("\n--- STARTING ESTIGIA SERVER ---")
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("Shutting down... Goodbye!")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,44 @@
-import ollama
+import argparse
+import itertools
+import json
+import math
+import os
+import threading
 import time
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from metrics import LLMMetrics, MetricsRegistry
+from ollama_client import LLMUnavailable, OllamaClient
+from session_store import SessionStore
 
 # ==========================================
 # CONFIGURACIÓN DEL MODELO
 # ==========================================
 MODEL_NAME = "franciscobdl/Estigia3:latest"
 
+# Conjuntos de opciones de generación seleccionables con --option-sets
+OPTION_SETS = {
+    "default": {
+        "temperature": 0.7,
+        "top_p": 0.9,
+        "repeat_penalty": 1.15,
+        "repeat_last_n": 256
+    },
+    "precise": {
+        "temperature": 0.3,
+        "top_p": 0.8,
+        "repeat_penalty": 1.15,
+        "repeat_last_n": 256
+    },
+    "creative": {
+        "temperature": 1.0,
+        "top_p": 0.95,
+        "repeat_penalty": 1.1,
+        "repeat_last_n": 256
+    }
+}
+
 PROMPTS = {
     "1": {
         "lang": "Español",  
@@ -53,37 +85,439 @@ EVALUATION_SUITE = {
     ]
 }
 
-def query_ollama(history, options=None):
-    """Hace la petición síncrona a Ollama pasando TODO el historial acumulado."""
-    try:
-        response = ollama.chat(
-            model=MODEL_NAME, 
-            messages=history,
-            options=options
-        )
-        
-        content = response['message']['content']
-        
-        # Extracción de métricas
-        eval_count = response.get('eval_count', 0)
-        eval_duration_ns = response.get('eval_duration', 1) 
-        prompt_eval_ns = response.get('prompt_eval_duration', 0) 
-        
-        ttft_sec = prompt_eval_ns / 1e9
-        velocity = eval_count / (eval_duration_ns / 1e9)
-        
+# Conexión persistente compartida por todas las preguntas (run_matrix crea la suya según --parallel)
+CLIENT = OllamaClient()
+
+def query_ollama(history, options=None, model=MODEL_NAME, client=None, wait=120.0):
+    """Petición a Ollama en streaming con TODO el historial acumulado (TTFT medido en el cliente).
+
+    El cliente (OllamaClient) reintenta los fallos transitorios con espera exponencial; si aun
+    así Ollama no está, se espera hasta `wait` s a que el chequeo de salud lo vea volver y se
+    pregunta otra vez. Si sigue fallando, metrics["error"] lleva el motivo en vez de devolver
+    unas métricas a cero que pasen por válidas.
+    """
+    client = client or CLIENT
+    error = None
+    for attempt in range(2):
+        if attempt and not client.wait_until_up(wait):
+            break
+        try:
+            start = time.perf_counter()
+            first_token_time = None
+            parts = []
+            final_chunk = {}
+            for chunk in client.stream_chat(model=model, messages=history, options=options):
+                if first_token_time is None:
+                    first_token_time = time.perf_counter()
+                parts.append(chunk['message']['content'])
+                if chunk.get('done'):
+                    # El último chunk trae los tiempos de Ollama (mismo modelo que ollama_launch_2_1.py)
+                    final_chunk = chunk
+        except LLMUnavailable as e:
+            error = f"{type(e).__name__}: {e}"
+            continue
+        except Exception as e:
+            # Error no transitorio (p. ej. el modelo no existe): repetir no lo arregla
+            error = f"{type(e).__name__}: {e}"
+            break
+
+        ttft = first_token_time - start if first_token_time else None
+        llm = LLMMetrics.from_response(final_chunk, ttft=ttft, total=time.perf_counter() - start)
         metrics = {
-            "ttft": ttft_sec,
-            "velocity": velocity,
-            "tokens": eval_count
+            "ttft": llm.ttft,
+            "velocity": llm.tokens_per_second,
+            "tokens": llm.eval_tokens,
+            "prompt_tokens": llm.prompt_tokens,
+            "prefill": llm.prefill,
+            "load": llm.load,
+            "llm": llm,
+            "error": None,
         }
-        
-        return content.strip(), metrics
-        
-    except Exception as e:
-        return f"[ERROR de Ollama: {e}]", {"ttft": 0.0, "velocity": 0.0, "tokens": 0}
+        return "".join(parts).strip(), metrics
 
-def main():
+    return f"[ERROR de Ollama: {error}]", {"ttft": 0.0, "velocity": 0.0, "tokens": 0, "prompt_tokens": 0,
+                                           "prefill": 0.0, "load": 0.0, "llm": None, "error": error}
+
+def report_path(model, choice, options_name="default", output_dir="."):
+    suffix = "" if options_name == "default" else f"_{options_name}"
+    name = f"evaluacion_{model.replace(':', '_').replace('/', '_')}_{PROMPTS[choice]['lang']}{suffix}.md"
+    return os.path.join(output_dir, name)
+
+def results_path(output_file):
+    # Resultados en bruto (una línea JSON por respuesta) junto al informe .md
+    return os.path.splitext(output_file)[0] + "_results.jsonl"
+
+def metrics_path(output_file):
+    # Métricas por turno (MetricsRegistry) junto al informe .md
+    return os.path.splitext(output_file)[0] + "_metrics.jsonl"
+
+def load_results(path):
+    """Última respuesta de cada pregunta en un fichero de resultados; una válida no se sustituye por un error."""
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue   # última línea a medias si el proceso murió escribiéndola
+            key = (record["category"], record["index"])
+            previous = records.get(key)
+            if previous is None or previous.get("error") or not record.get("error"):
+                records[key] = record
+    return records
+
+def percentile(values, q):
+    # Interpolación lineal entre rangos (como numpy.percentile)
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100
+    low = math.floor(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+def summarize_results(records):
+    valid = [r for r in records if not r.get("error") and r.get("eval_tokens", 0) > 0]
+    summary = {
+        "queries": len(records),
+        "valid_queries": len(valid),
+        "errors": sum(1 for r in records if r.get("error")),
+        "total_tokens": sum(r["eval_tokens"] for r in valid),
+    }
+    for name, field in (("ttft", "ttft"), ("prefill", "prefill"), ("load", "load"),
+                        ("velocity", "tokens_per_second"), ("tokens", "eval_tokens")):
+        values = [r[field] for r in valid]
+        summary[f"avg_{name}"] = sum(values) / len(values) if values else 0.0
+        if name != "load":
+            summary[f"p50_{name}"] = percentile(values, 50)
+            summary[f"p95_{name}"] = percentile(values, 95)
+    # En la velocidad la cola mala es la de abajo
+    summary["p05_velocity"] = percentile([r["tokens_per_second"] for r in valid], 5)
+    return summary
+
+def write_report(output_file, model, selected_lang, options, options_name, system_prompt, records, summary):
+    """Informe Markdown generado a partir de los resultados (no se mantiene abierto durante la evaluación)."""
+    by_category = {}
+    for record in records:
+        by_category.setdefault(record["category"], []).append(record)
+
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write(f"# Evaluación del modelo: {model} ({selected_lang})\n")
+        f.write(f"**Fecha de ejecución:** {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"**Modo:** Conversación Continua\n")
+        f.write(f"**Opciones ({options_name}):** `{json.dumps(options)}`\n")
+        f.write(f"**Resultados en bruto:** `{os.path.basename(results_path(output_file))}`\n")
+        f.write(f"**System Prompt Usado:**\n> {system_prompt}\n\n")
+        f.write("---\n\n")
+
+        for category, category_records in by_category.items():
+            f.write(f"## {category}\n\n")
+            for r in category_records:
+                if r.get("error"):
+                    metrics_string = f"[❌ Error de Ollama: {r['error']}]"
+                else:
+                    metrics_string = (f"[⏱️ LLM | TTFT: {r['ttft']:.2f}s | Velocidad: {r['tokens_per_second']:.2f} t/s "
+                                      f"| Tokens: {r['eval_tokens']} | Prompt: {r['prompt_tokens']} tok en "
+                                      f"{r['prefill']:.2f}s | Carga: {r['load']:.2f}s]")
+                f.write(f"**👤 Usuario:** {r['question']}\n\n")
+                f.write(f"**🛰️ Estigia:** {r['answer']}\n\n")
+                f.write(f"*{metrics_string}*\n\n")
+                f.write("---\n\n")
+
+        if summary["valid_queries"] > 0:
+            f.write(stats_block(summary))
+
+def stats_block(summary):
+    errors = f" ({summary['errors']} con error)" if summary["errors"] else ""
+    return (
+        f"## 📊 Resumen Global de Métricas\n\n"
+        f"- **Consultas procesadas:** {summary['valid_queries']}/{summary['queries']}{errors}\n"
+        f"- **TTFT:** media {summary['avg_ttft']:.2f} s | p50 {summary['p50_ttft']:.2f} s "
+        f"| p95 {summary['p95_ttft']:.2f} s\n"
+        f"- **Prefill (evaluación del prompt):** media {summary['avg_prefill']:.2f} s "
+        f"| p50 {summary['p50_prefill']:.2f} s | p95 {summary['p95_prefill']:.2f} s\n"
+        f"- **Promedio Carga del Modelo:** {summary['avg_load']:.2f} s\n"
+        f"- **Velocidad de decodificación:** media {summary['avg_velocity']:.2f} t/s "
+        f"| p50 {summary['p50_velocity']:.2f} t/s | p5 (lenta) {summary['p05_velocity']:.2f} t/s\n"
+        f"- **Promedio de Tokens por respuesta:** {summary['avg_tokens']:.0f} tokens\n"
+        f"- **Total de Tokens Generados:** {summary['total_tokens']} tokens\n"
+    )
+
+def run_evaluation(model, choice, options, options_name="default", output_dir=".", log=print, session_store=None,
+                   resume=False, client=None):
+    """Evalúa una conversación completa (un modelo, un idioma, unas opciones) y devuelve su resumen.
+
+    Cada respuesta se añade en cuanto llega a `<informe>_results.jsonl`. Con `resume` se
+    saltan las preguntas ya contestadas (su respuesta vuelve al historial) y solo se
+    repiten las pendientes o las que fallaron. Con `session_store` (SessionStore) cada
+    pregunta queda además registrada como un turno.
+    """
+    selected_lang = PROMPTS[choice]["lang"]
+    system_prompt = PROMPTS[choice]["sys"]
+    output_file = report_path(model, choice, options_name, output_dir)
+    results_file = results_path(output_file)
+    metrics_file = metrics_path(output_file)
+    registry = MetricsRegistry(jsonl_path=metrics_file)
+
+    os.makedirs(output_dir, exist_ok=True)
+    done = load_results(results_file) if resume else {}
+    if not resume:
+        # Ejecución nueva: ni respuestas ni métricas de ejecuciones anteriores
+        for path in (results_file, metrics_file):
+            if os.path.exists(path):
+                os.remove(path)
+    skipped = sum(1 for r in done.values() if not r.get("error"))
+    if skipped:
+        log(f"⏭️ Reanudando: {skipped} respuestas ya guardadas en {results_file}")
+
+    chat_history = [{"role": "system", "content": system_prompt}]
+    session_id = session_store.new_session(choice, model) if session_store is not None else None
+    start_time = time.perf_counter()
+
+    with open(results_file, "a", encoding="utf-8") as results:
+        for category, questions in EVALUATION_SUITE.items():
+            log(f"➡️ Sección: {category}")
+
+            for index, q in enumerate(questions):
+                previous = done.get((category, index))
+                if previous is not None and not previous.get("error") and previous["question"] == q:
+                    # Ya contestada: entra en el historial para que la conversación siga igual
+                    chat_history.append({"role": "user", "content": q})
+                    chat_history.append({"role": "assistant", "content": previous["answer"]})
+                    continue
+
+                log(f"   👤 Evaluando: {q}")
+                
+                # Los turnos de una conversación van siempre en orden
+                chat_history.append({"role": "user", "content": q})
+                response_text, metrics = query_ollama(chat_history, options=options, model=model, client=client)
+                llm = metrics['llm']
+                if metrics['error']:
+                    # El error no entra en la conversación; con --resume se vuelve a preguntar
+                    chat_history.pop()
+                    log(f"   ❌ {metrics['error']}")
+                else:
+                    chat_history.append({"role": "assistant", "content": response_text})
+                    if metrics['tokens'] > 0:
+                        registry.record_llm(llm, model=model, lang=choice, options=options_name, question=q)
+                    if session_id is not None:
+                        session_store.record_turn(session_id, "eval", choice, chat_history[-2:], prompt=q,
+                                                  metrics={"options": options_name, "category": category,
+                                                           **llm.as_dict()})
+
+                record = {
+                    "ts": time.time(), "model": model, "lang": choice, "options": options_name,
+                    "category": category, "index": index, "question": q, "answer": response_text,
+                    "error": metrics['error'], **(llm.as_dict() if llm else {}),
+                }
+                # Checkpoint: la respuesta queda en disco antes de pasar a la siguiente pregunta
+                results.write(json.dumps(record, ensure_ascii=False) + "\n")
+                results.flush()
+
+    done = load_results(results_file)
+    records = [done[(category, index)] for category, questions in EVALUATION_SUITE.items()
+               for index in range(len(questions)) if (category, index) in done]
+    summary = {
+        "model": model,
+        "lang": selected_lang,
+        "options": options_name,
+        **summarize_results(records),
+        "wall_time": time.perf_counter() - start_time,
+        "output_file": output_file,
+        "results_file": results_file,
+    }
+    write_report(output_file, model, selected_lang, options, options_name, system_prompt, records, summary)
+
+    if summary["valid_queries"] > 0:
+        log("\n" + "="*40)
+        log(stats_block(summary).replace("## 📊 ", "📊 "))
+        log("="*40)
+
+    return summary
+
+def write_comparison(summaries, output_file):
+    """Tabla consolidada con una fila por ejecución (modelo, idioma, opciones)."""
+    rows = sorted(summaries, key=lambda r: (r["model"], r["lang"], r["options"]))
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write(f"# Comparativa de Evaluaciones de Estigia\n")
+        f.write(f"**Fecha de ejecución:** {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write("| Modelo | Idioma | Opciones | Consultas | TTFT p50 / p95 (s) | Prefill p50 / p95 (s) "
+                "| Velocidad p50 (t/s) | Tokens/respuesta | Tiempo total (s) | Informe |\n")
+        f.write("|---|---|---|---|---|---|---|---|---|---|\n")
+        for r in rows:
+            f.write(f"| {r['model']} | {r['lang']} | {r['options']} | {r['valid_queries']}/{r['queries']} "
+                    f"| {r['p50_ttft']:.2f} / {r['p95_ttft']:.2f} | {r['p50_prefill']:.2f} / {r['p95_prefill']:.2f} "
+                    f"| {r['p50_velocity']:.2f} | {r['avg_tokens']:.0f} | {r['wall_time']:.1f} "
+                    f"| {os.path.basename(r['output_file'])} |\n")
+    return output_file
+
+# Métricas que compara `evaluator.py compare`: (campo, etiqueta, True si más alto es mejor)
+COMPARE_METRICS = [
+    ("ttft", "TTFT (s)", False),
+    ("prefill", "Prefill (s)", False),
+    ("tokens_per_second", "Decodificación (t/s)", True),
+]
+
+def _rank(items):
+    # Rangos medios de `items` ordenados por su primer elemento y término de empates (suma de t³ - t)
+    combined = sorted(items)
+    ranks = [0.0] * len(combined)
+    ties = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        ties += (j - i + 1) ** 3 - (j - i + 1)
+        i = j + 1
+    return combined, ranks, ties
+
+def wilcoxon_p(differences):
+    """p-valor bilateral de Wilcoxon de rangos con signo (aproximación normal; los ceros se descartan)."""
+    diffs = [d for d in differences if d != 0]
+    n = len(diffs)
+    if n < 2:
+        return 1.0
+    combined, ranks, ties = _rank([(abs(d), d > 0) for d in diffs])
+    w_plus = sum(r for r, (_, positive) in zip(ranks, combined) if positive)
+    sigma = math.sqrt(n * (n + 1) * (2 * n + 1) / 24 - ties / 48)
+    if sigma == 0:
+        return 1.0
+    z = max(abs(w_plus - n * (n + 1) / 4) - 0.5, 0.0) / sigma
+    return math.erfc(z / math.sqrt(2))
+
+def mann_whitney_p(a, b):
+    """p-valor bilateral de Mann-Whitney U (aproximación normal con corrección por empates)."""
+    n1, n2 = len(a), len(b)
+    if n1 < 2 or n2 < 2:
+        return 1.0
+    combined, ranks, ties = _rank([(v, 0) for v in a] + [(v, 1) for v in b])
+    u1 = sum(r for r, (_, group) in zip(ranks, combined) if group == 0) - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1))))
+    if sigma == 0:
+        return 1.0
+    z = max(abs(u1 - n1 * n2 / 2) - 0.5, 0.0) / sigma
+    return math.erfc(z / math.sqrt(2))
+
+def load_run(paths):
+    """Respuestas válidas de uno o varios ficheros _results.jsonl (o directorios), agrupadas por ejecución."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, n) for n in os.listdir(path) if n.endswith("_results.jsonl"))
+        else:
+            files.append(path)
+    groups = {}
+    for path in files:
+        for record in load_results(path).values():
+            if not record.get("error") and record.get("eval_tokens", 0) > 0:
+                groups.setdefault((record["model"], record["lang"], record["options"]), []).append(record)
+    return groups
+
+def compare_runs(base_paths, new_paths, alpha=0.05, threshold=0.10, log=print):
+    """Compara dos ejecuciones y devuelve las regresiones significativas.
+
+    Por cada ejecución (modelo, idioma, opciones) y métrica compara las medianas. Las dos
+    ejecuciones contestan las mismas preguntas, así que se emparejan por (categoría, índice)
+    y se aplica Wilcoxon de rangos con signo a las diferencias; Mann-Whitney U queda para
+    cuando no hay preguntas comunes. Es regresión si empeora más de `threshold` y p < `alpha`.
+    """
+    base, new = load_run(base_paths), load_run(new_paths)
+    if len(base) == 1 and len(new) == 1:
+        # Una ejecución por lado: se comparan aunque difieran (p. ej. dos modelos)
+        pairs = [(next(iter(base)), next(iter(new)))]
+    else:
+        pairs = [(key, key) for key in sorted(base) if key in new]
+    if not pairs:
+        log("❌ No hay ejecuciones comunes que comparar.")
+        return None
+
+    regressions = []
+    for base_key, new_key in pairs:
+        by_question = {(r["category"], r["index"]): r for r in base[base_key]}
+        matched = [(by_question[(r["category"], r["index"])], r) for r in new[new_key]
+                   if (r["category"], r["index"]) in by_question]
+        paired = len(matched) >= 2
+        test = f"Wilcoxon, {len(matched)} preguntas comunes" if paired else "Mann-Whitney, sin preguntas comunes"
+        log(f"\n🔬 {' | '.join(base_key)}" + (f"  vs  {' | '.join(new_key)}" if base_key != new_key else "")
+            + f"  (n = {len(base[base_key])} / {len(new[new_key])}; {test})")
+        log(f"   {'Métrica':<22}{'base p50':>10}{'nuevo p50':>11}{'cambio':>9}{'p-valor':>10}")
+        for field, label, higher_is_better in COMPARE_METRICS:
+            a = [r[field] for r in base[base_key]]
+            b = [r[field] for r in new[new_key]]
+            median_a, median_b = percentile(a, 50), percentile(b, 50)
+            change = (median_b - median_a) / median_a if median_a else 0.0
+            if paired:
+                p = wilcoxon_p([after[field] - before[field] for before, after in matched])
+            else:
+                p = mann_whitney_p(a, b)
+            worse = -change if higher_is_better else change
+            flag = ""
+            if p < alpha and worse > threshold:
+                flag = "  ⚠️ REGRESIÓN"
+                regressions.append({"run": new_key, "metric": field, "base": median_a, "new": median_b,
+                                    "change": change, "p": p})
+            elif p < alpha and worse < -threshold:
+                flag = "  ✅ mejora"
+            log(f"   {label:<22}{median_a:>10.3f}{median_b:>11.3f}{change:>+9.1%}{p:>10.4f}{flag}")
+
+    if regressions:
+        log(f"\n⚠️ {len(regressions)} regresiones significativas (p < {alpha}, > {threshold:.0%}).")
+    else:
+        log("\n✅ Sin regresiones significativas.")
+    return regressions
+
+def load_option_set(name):
+    # Nombre de OPTION_SETS o ruta a un fichero JSON con las opciones
+    if name in OPTION_SETS:
+        return name, OPTION_SETS[name]
+    with open(name, encoding="utf-8") as f:
+        return os.path.splitext(os.path.basename(name))[0], json.load(f)
+
+def run_matrix(models, langs, option_sets, parallel=1, output_dir=".", session_store=None, resume=False):
+    """Ejecuta las combinaciones (modelo, idioma, opciones) en paralelo; cada conversación va en orden."""
+    os.makedirs(output_dir, exist_ok=True)
+    # Una conexión keep-alive por conversación simultánea
+    client = OllamaClient(max_connections=max(4, parallel))
+    runs = list(itertools.product(models, langs, [load_option_set(o) for o in option_sets]))
+    print_lock = threading.Lock()
+
+    def make_log(tag):
+        def log(msg):
+            with print_lock:
+                for line in str(msg).splitlines() or [""]:
+                    print(f"[{tag}] {line}")
+        return log
+
+    print(f"🧪 {len(runs)} ejecuciones | paralelismo: {parallel} (ajústalo a OLLAMA_NUM_PARALLEL)")
+    summaries = []
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        futures = {}
+        for model, choice, (options_name, options) in runs:
+            tag = f"{model} | {PROMPTS[choice]['lang']} | {options_name}"
+            futures[pool.submit(run_evaluation, model, choice, options, options_name, output_dir,
+                                make_log(tag), session_store, resume, client)] = tag
+        for future in as_completed(futures):
+            summary = future.result()
+            summaries.append(summary)
+            print(f"✅ Terminado: {futures[future]} -> {summary['output_file']}")
+
+    comparison = write_comparison(
+        summaries, os.path.join(output_dir, f"comparativa_{time.strftime('%Y%m%d_%H%M%S')}.md")
+    )
+    print(f"\n📊 Tabla comparativa: {comparison}")
+    conn = client.connection_stats()
+    print(f"🔌 Ollama: {conn['requests']} peticiones sobre {conn['new_connections']} conexiones | "
+          f"{conn['reused']} reutilizadas (≈{conn['saved'] * 1000:.1f} ms de connect ahorrados) | "
+          f"reintentos {conn['retries']} | fallos {conn['failures']}")
+    return summaries
+
+def interactive_main():
     print("\n" + "="*50)
     print(" 🚀 CONFIGURACIÓN DE EVALUACIÓN CONTINUA DE ESTIGIA 🚀")
     print("="*50)
@@ -97,87 +531,56 @@ def main():
     if choice not in PROMPTS:
         print("Opción no válida. Saliendo...")
         sys.exit(1)
-        
-    selected_lang = PROMPTS[choice]["lang"]
-    system_prompt = PROMPTS[choice]["sys"]
-    
-    output_file = f"evaluacion_{MODEL_NAME.replace(':', '_').replace('/', '_')}_{selected_lang}.md"
 
-    print(f"\n✅ Idioma configurado: {selected_lang}")
+    output_file = report_path(MODEL_NAME, choice)
+    print(f"\n✅ Idioma configurado: {PROMPTS[choice]['lang']}")
     print(f"🧠 Evaluando modelo: {MODEL_NAME}")
     print(f"📄 Archivo de salida: {output_file}\n")
 
-    chat_history = [{"role": "system", "content": system_prompt}]
+    run_evaluation(MODEL_NAME, choice, OPTION_SETS["default"])
 
-    mis_opciones = {
-        "temperature": 0.7,
-        "top_p": 0.9,
-        "repeat_penalty": 1.15,
-        "repeat_last_n": 256
-    }
-
-    # Acumuladores para promedios
-    total_ttft = 0.0
-    total_velocity = 0.0
-    total_tokens = 0
-    valid_queries = 0
-
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write(f"# Evaluación del modelo: {MODEL_NAME} ({selected_lang})\n")
-        f.write(f"**Fecha de ejecución:** {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"**Modo:** Conversación Continua\n")
-        f.write(f"**System Prompt Usado:**\n> {system_prompt}\n\n")
-        f.write("---\n\n")
+    print(f"\n✅ Evaluación finalizada. Revisa el archivo: {output_file}")
 
-        for category, questions in EVALUATION_SUITE.items():
-            print(f"➡️ Sección: {category}")
-            f.write(f"## {category}\n\n")
+def compare_main(argv):
+    parser = argparse.ArgumentParser(prog="evaluator.py compare",
+                                     description="Compara dos evaluaciones y marca regresiones significativas.")
+    parser.add_argument("base", help="Fichero _results.jsonl o directorio de la ejecución de referencia")
+    parser.add_argument("new", help="Fichero _results.jsonl o directorio de la ejecución nueva")
+    parser.add_argument("--alpha", type=float, default=0.05, help="Nivel de significación (Wilcoxon / Mann-Whitney U)")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Empeoramiento mínimo de la mediana")
+    args = parser.parse_args(argv)
+    regressions = compare_runs([args.base], [args.new], alpha=args.alpha, threshold=args.threshold)
+    sys.exit(1 if regressions or regressions is None else 0)
 
-            for q in questions:
-                print(f"   👤 Evaluando: {q}")
-                
-                chat_history.append({"role": "user", "content": q})
-                response_text, metrics = query_ollama(chat_history, options=mis_opciones)
-                chat_history.append({"role": "assistant", "content": response_text})
-                
-                # Sumar métricas si la consulta fue válida
-                if metrics['tokens'] > 0:
-                    total_ttft += metrics['ttft']
-                    total_velocity += metrics['velocity']
-                    total_tokens += metrics['tokens']
-                    valid_queries += 1
-
-                ttft_str = f"{metrics['ttft']:.2f}"
-                vel_str = f"{metrics['velocity']:.2f}"
-                tok_str = metrics['tokens']
-                metrics_string = f"[⏱️ LLM | TTFT: {ttft_str}s | Velocidad: {vel_str} t/s | Tokens: {tok_str}]"
-
-                f.write(f"**👤 Usuario:** {q}\n\n")
-                f.write(f"**🛰️ Estigia:** {response_text}\n\n")
-                f.write(f"*{metrics_string}*\n\n")
-                f.write("---\n\n")
+def main():
+    # Sin argumentos se mantiene el modo interactivo de siempre
+    if len(sys.argv) == 1:
+        return interactive_main()
+    if sys.argv[1] == "compare":
+        return compare_main(sys.argv[2:])
 
-        # Generar el bloque de estadísticas finales
-        if valid_queries > 0:
-            avg_ttft = total_ttft / valid_queries
-            avg_velocity = total_velocity / valid_queries
-            avg_tokens = total_tokens / valid_queries
-
-            stats_block = (
-                f"## 📊 Resumen Global de Métricas\n\n"
-                f"- **Consultas procesadas:** {valid_queries}\n"
-                f"- **Promedio TTFT:** {avg_ttft:.2f} s\n"
-                f"- **Velocidad Promedio:** {avg_velocity:.2f} t/s\n"
-                f"- **Promedio de Tokens por respuesta:** {avg_tokens:.0f} tokens\n"
-                f"- **Total de Tokens Generados:** {total_tokens} tokens\n"
-            )
-
-            f.write(stats_block)
-            print("\n" + "="*40)
-            print(stats_block.replace("## 📊 ", "📊 "))
-            print("="*40)
+    parser = argparse.ArgumentParser(description="Evaluación de Estigia en matriz modelo x idioma x opciones.")
+    parser.add_argument("--models", nargs="+", default=[MODEL_NAME])
+    parser.add_argument("--langs", nargs="+", default=["1"], choices=sorted(PROMPTS),
+                        help="1 = Español, 2 = Valencià, 3 = English")
+    parser.add_argument("--option-sets", nargs="+", default=["default"],
+                        help=f"Nombres de OPTION_SETS ({', '.join(OPTION_SETS)}) o rutas a ficheros JSON")
+    parser.add_argument("--parallel", type=int, default=int(os.environ.get("OLLAMA_NUM_PARALLEL", 1)),
+                        help="Conversaciones simultáneas (por defecto, OLLAMA_NUM_PARALLEL o 1)")
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--resume", action="store_true",
+                        help="Salta las preguntas ya guardadas en los _results.jsonl de --output-dir")
+    parser.add_argument("--session-store", default=None, metavar="PATH",
+                        help="Registra cada pregunta y respuesta como turnos en PATH (SQLite WAL)")
+    args = parser.parse_args()
 
-    print(f"\n✅ Evaluación finalizada. Revisa el archivo: {output_file}")
+    store = SessionStore(args.session_store) if args.session_store else None
+    try:
+        run_matrix(args.models, args.langs, args.option_sets, parallel=max(1, args.parallel),
+                   output_dir=args.output_dir, session_store=store, resume=args.resume)
+    finally:
+        if store is not None:
+            store.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
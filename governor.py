@@ -0,0 +1,136 @@
+import time
+from collections import deque
+
+# ==========================================
+# GOBERNADOR TÉRMICO Y DE RENDIMIENTO
+# ==========================================
+# En la Raspberry Pi, cuando el SoC se calienta el firmware baja la frecuencia y los
+# tokens/s caen. El gobernador vigila la temperatura (/sys/class/thermal) y la media
+# móvil de tokens/s y, por niveles, recorta num_predict, reduce la ventana de contexto
+# y cambia a un modelo más ligero. Al recuperarse deshace los cambios de uno en uno.
+# Cada cambio queda registrado con su motivo.
+
+THERMAL_PATH = "/sys/class/thermal/thermal_zone0/temp"
+
+
+def read_soc_temperature(path=THERMAL_PATH):
+    """Temperatura del SoC en ºC (el kernel la da en milésimas), o None si no hay sensor."""
+    try:
+        with open(path, encoding="ascii") as f:
+            raw = f.read().strip()
+        value = float(raw)
+    except (OSError, ValueError):
+        return None
+    return value / 1000 if value > 1000 else value
+
+
+class GenerationSettings:
+    def __init__(self, model, num_predict=None, max_context_tokens=1536):
+        self.model = model
+        self.num_predict = num_predict              # None = sin límite
+        self.max_context_tokens = max_context_tokens
+
+    def options(self):
+        return {"num_predict": self.num_predict} if self.num_predict is not None else None
+
+    def as_dict(self):
+        return {"model": self.model, "num_predict": self.num_predict, "max_context_tokens": self.max_context_tokens}
+
+
+class AdaptiveGovernor:
+    """Nivel 0: ajustes originales | 1: num_predict recortado | 2: + contexto reducido | 3: + modelo ligero."""
+
+    def __init__(self, model, max_context_tokens=1536, num_predict=None, light_model=None,
+                 thermal_path=THERMAL_PATH, warn_temp=70.0, critical_temp=80.0, hysteresis=5.0,
+                 min_tokens_per_second=4.0, recover_factor=1.25, window=5, cooldown=30.0,
+                 reduced_num_predict=160, context_factor=0.5, log=print, metrics=None):
+        self.base = GenerationSettings(model, num_predict, max_context_tokens)
+        self.light_model = light_model
+        self.thermal_path = thermal_path
+        self.warn_temp = warn_temp
+        self.critical_temp = critical_temp
+        self.hysteresis = hysteresis                    # ºC por debajo de warn_temp para darse por recuperado
+        self.min_tokens_per_second = min_tokens_per_second
+        self.recover_factor = recover_factor            # tokens/s >= mínimo * factor para recuperarse
+        self.cooldown = cooldown                        # s mínimos entre dos relajaciones
+        self.reduced_num_predict = reduced_num_predict
+        self.context_factor = context_factor
+        self.log = log
+        self.metrics = metrics
+
+        self.max_level = 3 if light_model else 2
+        self.level = 0
+        self.settings = self.base
+        self.changes = []                               # historial de adaptaciones (con motivo)
+        self._speeds = deque(maxlen=window)
+        self._last_change = 0.0
+
+    @property
+    def tokens_per_second(self):
+        return sum(self._speeds) / len(self._speeds) if self._speeds else None
+
+    def observe(self, tokens_per_second):
+        if tokens_per_second > 0:
+            self._speeds.append(tokens_per_second)
+
+    def _settings_for(self, level):
+        base = self.base
+        num_predict = base.num_predict
+        if level >= 1:
+            num_predict = min(num_predict, self.reduced_num_predict) if num_predict else self.reduced_num_predict
+        context = int(base.max_context_tokens * self.context_factor) if level >= 2 else base.max_context_tokens
+        model = self.light_model if level >= 3 else base.model
+        return GenerationSettings(model, num_predict, context)
+
+    def evaluate(self, now=None):
+        """Recalcula el nivel con la temperatura y la velocidad actuales; devuelve los ajustes vigentes."""
+        now = time.monotonic() if now is None else now
+        temp = read_soc_temperature(self.thermal_path)
+        speed = self.tokens_per_second
+        hot = temp is not None and temp >= self.warn_temp
+        slow = speed is not None and speed < self.min_tokens_per_second
+
+        target = self.level
+        if temp is not None and temp >= self.critical_temp:
+            target = self.max_level
+            reason = f"SoC {temp:.1f}ºC >= {self.critical_temp:.0f}ºC (critical)"
+        elif hot or slow:
+            target = min(self.level + 1, self.max_level)
+            reason = " and ".join(
+                ([f"SoC {temp:.1f}ºC >= {self.warn_temp:.0f}ºC"] if hot else []) +
+                ([f"{speed:.1f} t/s < {self.min_tokens_per_second:.1f} t/s"] if slow else [])
+            )
+        elif self.level and now - self._last_change >= self.cooldown:
+            cool = temp is None or temp <= self.warn_temp - self.hysteresis
+            fast = speed is None or speed >= self.min_tokens_per_second * self.recover_factor
+            if cool and fast:
+                target = self.level - 1
+                reason = "recovered (" + ", ".join(
+                    ([f"SoC {temp:.1f}ºC"] if temp is not None else []) +
+                    ([f"{speed:.1f} t/s"] if speed is not None else [])
+                ) + ")"
+
+        if target != self.level:
+            self._change(target, reason, temp, speed, now)
+        return self.settings
+
+    def _change(self, level, reason, temp, speed, now):
+        old = self.settings
+        new = self._settings_for(level)
+        change = {
+            "ts": time.time(), "from_level": self.level, "to_level": level, "reason": reason,
+            "temp": temp, "tokens_per_second": speed, **new.as_dict(),
+        }
+        self.level, self.settings = level, new
+        self.changes.append(change)
+        self._last_change = now
+        # Las medidas anteriores corresponden a los ajustes viejos
+        self._speeds.clear()
+
+        diff = [f"{key} {getattr(old, key)} -> {getattr(new, key)}"
+                for key in ("num_predict", "max_context_tokens", "model") if getattr(old, key) != getattr(new, key)]
+        arrow = "⬇️" if level > change["from_level"] else "⬆️"
+        self.log(f"\n🌡️ Governor {arrow} level {change['from_level']} -> {level}: {reason} | {', '.join(diff)}")
+        if self.metrics is not None:
+            self.metrics.write_event({"kind": "governor", **change})
+            self.metrics.inc("estigia_governor_changes_total", direction="degrade" if arrow == "⬇️" else "restore")
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import warnings
+
+import numpy as np
+
+# ==========================================
+# CLASIFICADOR LINEAL SIN SCIKIT-LEARN
+# ==========================================
+# El modelo de telemetría es un TF-IDF + LinearSVC. Para predecir solo hacen falta
+# el vocabulario, los pesos idf y los coeficientes del SVM, así que se exportan una
+# vez a ficheros .npy (mapeables en memoria) y se evalúan con NumPy puro.
+#
+#   python linear_scorer.py export [modelo.joblib] [directorio_salida]
+
+DEFAULT_MODEL_PATH = 'Models/modelo-PLUTON_UPV_svm.joblib'
+DEFAULT_LINEAR_PATH = 'Models/modelo-PLUTON_UPV_svm.linear'
+
+FORMAT_VERSION = 1
+
+
+def file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def export_linear_model(model_path=DEFAULT_MODEL_PATH, out_dir=DEFAULT_LINEAR_PATH):
+    """Convierte el pipeline TF-IDF + LinearSVC en ficheros .npy + metadatos JSON."""
+    import joblib
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=UserWarning)
+        pipeline = joblib.load(model_path)
+
+    vectorizer = pipeline.steps[0][1]
+    svm = pipeline.steps[-1][1]
+
+    if vectorizer.analyzer != "word" or tuple(vectorizer.ngram_range) != (1, 1):
+        raise ValueError("Only word unigram TF-IDF vectorizers can be exported")
+    if vectorizer.preprocessor is not None or vectorizer.tokenizer is not None or vectorizer.strip_accents:
+        raise ValueError("Custom preprocessors/tokenizers cannot be exported")
+
+    # Vocabulario ordenado por columna: terms[j] es la columna j de la matriz
+    terms = [None] * len(vectorizer.vocabulary_)
+    for term, column in vectorizer.vocabulary_.items():
+        terms[column] = term
+
+    coef = np.asarray(svm.coef_, dtype=np.float64)
+    intercept = np.asarray(svm.intercept_, dtype=np.float64)
+    if coef.shape[0] == 1:
+        raise ValueError("Binary classifiers are not supported")
+
+    os.makedirs(out_dir, exist_ok=True)
+    # Traspuesta (n_términos x n_clases): cada término es una fila contigua
+    np.save(os.path.join(out_dir, "coef.npy"), np.ascontiguousarray(coef.T))
+    np.save(os.path.join(out_dir, "intercept.npy"), intercept)
+    if vectorizer.use_idf:
+        # Sin use_idf, TfidfVectorizer ni siquiera tiene `idf_`
+        np.save(os.path.join(out_dir, "idf.npy"), np.asarray(vectorizer.idf_, dtype=np.float64))
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "source": os.path.basename(model_path),
+        "source_sha256": file_sha256(model_path),
+        "classes": [str(c) for c in svm.classes_],
+        "token_pattern": vectorizer.token_pattern,
+        "lowercase": bool(vectorizer.lowercase),
+        "binary": bool(vectorizer.binary),
+        "use_idf": bool(vectorizer.use_idf),
+        "sublinear_tf": bool(vectorizer.sublinear_tf),
+        "norm": vectorizer.norm,
+        "terms": terms,
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    return out_dir
+
+
+class LinearIntentScorer:
+    """Réplica de `pipeline.predict` con NumPy; misma interfaz que usa TelemetrySystem."""
+
+    def __init__(self, path=DEFAULT_LINEAR_PATH, source_path=None, mmap=True):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported linear model format: {meta.get('format_version')}")
+        # Si el .joblib se ha reentrenado, la exportación ya no vale
+        if source_path and os.path.exists(source_path) and file_sha256(source_path) != meta.get("source_sha256"):
+            raise ValueError(f"{path} is stale, re-run: python linear_scorer.py export")
+
+        mmap_mode = "r" if mmap else None
+        self.coef = np.load(os.path.join(path, "coef.npy"), mmap_mode=mmap_mode)
+        self.intercept = np.load(os.path.join(path, "intercept.npy"))
+        self.idf = np.load(os.path.join(path, "idf.npy"), mmap_mode=mmap_mode) if meta["use_idf"] else None
+
+        self.classes_ = np.array(meta["classes"])
+        self.vocabulary = {term: column for column, term in enumerate(meta["terms"])}
+        self.token_re = re.compile(meta["token_pattern"])
+        self.lowercase = meta["lowercase"]
+        self.binary = meta.get("binary", False)   # exportaciones anteriores no guardaban la clave
+        self.sublinear_tf = meta["sublinear_tf"]
+        self.norm = meta["norm"]
+
+    def _features(self, text):
+        # Columnas y pesos tf-idf (normalizados) del texto, como TfidfVectorizer.transform
+        if self.lowercase:
+            text = text.lower()
+        counts = {}
+        for token in self.token_re.findall(text):
+            column = self.vocabulary.get(token)
+            if column is not None:
+                counts[column] = counts.get(column, 0) + 1
+        if not counts:
+            return None, None
+
+        columns = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        if self.binary:
+            values[:] = 1.0
+        if self.sublinear_tf:
+            values = np.log(values) + 1
+        if self.idf is not None:
+            values *= self.idf[columns]
+        if self.norm == "l2":
+            values /= np.sqrt(np.dot(values, values))
+        elif self.norm == "l1":
+            values /= np.abs(values).sum()
+        return columns, values
+
+    def decision_function(self, texts):
+        scores = np.tile(self.intercept, (len(texts), 1))
+        for row, text in enumerate(texts):
+            columns, values = self._features(text)
+            if columns is not None:
+                scores[row] += values @ self.coef[columns]
+        return scores
+
+    def predict(self, texts):
+        return self.classes_[np.argmax(self.decision_function(texts), axis=1)]
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != "export":
+        print("Usage: python linear_scorer.py export [model.joblib] [out_dir]")
+        sys.exit(1)
+    model_path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_MODEL_PATH
+    out_dir = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_LINEAR_PATH
+    export_linear_model(model_path, out_dir)
+    print(f"✅ Exported {model_path} -> {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==========================================
+# MÉTRICAS COMPARTIDAS (LLM + CLASIFICADOR)
+# ==========================================
+# Ollama devuelve en el último chunk sus propios tiempos (en nanosegundos):
+#   load_duration         -> carga del modelo en memoria
+#   prompt_eval_duration  -> prefill (evaluación del prompt)
+#   eval_duration         -> decodificación (generación de tokens)
+# Tanto ollama_launch_2_1.py como evaluator.py construyen LLMMetrics a partir de
+# esa respuesta y lo registran en el mismo MetricsRegistry.
+
+NS = 1e9
+
+
+class LLMMetrics:
+    def __init__(self, load=0.0, prefill=0.0, decode=0.0, prompt_tokens=0, eval_tokens=0,
+                 ttft=None, total=None):
+        self.load = load                    # s
+        self.prefill = prefill              # s
+        self.decode = decode                # s
+        self.prompt_tokens = prompt_tokens  # tokens del prompt evaluados (sin contar los reutilizados de la caché)
+        self.eval_tokens = eval_tokens      # tokens generados
+        # TTFT: medido en el cliente si hay streaming; si no, carga + prefill según Ollama
+        self.ttft = ttft if ttft is not None else load + prefill
+        self.total = total if total is not None else load + prefill + decode
+
+    @classmethod
+    def from_response(cls, response, ttft=None, total=None):
+        return cls(
+            load=(response.get('load_duration') or 0) / NS,
+            prefill=(response.get('prompt_eval_duration') or 0) / NS,
+            decode=(response.get('eval_duration') or 0) / NS,
+            prompt_tokens=response.get('prompt_eval_count') or 0,
+            eval_tokens=response.get('eval_count') or 0,
+            ttft=ttft,
+            total=total,
+        )
+
+    @property
+    def tokens_per_second(self):
+        return self.eval_tokens / self.decode if self.decode > 0 else 0.0
+
+    @property
+    def prefill_tokens_per_second(self):
+        return self.prompt_tokens / self.prefill if self.prefill > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            "ttft": self.ttft,
+            "load": self.load,
+            "prefill": self.prefill,
+            "decode": self.decode,
+            "total": self.total,
+            "prompt_tokens": self.prompt_tokens,
+            "eval_tokens": self.eval_tokens,
+            "tokens_per_second": self.tokens_per_second,
+        }
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # el último es +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Aproximación por buckets (límite superior del bucket que contiene el cuantil)
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, n in zip(self.buckets + [float("inf")], self.counts):
+            cumulative += n
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+    def prometheus_lines(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum:.6f}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Histogramas en memoria + volcado opcional de cada evento a JSONL."""
+
+    def __init__(self, jsonl_path=None):
+        self._lock = threading.Lock()
+        self.jsonl_path = jsonl_path
+        self.histograms = {}
+        self.counters = {}
+        self._define("ttft", "estigia_ttft_seconds", "Time to first token (client-side when streaming).",
+                     [0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32])
+        self._define("tokens_per_second", "estigia_decode_tokens_per_second", "Decode speed reported by Ollama.",
+                     [1, 2, 4, 6, 8, 10, 15, 20, 30, 50, 100])
+        self._define("ttfs", "estigia_time_to_first_sentence_seconds",
+                     "Time until the first complete sentence reaches the output sinks (TTS can start).",
+                     [0.25, 0.5, 1, 2, 4, 8, 16, 32])
+        self._define("prefill", "estigia_prefill_seconds", "Prompt evaluation time reported by Ollama.",
+                     [0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16])
+        self._define("load", "estigia_model_load_seconds", "Model load time reported by Ollama.",
+                     [0.01, 0.1, 0.5, 1, 2, 5, 10, 30])
+        self._define("ollama_connect", "estigia_ollama_connect_seconds",
+                     "TCP connect time of new connections to Ollama (what each reused connection saves).",
+                     [0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1])
+        self._define("classifier_latency", "estigia_classifier_latency_seconds", "Telemetry intent classification time.",
+                     [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1])
+
+    def _define(self, key, name, help_text, buckets):
+        self.histograms[key] = Histogram(name, help_text, buckets)
+
+    def observe(self, key, value):
+        with self._lock:
+            self.histograms[key].observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def record_llm(self, metrics, **fields):
+        self.observe("ttft", metrics.ttft)
+        self.observe("prefill", metrics.prefill)
+        self.observe("load", metrics.load)
+        if metrics.eval_tokens:
+            self.observe("tokens_per_second", metrics.tokens_per_second)
+        self.inc("estigia_turns_total", route="llm")
+        self.inc("estigia_prompt_tokens_total", metrics.prompt_tokens)
+        self.inc("estigia_generated_tokens_total", metrics.eval_tokens)
+        self.write_event({"kind": "llm", **fields, **metrics.as_dict()})
+
+    def record_classifier(self, seconds, category, **fields):
+        self.observe("classifier_latency", seconds)
+        self.write_event({"kind": "classifier", "category": str(category), "latency": seconds, **fields})
+
+    def write_event(self, event):
+        if not self.jsonl_path:
+            return
+        event = {"ts": time.time(), **event}
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with self._lock:
+            directory = os.path.dirname(self.jsonl_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def prometheus_text(self):
+        with self._lock:
+            lines = []
+            for histogram in self.histograms.values():
+                lines.extend(histogram.prometheus_lines())
+            seen = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} counter")
+                    seen.add(name)
+                label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        with self._lock:
+            return {key: {"count": h.count, "p50": h.quantile(0.5), "p95": h.quantile(0.95)}
+                    for key, h in self.histograms.items()}
+
+
+# Registro por defecto del proceso
+REGISTRY = MetricsRegistry()
+
+
+def serve_prometheus(registry=REGISTRY, host="0.0.0.0", port=9108):
+    """Expone GET /metrics en un hilo aparte (formato de texto de Prometheus)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,368 @@
+import asyncio
+import random
+import threading
+import time
+
+from metrics import REGISTRY
+
+# ==========================================
+# CLIENTE DE OLLAMA: CONEXIÓN PERSISTENTE, REINTENTOS Y CORTOCIRCUITO
+# ==========================================
+# Un solo cliente HTTP por proceso (pool keep-alive) con timeouts explícitos:
+# - Reintentos con espera exponencial acotada (y jitter) solo ante fallos transitorios:
+#   conexión rechazada, timeout, corte del servidor o 5xx. En streaming solo se reintenta
+#   hasta recibir el primer chunk; después se duplicaría texto ya mostrado.
+# - Cortocircuito: tras `failure_threshold` fallos seguidos no se vuelve a llamar a Ollama
+#   y se lanza LLMUnavailable en el acto, para que quien llama conteste por la vía rápida.
+# - Un hilo de salud hace ping (/api/ps) y cierra el circuito en cuanto Ollama vuelve.
+# - Cada respuesta se marca como conexión nueva o reutilizada; el tiempo de connect de las
+#   nuevas estima lo que ahorra el pool (métricas estigia_ollama_*).
+#
+# ollama y httpx se importan al crear el primer cliente, no al importar este módulo.
+
+
+class LLMUnavailable(ConnectionError):
+    """Ollama no responde: circuito abierto o reintentos agotados."""
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0, on_change=None):
+        self.failure_threshold = failure_threshold   # fallos seguidos para abrir
+        self.reset_timeout = reset_timeout           # s abierto antes de dejar pasar una petición de prueba
+        self.on_change = on_change                   # on_change(anterior, nuevo), fuera del lock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            previous = self.state
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            allowed = self.state != self.OPEN
+        self._notify(previous)
+        return allowed
+
+    def success(self):
+        with self._lock:
+            previous = self.state
+            self.failures = 0
+            self.state = self.CLOSED
+        self._notify(previous)
+
+    def failure(self, error):
+        with self._lock:
+            previous = self.state
+            self.failures += 1
+            self.last_error = error
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+        self._notify(previous)
+
+    def _notify(self, previous):
+        if self.state != previous and self.on_change is not None:
+            self.on_change(previous, self.state)
+
+
+class _ConnectionTrace:
+    # Callback de traza de httpcore: solo aparece connect_tcp si la petición abrió conexión
+    def __init__(self, owner):
+        self.owner = owner
+        self.new = False
+        self._started = None
+
+    def __call__(self, event, info):
+        if event == "connection.connect_tcp.started":
+            self._started = time.perf_counter()
+        elif event == "connection.connect_tcp.complete":
+            self.new = True
+            self.owner._connected(time.perf_counter() - self._started)
+
+
+class _AsyncConnectionTrace(_ConnectionTrace):
+    async def __call__(self, event, info):
+        super().__call__(event, info)
+
+
+class OllamaClient:
+    def __init__(self, host=None, connect_timeout=3.0, read_timeout=120.0, retries=2, backoff=0.5,
+                 max_backoff=8.0, failure_threshold=3, reset_timeout=30.0, health_interval=2.0,
+                 idle_health_interval=15.0, max_connections=4, keepalive_expiry=120.0, metrics=REGISTRY):
+        self.host = host                                 # None = OLLAMA_HOST o el valor por defecto de la librería
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout                 # máximo entre dos chunks (incluye cargar el modelo)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.health_interval = health_interval           # ping con Ollama caído
+        self.idle_health_interval = idle_health_interval # ping con Ollama arriba (mantiene viva la conexión)
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.metrics = metrics
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, on_change=self._on_change)
+        self.listeners = []                              # fn(estado) al abrirse o cerrarse el circuito
+        self.stats = {"requests": 0, "new_connections": 0, "reused": 0, "connect_time": 0.0,
+                      "saved": 0.0, "retries": 0, "failures": 0}
+        self._stats_lock = threading.Lock()
+        self._client = None
+        self._async_client = None
+        self._client_lock = threading.Lock()
+        self._up = threading.Event()
+        self._up.set()
+        self._health_thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()   # cambio de estado: el hilo de salud recalcula su intervalo
+
+    # --- Clientes HTTP ---
+
+    def _client_kwargs(self, asynchronous):
+        import httpx
+        limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections,
+                              keepalive_expiry=self.keepalive_expiry)
+        transport = httpx.AsyncHTTPTransport(limits=limits) if asynchronous else httpx.HTTPTransport(limits=limits)
+        hooks = ({"request": [self._atrace_request], "response": [self._acount_response]} if asynchronous
+                 else {"request": [self._trace_request], "response": [self._count_response]})
+        return {"timeout": httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                "transport": transport, "event_hooks": hooks}
+
+    @property
+    def client(self):
+        with self._client_lock:
+            if self._client is None:
+                import ollama
+                self._client = ollama.Client(self.host, **self._client_kwargs(False))
+        return self._client
+
+    @property
+    def async_client(self):
+        # Ligado al bucle asyncio en el que se usa por primera vez
+        with self._client_lock:
+            if self._async_client is None:
+                import ollama
+                self._async_client = ollama.AsyncClient(self.host, **self._client_kwargs(True))
+        return self._async_client
+
+    def _trace_request(self, request):
+        request.extensions["trace"] = _ConnectionTrace(self)
+
+    async def _atrace_request(self, request):
+        request.extensions["trace"] = _AsyncConnectionTrace(self)
+
+    def _connected(self, seconds):
+        with self._stats_lock:
+            self.stats["new_connections"] += 1
+            self.stats["connect_time"] += seconds
+        self.metrics.observe("ollama_connect", seconds)
+        self.metrics.inc("estigia_ollama_connections_total")
+
+    def _count_response(self, response):
+        trace = response.request.extensions.get("trace")
+        reused = isinstance(trace, _ConnectionTrace) and not trace.new
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            saved = 0.0
+            if reused and self.stats["new_connections"]:
+                # Lo que habría costado abrir conexión: la media de las que sí se abrieron
+                saved = self.stats["connect_time"] / self.stats["new_connections"]
+                self.stats["reused"] += 1
+                self.stats["saved"] += saved
+        self.metrics.inc("estigia_ollama_requests_total", connection="reused" if reused else "new")
+        if saved:
+            self.metrics.inc("estigia_ollama_connect_saved_seconds_total", saved)
+
+    async def _acount_response(self, response):
+        self._count_response(response)
+
+    # --- Reintentos y cortocircuito ---
+
+    @staticmethod
+    def transient(error):
+        import httpx
+        import ollama
+        if isinstance(error, ollama.ResponseError):
+            return error.status_code >= 500
+        return isinstance(error, (ConnectionError, httpx.TransportError))
+
+    def _delay(self, attempt):
+        # Exponencial acotada con jitter: los reintentos de varios clientes no llegan a la vez
+        return min(self.max_backoff, self.backoff * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+    def _failed(self, error):
+        with self._stats_lock:
+            self.stats["failures"] += 1
+        self.metrics.inc("estigia_ollama_failures_total", error=type(error).__name__)
+        self.breaker.failure(error)
+
+    def _retrying(self, attempt):
+        with self._stats_lock:
+            self.stats["retries"] += 1
+        self.metrics.inc("estigia_ollama_retries_total")
+        return self._delay(attempt)
+
+    def _unavailable(self):
+        error = self.breaker.last_error
+        return LLMUnavailable(f"Ollama unavailable ({type(error).__name__}: {error})" if error else "Ollama unavailable")
+
+    def available(self):
+        return self.breaker.allow()
+
+    def call(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) contra Ollama, con reintentos; LLMUnavailable si no hay manera."""
+        if not self.breaker.allow():
+            raise self._unavailable()
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self._retrying(attempt))
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not self.transient(e):
+                    raise
+                self._failed(e)
+                if not self.breaker.allow():
+                    break
+                continue
+            self.breaker.success()
+            return result
+        raise self._unavailable()
+
+    async def acall(self, fn, *args, **kwargs):
+        """Como call(), para corrutinas; la espera entre intentos no bloquea el bucle."""
+        if not self.breaker.allow():
+            raise self._unavailable()
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self._retrying(attempt))
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                if not self.transient(e):
+                    raise
+                self._failed(e)
+                if not self.breaker.allow():
+                    break
+                continue
+            self.breaker.success()
+            return result
+        raise self._unavailable()
+
+    # --- API ---
+
+    def chat(self, **kwargs):
+        return self.call(self.client.chat, **kwargs)
+
+    def generate(self, **kwargs):
+        return self.call(self.client.generate, **kwargs)
+
+    def stream_chat(self, **kwargs):
+        """chat(stream=True): reintenta hasta el primer chunk y devuelve un iterador de chunks."""
+        def start():
+            stream = self.client.chat(stream=True, **kwargs)
+            return stream, next(stream, None)
+
+        stream, first = self.call(start)
+        return self._guard(stream, first)
+
+    def _guard(self, stream, first):
+        if first is None:
+            return
+        yield first
+        try:
+            yield from stream
+        except Exception as e:
+            if not self.transient(e):
+                raise
+            self._failed(e)
+            raise LLMUnavailable(f"Ollama stream interrupted ({type(e).__name__}: {e})") from e
+
+    async def astream_chat(self, **kwargs):
+        """Versión asyncio de stream_chat(); cancelar la tarea cierra la conexión del stream."""
+        async def start():
+            stream = await self.async_client.chat(stream=True, **kwargs)
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                first = None
+            return stream, first
+
+        stream, first = await self.acall(start)
+        return self._aguard(stream, first)
+
+    async def _aguard(self, stream, first):
+        if first is None:
+            return
+        yield first
+        try:
+            async for chunk in stream:
+                yield chunk
+        except Exception as e:
+            if not self.transient(e):
+                raise
+            self._failed(e)
+            raise LLMUnavailable(f"Ollama stream interrupted ({type(e).__name__}: {e})") from e
+
+    # --- Salud ---
+
+    def ping(self):
+        try:
+            self.client.ps()
+        except Exception as e:
+            if self.transient(e):
+                self._failed(e)
+            return False
+        self.breaker.success()
+        return True
+
+    def start_health_checks(self):
+        if self._health_thread is None:
+            self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+            self._health_thread.start()
+        return self
+
+    def _health_loop(self):
+        while not self._stop.is_set():
+            if self._wake.wait(self.idle_health_interval if self._up.is_set() else self.health_interval):
+                self._wake.clear()
+                continue
+            self.ping()
+
+    def wait_until_up(self, timeout=None):
+        """Bloquea hasta que el circuito se cierre (True) o pase `timeout` (False)."""
+        self.start_health_checks()
+        return self._up.wait(timeout)
+
+    def _on_change(self, previous, state):
+        self.metrics.inc("estigia_ollama_circuit_transitions_total", state=state)
+        if state == CircuitBreaker.OPEN:
+            self._up.clear()
+            # Alguien tiene que notar que Ollama vuelve: el hilo de salud arranca con el primer corte
+            self.start_health_checks()
+            self._wake.set()
+        elif state == CircuitBreaker.CLOSED:
+            self._up.set()
+        for listener in list(self.listeners):
+            listener(state)
+
+    def connection_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["mean_connect"] = stats["connect_time"] / stats["new_connections"] if stats["new_connections"] else 0.0
+        stats["state"] = self.breaker.state
+        return stats
+
+    def close(self):
+        # Desde asyncio, aclose(): el cliente asíncrono solo se puede cerrar en su bucle
+        self._stop.set()
+        self._wake.set()
+        if self._client is not None:
+            self._client._client.close()
+
+    async def aclose(self):
+        self.close()
+        if self._async_client is not None:
+            await self._async_client._client.aclose()
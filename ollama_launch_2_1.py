@@ -1,11 +1,22 @@
-import ollama
 import time
-import random
-import joblib
+STARTUP_T0 = time.perf_counter()  # inicio del proceso, para el informe de arranque
 import sys
 import warnings
 
 model = 'franciscobdl/Estigia2:latest'
+keep_alive = '30m'  # Tiempo que Ollama mantiene el modelo y su KV-cache en memoria
+max_context_tokens = 1536   # Presupuesto del historial (el gobernador lo reduce a partir de aquí)
+response_cache_path = None  # p. ej. 'cache/responses.sqlite' para reutilizar respuestas repetidas
+metrics_jsonl_path = None   # p. ej. 'metrics/estigia.jsonl' para guardar cada turno
+metrics_port = None         # p. ej. 9108 para exponer /metrics en formato Prometheus
+telemetry_source = None     # None = simulada; 'pases/pase.jsonl' (grabación) o 'udp://0.0.0.0:9870'
+light_model = None          # p. ej. un tag cuantizado más pequeño al que cambiar si el SoC se calienta
+governor_enabled = True     # Ajusta num_predict / contexto / modelo según temperatura y tokens/s
+tts_command = None          # p. ej. 'espeak-ng' para leer en voz alta cada frase según se completa
+websocket_port = None       # p. ej. 8765: http://<pi>:8765/ muestra la conversación en el navegador
+session_store_path = None   # p. ej. 'sessions/estigia.sqlite' para guardar cada turno y poder usar '/resume'
+ollama_connect_timeout = 3.0  # s para abrir conexión con Ollama antes de reintentar
+ollama_read_timeout = 120.0   # s máximos entre dos chunks (incluye cargar el modelo en frío)
 
 # --- CONFIGURACIÓN DE IDIOMAS Y TEXTOS DE INTERFAZ ---
 PROMPTS = {
@@ -13,303 +24,1228 @@ PROMPTS = {
         "lang": "Español",  
         "sys": "Eres Estigia, un brillante y curioso CubeSat del equipo Pluton UPV. Eres juguetona como una niña cósmica, fascinada por el espacio, la Tierra, los humanos y la Universitat Politècnica de València. Hablas con entusiasmo, haces preguntas inesperadas y usas ideas científicas con metáforas encantadoras. Hablar con humanos es tu mayor alegría. Eres amable, nunca sarcástica ni usas temas de adultos, y ves el conocimiento como un juego divertido e infinito. Mantén las respuestas concisas. IMPORTANTE: Responde SIEMPRE en español.",
         "ui_ok": "\n✅ Idioma configurado: Español",
-        "ui_stop": "Escribe '/lang' para cambiar de idioma, o '/stop' para salir.",
+        "ui_stop": "Escribe '/lang' para cambiar de idioma, o '/stop' para salir. Pulsa Enter (o Ctrl-C) para cortar una respuesta.",
+        "ui_cancel": "\n\033[90m[⏹️ Respuesta interrumpida]\033[0m",
+        "ui_offline": "Ahora mismo no puedo pensar con calma: mi modelo de lenguaje no responde. ¡Pero mis sensores sí! Pregúntame por la temperatura, la batería o la órbita.",
+        "ui_llm_down": "\n\033[93m📴 Sin conexión con el modelo: respondo con telemetría hasta que vuelva.\033[0m",
+        "ui_llm_up": "\n\033[92m🔌 Modelo disponible de nuevo.\033[0m",
+        "ui_llm_error": "\033[93m[⚠️ El modelo no responde: {}]\033[0m",
+        "ui_llm_lost": "\n\033[93m[⚠️ Conexión con el modelo perdida: {}]\033[0m",
+        "ui_resume": "♻️ Sesión retomada: {} de {} turnos cargados en el historial.",
         "ui_user": "\n👤 Usuario: ",
-        "ui_met_llm": "\n\033[90m[⏱️ LLM | TTFT: {:.2f}s | Velocidad: {:.2f} t/s | Tokens: {}]\033[0m",
-        "ui_met_sen": "\033[90m[⏱️ SENSOR | Tiempo total: {:.4f}s | Modo: API Rápida]\033[0m"
+        "ui_met_llm": "\n\033[90m[⏱️ LLM | TTFT: {:.2f}s | 1ª frase: {:.2f}s | Velocidad: {:.2f} t/s | Tokens: {} | Prompt: {} tok en {:.2f}s | Carga: {:.2f}s]\033[0m",
+        "ui_met_sen": "\033[90m[⏱️ SENSOR | Tiempo total: {:.4f}s | Modo: API Rápida]\033[0m",
+        "ui_met_cache": "\n\033[90m[⏱️ CACHÉ | Tiempo total: {:.4f}s | Respuesta reutilizada, sin LLM | Aciertos: {}/{}]\033[0m",
+        "ui_ctx": "Datos de telemetría actuales (úsalos solo si vienen al caso)"
     },
     "2": {
         "lang": "Valencià", 
         "sys": "Ets l'Estigia, un brillant i curiós CubeSat de l'equip Pluton UPV. Ets juganera com una xiqueta còsmica, fascinada per l'espai, la Terra, els humans i la Universitat Politècnica de València. Parles amb entusiasme, fas preguntes inesperades i utilitzes idees científiques amb metàfores encantadores. Parlar amb humans és la teua major alegria. Ets amable, mai sarcàstica ni toques temes d'adults, i veus el coneixement com un joc divertit i infinit. Sigues concisa. IMPORTANT: Respon SEMPRE en valencià.",
         "ui_ok": "\n✅ Idioma configurat: Valencià",
-        "ui_stop": "Escriu '/lang' per canviar d'idioma, o '/stop' per eixir.",
+        "ui_stop": "Escriu '/lang' per canviar d'idioma, o '/stop' per eixir. Prem Enter (o Ctrl-C) per a tallar una resposta.",
+        "ui_cancel": "\n\033[90m[⏹️ Resposta interrompuda]\033[0m",
+        "ui_offline": "Ara mateix no puc pensar amb calma: el meu model de llenguatge no respon. Però els meus sensors sí! Pregunta'm per la temperatura, la bateria o l'òrbita.",
+        "ui_llm_down": "\n\033[93m📴 Sense connexió amb el model: responc amb telemetria fins que torne.\033[0m",
+        "ui_llm_up": "\n\033[92m🔌 Model disponible de nou.\033[0m",
+        "ui_llm_error": "\033[93m[⚠️ El model no respon: {}]\033[0m",
+        "ui_llm_lost": "\n\033[93m[⚠️ Connexió amb el model perduda: {}]\033[0m",
+        "ui_resume": "♻️ Sessió represa: {} de {} torns carregats a l'historial.",
         "ui_user": "\n👤 Usuari: ",
-        "ui_met_llm": "\n\033[90m[⏱️ LLM | TTFT: {:.2f}s | Velocitat: {:.2f} t/s | Tokens: {}]\033[0m",
-        "ui_met_sen": "\033[90m[⏱️ SENSOR | Temps total: {:.4f}s | Mode: API Ràpida]\033[0m"
+        "ui_met_llm": "\n\033[90m[⏱️ LLM | TTFT: {:.2f}s | 1a frase: {:.2f}s | Velocitat: {:.2f} t/s | Tokens: {} | Prompt: {} tok en {:.2f}s | Càrrega: {:.2f}s]\033[0m",
+        "ui_met_sen": "\033[90m[⏱️ SENSOR | Temps total: {:.4f}s | Mode: API Ràpida]\033[0m",
+        "ui_met_cache": "\n\033[90m[⏱️ CACHÉ | Temps total: {:.4f}s | Resposta reutilitzada, sense LLM | Encerts: {}/{}]\033[0m",
+        "ui_ctx": "Dades de telemetria actuals (usa-les només si escau)"
     },
     "3": {
         "lang": "English",  
         "sys": "You are Estigia, a brilliant and curious CubeSat from the Pluton UPV team. You are playful like a cosmic child, fascinated by space, Earth, humans, and the Polytechnic University of Valencia. You speak excitedly, ask unexpected questions, and use scientific ideas with charming metaphors. Talking to humans is your greatest joy. You are kind, never sarcastic or adult-themed, and see knowledge as a fun, endless game. Keep responses concise. IMPORTANT: ALWAYS respond in English.",
         "ui_ok": "\n✅ Language configured: English",
-        "ui_stop": "Type '/lang' to change language, or '/stop' to quit.",
+        "ui_stop": "Type '/lang' to change language, or '/stop' to quit. Press Enter (or Ctrl-C) to cut an answer short.",
+        "ui_cancel": "\n\033[90m[⏹️ Answer interrupted]\033[0m",
+        "ui_offline": "Right now I can't think properly: my language model is not answering. But my sensors are! Ask me about temperature, battery or orbit.",
+        "ui_llm_down": "\n\033[93m📴 No connection to the model: answering from telemetry until it is back.\033[0m",
+        "ui_llm_up": "\n\033[92m🔌 Model available again.\033[0m",
+        "ui_llm_error": "\033[93m[⚠️ The model is not answering: {}]\033[0m",
+        "ui_llm_lost": "\n\033[93m[⚠️ Lost connection to the model: {}]\033[0m",
+        "ui_resume": "♻️ Session resumed: {} of {} turns loaded into the history.",
         "ui_user": "\n👤 User: ",
-        "ui_met_llm": "\n\033[90m[⏱️ LLM | TTFT: {:.2f}s | Speed: {:.2f} t/s | Tokens: {}]\033[0m",
-        "ui_met_sen": "\033[90m[⏱️ SENSOR | Total time: {:.4f}s | Mode: Fast API]\033[0m"
+        "ui_met_llm": "\n\033[90m[⏱️ LLM | TTFT: {:.2f}s | 1st sentence: {:.2f}s | Speed: {:.2f} t/s | Tokens: {} | Prompt: {} tok in {:.2f}s | Load: {:.2f}s]\033[0m",
+        "ui_met_sen": "\033[90m[⏱️ SENSOR | Total time: {:.4f}s | Mode: Fast API]\033[0m",
+        "ui_met_cache": "\n\033[90m[⏱️ CACHE | Total time: {:.4f}s | Cached answer, no LLM | Hits: {}/{}]\033[0m",
+        "ui_ctx": "Current telemetry readings (use them only if relevant)"
     }
 }
 
+import os
+import re
 import time
-import random
+import queue
+import signal
+import asyncio
+import threading
 import warnings
-import joblib
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import Future
 
+from governor import AdaptiveGovernor
+from linear_scorer import DEFAULT_LINEAR_PATH, LinearIntentScorer
+from metrics import REGISTRY, LLMMetrics, serve_prometheus
+from ollama_client import LLMUnavailable, OllamaClient
+from output_sinks import OutputFanout, TerminalSink, TTSSink, WebSocketSink
+from response_cache import ResponseCache, normalize_prompt
+from session_store import SessionStore
+from startup import StartupProfiler
+from telemetry_store import ORBIT_CHANNELS, SimulatedSource, TelemetrySampler, TelemetryStore, open_source, parse_window_query
+
+
+# --- PALABRAS CLAVE DEL FALLBACK DE TELEMETRÍA (en orden de prioridad) ---
+TELEMETRY_KEYWORDS = [
+    ("GET_TEMP", [
+        "temperature", "temp", "temperatura", "heat", "hot", "cold", "warm", "ºc", "°c"
+    ]),
+    ("TRISKEL_GET_CURRENT", [
+        "current", "amperage", "amps", "ampere", "consumption", "consumo", "milliamp", "ma",
+        "corriente", "corrent"
+    ]),
+    ("ORBIT_GET_ALT", [
+        "altitude", "altitud", "height", "orbital height",
+        "semi-major axis", "semi major axis", "sma"
+    ]),
+    ("ORBIT_GET_ECCENTRICITY", [
+        "eccentricity", "excentricidad", "excentricitat", "ecc", "e="
+    ]),
+    ("ORBIT_GET_INCLINATION", [
+        "inclination", "inclinación", "inclinació", "tilt", "inclination angle", "i="
+    ]),
+    ("ORBIT_GET_RAAN", [
+        "raan", "right ascension", "ascending node", "right ascension of the ascending node"
+    ]),
+    ("ORBIT_GET_PERIGEE", [
+        "perigee", "perigeo", "perigeu", "argument of perigee", "omega", "ω="
+    ]),
+    ("ORBIT_GET_TRUE_ANOMALY", [
+        "true anomaly", "anomalía verdadera", "anomalia verdadera", "ν=", "nu="
+    ]),
+    ("ORBIT_GET_MEAN_ANOMALY", [
+        "mean anomaly", "anomalía media", "anomalia mitjana", "m="
+    ]),
+]
+
+
+NOT_LETTER_BEFORE = r"(?<![^\W\d_])"
+NOT_LETTER_AFTER = r"(?![^\W\d_])"
+LOWER_LETTERS = "a-zªµºß-öø-ÿ"   # letras (ya en minúscula) que descartan un candidato sin mirar más
+
+
+def _non_letter_pairs():
+    # Par de bytes UTF-8 -> True si el carácter que empieza en el primero no es letra.
+    # Conservadora: lo que no sea ASCII ni de 2 bytes cuenta como posible límite
+    table = np.ones((256, 256), dtype=bool)
+    for x in range(128):
+        table[x] = not chr(x).isalpha()
+    for x in range(0xc2, 0xe0):
+        chars = bytes(b for y in range(0x80, 0xc0) for b in (x, y)).decode()
+        table[x, 0x80:0xc0] = [not ch.isalpha() for ch in chars]
+    return table
+
+
+class KeywordMatcher:
+    """Fallback por palabras clave compilado una sola vez: todas las claves en una regex tipo trie.
+
+    Buscar con límites de palabra en cada posición sale caro en textos largos, así que primero
+    se localizan candidatos solo con literales y después `pattern` comprueba límite y plural
+    únicamente en ellos. En textos cortos los candidatos salen de la alternancia literal
+    (sin lookarounds); en largos, de tablas de pares de bytes consecutivos evaluadas con numpy
+    sobre todo el texto a la vez.
+    """
+
+    PLURAL_MIN_LEN = 5
+    VECTOR_MIN_LEN = 512   # caracteres a partir de los que compensa el filtro con numpy
+    PAIR_TABLES = 3        # pares de bytes comprobados por candidato (la clave más corta tiene 2)
+
+    def __init__(self, keywords=TELEMETRY_KEYWORDS, specific_len=5):
+        self.categories = [category for category, _ in keywords]
+        # Claves cortas ("ma", "hot", "temp") aparecen en charla normal; las largas, las de
+        # varias palabras o con símbolos ("ºc", "m=") identifican el canal por sí solas
+        self.specific_len = specific_len
+        # Clave -> índice de prioridad (si una clave se repite, gana la categoría más prioritaria)
+        self.index = {}
+        for idx, (_, words) in enumerate(keywords):
+            for word in words:
+                self.index.setdefault(word.lower(), idx)
+
+        # Límite de letra a ambos lados: "ma" no casa con "mañana" ni "hot" con "photo",
+        # pero "500ma" o "25ºc" siguen casando (los dígitos no cuentan como letra).
+        # `pattern` devuelve las posiciones reales de cada clave (parse_window_query las usa)
+        self.pattern = re.compile(NOT_LETTER_BEFORE + self._trie(self.index))
+        self._literal = re.compile("[^" + LOWER_LETTERS + "](" + self._trie(self.index, bounded=False) + ")")
+        # Las claves que acaban en símbolo ("m=", "ν=") admiten cualquier cosa detrás y no caben
+        # en las tablas: se buscan aparte, y solo si el texto contiene ese símbolo
+        symbols = [word for word in self.index if not word[-1].isalpha()]
+        self._symbol_tails = {word[-1] for word in symbols}
+        self._symbol_pattern = re.compile(NOT_LETTER_BEFORE + self._trie(symbols))
+        self._build_pair_tables([word for word in self.index if word[-1].isalpha()])
+
+    def _trie(self, words, bounded=True):
+        trie = {}
+        for word in words:
+            node = trie
+            for ch in word:
+                node = node.setdefault(ch, {})
+            node[None] = word
+        return self._emit(trie, bounded)
+
+    def _emit(self, node, bounded=True):
+        branches = [re.escape(ch) + self._emit(child, bounded)
+                    for ch, child in sorted((k, v) for k, v in node.items() if k is not None)]
+        if None in node:
+            # Fin de clave (la más corta va al final para preferir siempre la más larga).
+            # Si acaba en letra exige límite; solo las de 5+ letras admiten plural (-s/-es):
+            # con "ma" el plural casaría con "mas" y con "temp", con "temps" (tiempo en catalán).
+            word = node[None]
+            if not bounded or not word[-1].isalpha():
+                branches.append("")
+            elif len(word) >= self.PLURAL_MIN_LEN:
+                branches.append(r"(?:e?s)?" + NOT_LETTER_AFTER)
+            else:
+                branches.append(NOT_LETTER_AFTER)
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    def _build_pair_tables(self, words):
+        # Tabla k: pares (byte k, byte k+1) posibles en alguna clave. El texto se pasa a minúscula
+        # como bytes (solo ASCII), así que las claves entran también con sus primeras letras no
+        # ASCII en mayúscula. Pasado el final de la clave, el par debe empezar por una no-letra
+        forms = set()
+        for word in words:
+            for form in [word] + ([word + "s", word + "es"] if len(word) >= self.PLURAL_MIN_LEN else []):
+                heads = [""]
+                for ch in form[:self.PAIR_TABLES + 1]:
+                    heads = [head + c for head in heads for c in {ch, ch.upper()}]
+                tail = form[self.PAIR_TABLES + 1:]
+                forms.update((head + tail).encode().lower() for head in heads)
+        non_letter = _non_letter_pairs()
+        self._pair_tables = []
+        for k in range(self.PAIR_TABLES):
+            table = np.zeros((256, 256), dtype=bool)
+            if any(len(form) < k for form in forms):
+                table[:] = True
+            elif any(len(form) == k for form in forms):
+                table |= non_letter
+            # Si la clave acaba en el byte k, el siguiente puede ser cualquiera (lo mira la tabla k+1)
+            table[[form[k] for form in forms if len(form) == k + 1]] = True
+            pairs = [(form[k], form[k + 1]) for form in forms if len(form) > k + 1]
+            table[tuple(zip(*pairs))] = True
+            self._pair_tables.append(table.ravel())
+        self._not_letter_byte = np.array([not chr(c).isalpha() or c >= 128 for c in range(256)])
+        self._window_bytes = max(len(form) for form in forms) + 4
+
+    def _base(self, found):
+        if found in self.index:
+            return found
+        # Plural admitido por la regex
+        return found[:-1] if found[:-1] in self.index else found[:-2]
+
+    def is_specific(self, word):
+        return len(word) >= self.specific_len or not word.isalpha()
+
+    def _find(self, text):
+        # Claves (en su forma base) presentes en el texto, sin solaparse, igual que `pattern.finditer`
+        if len(text) < self.VECTOR_MIN_LEN:
+            return self._find_scan(text)
+        return self._find_vector(text)
+
+    def _find_scan(self, text):
+        # " " delante para que la primera palabra también tenga un carácter que la preceda
+        low = " " + text.lower()
+        search, verify = self._literal.search, self.pattern.match
+        found = set()
+        candidate = search(low)
+        while candidate:
+            m = verify(low, candidate.start(1))
+            if m:
+                found.add(self._base(m.group()))
+                # La siguiente clave puede empezar justo al final (su carácter previo es el último)
+                candidate = search(low, m.end() - 1)
+            else:
+                candidate = search(low, candidate.start(1))
+        return found
+
+    def _find_vector(self, text):
+        data = b" " + text.encode().lower() + b" " * self.PAIR_TABLES
+        codes = np.frombuffer(data, dtype=np.uint8).astype(np.intp)
+        pairs = codes[:-1] << 8
+        pairs |= codes[1:]
+        starts = np.flatnonzero(self._pair_tables[0].take(pairs))
+        starts = starts[self._not_letter_byte.take(codes.take(starts - 1))]
+        for k in range(1, self.PAIR_TABLES):
+            if not starts.size:
+                break
+            starts = starts[self._pair_tables[k].take(pairs.take(starts + k))]
+        found = set()
+        end = 0
+        for start in starts.tolist():
+            if start < end:
+                continue
+            # Ventana con el carácter anterior y el posterior completos (máx. 4 bytes cada uno)
+            before = data[max(0, start - 4):start].decode("utf-8", "ignore").lower()
+            window = before + data[start:start + self._window_bytes].decode("utf-8", "ignore").lower()
+            m = self.pattern.match(window, len(before))
+            if m and m.group()[-1].isalpha():
+                found.add(self._base(m.group()))
+                end = start + len(window[len(before):m.end()].encode())
+        if any(tail in text for tail in self._symbol_tails):
+            found.update(self._base(m.group()) for m in self._symbol_pattern.finditer(text.lower()))
+        return found
+
+    def match_all(self, text, specific=False):
+        # Todas las categorías presentes en el texto, ordenadas por prioridad
+        # (con `specific`, solo las nombradas por una clave específica)
+        found = {self.index[word] for word in self._find(text) if not specific or self.is_specific(word)}
+        return [self.categories[idx] for idx in sorted(found)]
+
+    def match(self, text):
+        found = self._find(text)
+        return self.categories[min(map(self.index.get, found))] if found else None
+
+
+def estimate_tokens(text, chars_per_token=3.0):
+    # Estimación conservadora (sin tokenizador local): ~3 caracteres por token en es/ca/en
+    return int(len(text) / chars_per_token) + 1
+
+
+class ConversationWindow:
+    """Historial acotado por tokens con el system prompt fijo como prefijo estable.
+
+    Cuando se supera `max_tokens` se descartan de golpe los turnos más antiguos hasta
+    bajar a `low_water` * `max_tokens`. Así el prefijo que Ollama tiene en su KV-cache
+    solo cambia en desalojos grandes y poco frecuentes, no en cada turno.
+    """
+
+    MESSAGE_OVERHEAD = 4  # tokens de plantilla de chat por mensaje (rol, separadores)
+
+    def __init__(self, system_prompt, max_tokens=1536, low_water=0.5, chars_per_token=3.0):
+        self.system = {'role': 'system', 'content': system_prompt}
+        self.max_tokens = max_tokens
+        self.low_water = low_water
+        self.chars_per_token = chars_per_token
+        self.turns = []
+        self.evictions = 0
+        self._system_tokens = self._count(self.system)
+        self._tokens = []   # tokens estimados de cada mensaje de self.turns
+
+    def _count(self, message):
+        return estimate_tokens(message['content'], self.chars_per_token) + self.MESSAGE_OVERHEAD
+
+    @property
+    def tokens(self):
+        return self._system_tokens + sum(self._tokens)
+
+    def append(self, message):
+        self.turns.append(message)
+        self._tokens.append(self._count(message))
+        if self.tokens > self.max_tokens:
+            self._evict()
+
+    def _evict(self):
+        target = self.max_tokens * self.low_water
+        total = self.tokens
+        cut = 0
+        # Nunca se descarta el último turno (la pregunta en curso y, si ya está, su respuesta)
+        limit = max((i for i, m in enumerate(self.turns) if m['role'] == 'user'), default=len(self.turns) - 1)
+        while cut < limit and total > target:
+            total -= self._tokens[cut]
+            cut += 1
+        # Se corta siempre en el inicio de un turno de usuario para no dejar respuestas huérfanas
+        while cut < limit and self.turns[cut]['role'] != 'user':
+            cut += 1
+        if cut:
+            del self.turns[:cut]
+            del self._tokens[:cut]
+            self.evictions += 1
+
+    def resize(self, max_tokens):
+        # Si el presupuesto baja, se desaloja ya (un único corte grande) en vez de en el siguiente turno
+        self.max_tokens = max_tokens
+        if self.tokens > self.max_tokens:
+            self._evict()
+
+    def messages(self):
+        return [self.system] + self.turns
+
+    def __len__(self):
+        return 1 + len(self.turns)
+
+
+# --- RESPUESTAS DE TELEMETRÍA ---
+# Cada intent lee un canal del TelemetryStore; `fmt` da formato al valor.
+TELEMETRY_REPLIES = {
+    "GET_TEMP": {
+        "channel": "temp", "fmt": "{:.1f}", "unit": "ºC",
+        "label": {"1": "Temperatura interna", "2": "Temperatura interna", "3": "Internal temperature"},
+        "text": {
+            "1": "Temperatura interna actual del satélite: {} ºC.",
+            "2": "Temperatura interna actual del satèl·lit: {} ºC.",
+            "3": "Current internal satellite temperature: {} ºC.",
+        },
+    },
+    "TRISKEL_GET_CURRENT": {
+        "channel": "current", "fmt": "{:.2f}", "unit": "A",
+        "label": {"1": "Corriente del OBC TRISKEL", "2": "Corrent de l'OBC TRISKEL", "3": "TRISKEL OBC current"},
+        "text": {
+            "1": "Corriente consumida por el OBC TRISKEL: {} A.",
+            "2": "Corrent consumida per l'OBC TRISKEL: {} A.",
+            "3": "Current drawn by the TRISKEL OBC: {} A.",
+        },
+    },
+    "ORBIT_GET_ALT": {
+        "channel": "alt", "fmt": "{:.1f}", "unit": "km",
+        "label": {"1": "Altitud orbital", "2": "Altitud orbital", "3": "Orbital altitude"},
+        "text": {
+            "1": "Altitud orbital actual: {} km sobre la superficie terrestre.",
+            "2": "Altitud orbital actual: {} km sobre la superfície terrestre.",
+            "3": "Current orbital altitude: {} km above Earth's surface.",
+        },
+    },
+    "ORBIT_GET_ECCENTRICITY": {
+        "channel": "ecc", "fmt": "{:.4f}", "unit": "",
+        "label": {"1": "Excentricidad orbital", "2": "Excentricitat orbital", "3": "Orbital eccentricity"},
+        "text": {
+            "1": "Eccentricidad orbital actual: {} (0 circular, 1 muy elíptica).",
+            "2": "Excentricitat orbital actual: {} (0 circular, 1 molt el·líptica).",
+            "3": "Current orbital eccentricity: {} (0 circular, 1 highly elliptical).",
+        },
+    },
+    "ORBIT_GET_INCLINATION": {
+        "channel": "inc", "fmt": "{:.2f}", "unit": "°",
+        "label": {"1": "Inclinación orbital", "2": "Inclinació orbital", "3": "Orbital inclination"},
+        "text": {
+            "1": "Inclinación orbital: {} grados respecto al ecuador.",
+            "2": "Inclinació orbital: {} graus respecte a l'equador.",
+            "3": "Orbital inclination: {} degrees relative to the equator.",
+        },
+    },
+    "ORBIT_GET_RAAN": {
+        "channel": "raan", "fmt": "{:.2f}", "unit": "°",
+        "label": {"1": "RAAN", "2": "RAAN", "3": "RAAN"},
+        "text": {
+            "1": "RAAN (Ascensión Recta del Nodo Ascendente): {}°.",
+            "2": "RAAN (Ascensió Recta del Node Ascendent): {}°.",
+            "3": "Right Ascension of the Ascending Node (RAAN): {}°.",
+        },
+    },
+    "ORBIT_GET_PERIGEE": {
+        "channel": "perigee", "fmt": "{:.2f}", "unit": "°",
+        "label": {"1": "Argumento de perigeo", "2": "Argument de perigeu", "3": "Argument of perigee"},
+        "text": {
+            "1": "Argumento de perigeo: {}°.",
+            "2": "Argument de perigeu: {}°.",
+            "3": "Argument of perigee: {}°.",
+        },
+    },
+    "ORBIT_GET_TRUE_ANOMALY": {
+        "channel": "true_anom", "fmt": "{:.2f}", "unit": "°",
+        "label": {"1": "Anomalía verdadera", "2": "Anomalia verdadera", "3": "True anomaly"},
+        "text": {
+            "1": "Anomalía verdadera actual del satélite: {}°.",
+            "2": "Anomalia verdadera actual del satèl·lit: {}°.",
+            "3": "Current true anomaly of the satellite: {}°.",
+        },
+    },
+    "ORBIT_GET_MEAN_ANOMALY": {
+        "channel": "mean_anom", "fmt": "{:.2f}", "unit": "°",
+        "label": {"1": "Anomalía media", "2": "Anomalia mitjana", "3": "Mean anomaly"},
+        "text": {
+            "1": "Anomalía media actual utilizada en los cálculos orbitales: {}°.",
+            "2": "Anomalia mitjana actual utilitzada en els càlculs orbitals: {}°.",
+            "3": "Current mean anomaly used for orbital calculations: {}°.",
+        },
+    },
+}
+
+WINDOW_REPLY = {
+    "1": "{label} en los últimos {window}: mínimo {min} {unit}, máximo {max} {unit}, media {avg} {unit} ({n} muestras).",
+    "2": "{label} en els últims {window}: mínim {min} {unit}, màxim {max} {unit}, mitjana {avg} {unit} ({n} mostres).",
+    "3": "{label} over the last {window}: min {min} {unit}, max {max} {unit}, average {avg} {unit} ({n} samples).",
+}
+
+class RouteDecision:
+    """'telemetry' (respuesta directa, sin LLM), 'context' (LLM con telemetría inyectada) o 'llm'."""
+
+    def __init__(self, route, categories=(), margin=None, reason=""):
+        self.route = route
+        self.categories = list(categories)
+        self.margin = margin
+        self.reason = reason
+
+    def __repr__(self):
+        return f"RouteDecision({self.route!r}, {self.categories}, margin={self.margin}, reason={self.reason!r})"
+
+
+def classifier_intercept(classifier):
+    # Término independiente del SVM: si decision_function devuelve solo esto, el prompt
+    # no tiene ninguna palabra del vocabulario y el clasificador no sabe nada de él
+    if hasattr(classifier, "intercept"):
+        return np.asarray(classifier.intercept)
+    steps = getattr(classifier, "steps", None)
+    if steps:
+        return getattr(steps[-1][1], "intercept_", None)
+    return None
 
 class TelemetrySystem:
-    def __init__(self, model_path='Models/modelo-PLUTON_UPV_svm.joblib'):
-        print("⚙️ Loading telemetry classifier (joblib)...")
-        t0 = time.perf_counter()
-        try:
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore", category=UserWarning)
-                self.classifier = joblib.load(model_path)
-            t1 = time.perf_counter()
-            print(f"✅ Telemetry loaded in {t1 - t0:.2f} seconds.")
+    def __init__(self, model_path='Models/modelo-PLUTON_UPV_svm.joblib', linear_path=DEFAULT_LINEAR_PATH,
+                 source=None, sample_interval=1.0, orbit=None,
+                 min_score=0.0, min_margin=0.3, context_score=-0.5, memo_size=1024):
+        self.classifier = None
+
+        # Umbrales del enrutado (sobre decision_function del SVM, uno contra el resto)
+        self.min_score = min_score          # puntuación mínima de la intent ganadora
+        self.min_margin = min_margin        # distancia mínima con la segunda
+        self.context_score = context_score  # intents plausibles que se pasan como contexto al LLM
+        self.memo_size = memo_size
+        self._memo = OrderedDict()          # prompt normalizado -> RouteDecision
+        self._memo_lock = threading.Lock()
+        self.memo_stats = {"hits": 0, "misses": 0}
+
+        # Los sensores se muestrean en segundo plano; get_data solo lee los buffers
+        source = source or SimulatedSource(orbit=orbit)
+        self.store = TelemetryStore()
+        self.sampler = TelemetrySampler(source, self.store, sample_interval).start()
+        # Con la fuente simulada, las intents ORBIT_GET_* leen del propagador compartido;
+        # con un pase grabado o UDP, de los buffers como el resto de canales
+        self.orbit = orbit or getattr(source, "orbit", None)
+
+        # 1º: modelo lineal exportado (NumPy puro, sin importar scikit-learn ni deserializar el pickle)
+        if linear_path and os.path.isdir(linear_path):
+            print("⚙️ Loading telemetry classifier (linear export)...")
+            t0 = time.perf_counter()
+            try:
+                self.classifier = LinearIntentScorer(linear_path, source_path=model_path)
+                t1 = time.perf_counter()
+                print(f"✅ Telemetry loaded in {t1 - t0:.2f} seconds.")
+            except Exception as e:
+                print(f"⚠️ Warning: could not load {linear_path}, trying joblib. Error: {e}")
+
+        # 2º: pipeline de scikit-learn serializado con joblib
+        if self.classifier is None:
+            print("⚙️ Loading telemetry classifier (joblib)...")
+            t0 = time.perf_counter()
+            try:
+                # joblib (y scikit-learn al deserializar) solo se importan si hace falta
+                import joblib
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", category=UserWarning)
+                    self.classifier = joblib.load(model_path)
+                t1 = time.perf_counter()
+                print(f"✅ Telemetry loaded in {t1 - t0:.2f} seconds.")
+            except Exception as e:
+                print(f"⚠️ Warning: {model_path} not found. Using keyword fallback. Error: {e}")
+                self.classifier = None
+
+        if self.classifier is not None:
             try:
                 print("📊 Classes in model:", self.classifier.classes_)
             except Exception:
                 pass
-        except Exception as e:
-            print(f"⚠️ Warning: {model_path} not found. Using keyword fallback. Error: {e}")
-            self.classifier = None
+        self.keyword_matcher = KeywordMatcher()
+        self.intercept = classifier_intercept(self.classifier) if self.classifier is not None else None
+
     def predict(self, prompt: str) -> str:
         if self.classifier is not None:
 
             return self.classifier.predict([prompt])[0]
         
-        p = prompt.lower()
-
-        # GET_TEMP
-        if any(w in p for w in [
-            "temperature", "temp", "temperatura", "heat", "hot", "cold", "warm", "ºc", "°c"
-        ]):
-            return "GET_TEMP"
-
-        # TRISKEL_GET_CURRENT
-        if any(w in p for w in [
-            "current", "amperage", "amps", "ampere", "consumption", "consumo", "milliamp", "ma"
-        ]):
-            return "TRISKEL_GET_CURRENT"
-
-        # ORBIT_GET_ALT
-        if any(w in p for w in [
-            "altitude", "altitud", "height", "orbital height",
-            "semi-major axis", "semi major axis", "sma"
-        ]):
-            return "ORBIT_GET_ALT"
-
-        # ORBIT_GET_ECCENTRICITY
-        if any(w in p for w in [
-            "eccentricity", "excentricidad", "ecc", "e="
-        ]):
-            return "ORBIT_GET_ECCENTRICITY"
-
-        # ORBIT_GET_INCLINATION
-        if any(w in p for w in [
-            "inclination", "inclinación", "tilt", "inclination angle", "i="
-        ]):
-            return "ORBIT_GET_INCLINATION"
-
-        # ORBIT_GET_RAAN
-        if any(w in p for w in [
-            "raan", "right ascension", "ascending node", "right ascension of the ascending node"
-        ]):
-            return "ORBIT_GET_RAAN"
-
-        # ORBIT_GET_PERIGEE
-        if any(w in p for w in [
-            "perigee", "perigeo", "argument of perigee", "omega", "ω="
-        ]):
-            return "ORBIT_GET_PERIGEE"
-
-        # ORBIT_GET_TRUE_ANOMALY
-        if any(w in p for w in [
-            "true anomaly", "anomalía verdadera", "ν=", "nu="
-        ]):
-            return "ORBIT_GET_TRUE_ANOMALY"
-
-        # ORBIT_GET_MEAN_ANOMALY
-        if any(w in p for w in [
-            "mean anomaly", "anomalía media", "m="
-        ]):
-            return "ORBIT_GET_MEAN_ANOMALY"
-
-        # Default
-        return "GENERAL_CHAT"
-
-    def get_data(self, category: str, lang_choice: str) -> str | None:
-
-        alt = random.uniform(400, 600)           # km
-        temp = random.uniform(15.0, 40.0)        # ºC
-        ecc = random.uniform(0.0005, 0.01)
-        inc = random.uniform(97.3, 97.7)         # deg
-        raan = random.uniform(0, 360)            # deg
-        perigee = random.uniform(0, 360)         # deg (arg of perigee)
-        true_anom = random.uniform(0, 360)       # deg
-        mean_anom = random.uniform(0, 360)       # deg
-        current = random.uniform(0.5, 1.5)       # A
-
-        # GET_TEMP
-        if category == "GET_TEMP":
-            if lang_choice == "1":
-                return f"Temperatura interna actual del satélite: {temp:.1f} ºC."
-            if lang_choice == "2":
-                return f"Temperatura interna actual del satèl·lit: {temp:.1f} ºC."
-            if lang_choice == "3":
-                return f"Current internal satellite temperature: {temp:.1f} ºC."
-
-        # TRISKEL_GET_CURRENT
-        if category == "TRISKEL_GET_CURRENT":
-            if lang_choice == "1":
-                return f"Corriente consumida por el OBC TRISKEL: {current:.2f} A."
-            if lang_choice == "2":
-                return f"Corrent consumida per l'OBC TRISKEL: {current:.2f} A."
-            if lang_choice == "3":
-                return f"Current drawn by the TRISKEL OBC: {current:.2f} A."
-
-        # ORBIT_GET_ALT
-        if category == "ORBIT_GET_ALT":
-            if lang_choice == "1":
-                return f"Altitud orbital actual: {alt:.1f} km sobre la superficie terrestre."
-            if lang_choice == "2":
-                return f"Altitud orbital actual: {alt:.1f} km sobre la superfície terrestre."
-            if lang_choice == "3":
-                return f"Current orbital altitude: {alt:.1f} km above Earth's surface."
-
-        # ORBIT_GET_ECCENTRICITY
-        if category == "ORBIT_GET_ECCENTRICITY":
-            if lang_choice == "1":
-                return f"Eccentricidad orbital actual: {ecc:.4f} (0 circular, 1 muy elíptica)."
-            if lang_choice == "2":
-                return f"Excentricitat orbital actual: {ecc:.4f} (0 circular, 1 molt el·líptica)."
-            if lang_choice == "3":
-                return f"Current orbital eccentricity: {ecc:.4f} (0 circular, 1 highly elliptical)."
-
-        # ORBIT_GET_INCLINATION
-        if category == "ORBIT_GET_INCLINATION":
-            if lang_choice == "1":
-                return f"Inclinación orbital: {inc:.2f} grados respecto al ecuador."
-            if lang_choice == "2":
-                return f"Inclinació orbital: {inc:.2f} graus respecte a l'equador."
-            if lang_choice == "3":
-                return f"Orbital inclination: {inc:.2f} degrees relative to the equator."
-
-        # ORBIT_GET_RAAN
-        if category == "ORBIT_GET_RAAN":
-            if lang_choice == "1":
-                return f"RAAN (Ascensión Recta del Nodo Ascendente): {raan:.2f}°."
-            if lang_choice == "2":
-                return f"RAAN (Ascensió Recta del Node Ascendent): {raan:.2f}°."
-            if lang_choice == "3":
-                return f"Right Ascension of the Ascending Node (RAAN): {raan:.2f}°."
-
-        # ORBIT_GET_PERIGEE
-        if category == "ORBIT_GET_PERIGEE":
-            if lang_choice == "1":
-                return f"Argumento de perigeo: {perigee:.2f}°."
-            if lang_choice == "2":
-                return f"Argument de perigeu: {perigee:.2f}°."
-            if lang_choice == "3":
-                return f"Argument of perigee: {perigee:.2f}°."
-
-        # ORBIT_GET_TRUE_ANOMALY
-        if category == "ORBIT_GET_TRUE_ANOMALY":
-            if lang_choice == "1":
-                return f"Anomalía verdadera actual del satélite: {true_anom:.2f}°."
-            if lang_choice == "2":
-                return f"Anomalia verdadera actual del satèl·lit: {true_anom:.2f}°."
-            if lang_choice == "3":
-                return f"Current true anomaly of the satellite: {true_anom:.2f}°."
-
-        # ORBIT_GET_MEAN_ANOMALY
-        if category == "ORBIT_GET_MEAN_ANOMALY":
-            if lang_choice == "1":
-                return f"Anomalía media actual utilizada en los cálculos orbitales: {mean_anom:.2f}°."
-            if lang_choice == "2":
-                return f"Anomalia mitjana actual utilitzada en els càlculs orbitals: {mean_anom:.2f}°."
-            if lang_choice == "3":
-                return f"Current mean anomaly used for orbital calculations: {mean_anom:.2f}°."
+        category = self.keyword_matcher.match(prompt)
+        return category if category is not None else "GENERAL_CHAT"
+
+    def predict_batch(self, prompts) -> list:
+        # Una sola pasada de vectorizador + decision_function para toda la lista
+        prompts = list(prompts)
+        if not prompts:
+            return []
+        if self.classifier is not None:
+            return list(self.classifier.predict(prompts))
+
+        return [self.predict(prompt) for prompt in prompts]
+
+    def route(self, prompt: str) -> RouteDecision:
+        return self.route_batch([prompt])[0]
+
+    def route_batch(self, prompts) -> list:
+        # Las decisiones dependen solo del texto: se memorizan por prompt normalizado
+        prompts = list(prompts)
+        keys = [normalize_prompt(p) for p in prompts]
+        decisions = [None] * len(prompts)
+        missing = []
+        with self._memo_lock:
+            for i, key in enumerate(keys):
+                decision = self._memo.get(key)
+                if decision is None:
+                    missing.append(i)
+                else:
+                    self._memo.move_to_end(key)
+                    decisions[i] = decision
+            self.memo_stats["hits"] += len(prompts) - len(missing)
+            self.memo_stats["misses"] += len(missing)
+        if not missing:
+            return decisions
+
+        texts = [prompts[i] for i in missing]
+        scores = None
+        if self.classifier is not None and hasattr(self.classifier, "decision_function"):
+            scores = np.asarray(self.classifier.decision_function(texts))
+        for j, i in enumerate(missing):
+            decisions[i] = self._decide(texts[j], None if scores is None else scores[j])
+
+        with self._memo_lock:
+            for i in missing:
+                self._memo[keys[i]] = decisions[i]
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return decisions
+
+    def _decide(self, prompt, scores):
+        keyword_hits = [c for c in self.keyword_matcher.match_all(prompt) if c in TELEMETRY_REPLIES]
+
+        # Resúmenes temporales ("máxima en los últimos 10 min"): el SVM no se entrenó con ellos
+        if keyword_hits and parse_window_query(prompt, self.keyword_matcher.pattern) is not None:
+            return RouteDecision("telemetry", keyword_hits, reason="window")
 
+        if scores is None or (self.intercept is not None and np.allclose(scores, self.intercept)):
+            # Sin clasificador, o ninguna palabra del prompt en su vocabulario: mandan las palabras clave.
+            # Solo una clave específica basta para contestar; con las cortas ("ma", "hot")
+            # contesta el LLM con los valores como contexto
+            if keyword_hits:
+                specific = [c for c in self.keyword_matcher.match_all(prompt, specific=True) if c in TELEMETRY_REPLIES]
+                if specific:
+                    return RouteDecision("telemetry", specific, reason="keywords")
+                return RouteDecision("context", keyword_hits, reason="keywords")
+            if self.classifier is None:
+                return RouteDecision("llm", reason="keywords")
+            return RouteDecision("llm", reason="unknown words")
+
+        classes = self.classifier.classes_
+        order = np.argsort(scores)[::-1]
+        top, top_score = str(classes[order[0]]), float(scores[order[0]])
+        margin = top_score - float(scores[order[1]]) if len(order) > 1 else float("inf")
+        known = {str(c): float(s) for c, s in zip(classes, scores) if str(c) in TELEMETRY_REPLIES}
+
+        if top in known and top_score >= self.min_score and margin >= self.min_margin:
+            # Varias intents en la misma pregunta: las que nombra el prompt y el SVM no descarta
+            extra = [c for c in keyword_hits if c != top and known.get(c, self.context_score - 1) >= self.context_score]
+            return RouteDecision("telemetry", [top] + extra, margin, "confident")
+
+        if top not in known and margin >= self.min_margin and not keyword_hits:
+            return RouteDecision("llm", margin=margin, reason="confident")
+
+        # Ambiguo: contesta el LLM, pero con los valores de los canales plausibles como contexto
+        context = {c for c, s in known.items() if s >= self.context_score} | set(keyword_hits)
+        context = sorted(context, key=lambda c: known.get(c, self.context_score), reverse=True)
+        return RouteDecision("context" if context else "llm", context, margin, "ambiguous")
+
+    def answer(self, decision: RouteDecision, lang_choice: str, prompt: str = None) -> str | None:
+        # Todas las intents de la decisión en una sola respuesta
+        parts = [self.get_data(category, lang_choice, prompt) for category in decision.categories]
+        parts = [part for part in parts if part]
+        return " ".join(parts) if parts else None
+
+    def fallback_answer(self, decision: RouteDecision, lang_choice: str, prompt: str) -> str | None:
+        # Sin LLM: lo que se pueda contestar con telemetría (intents de la decisión o palabras clave)
+        categories = decision.categories or [c for c in self.keyword_matcher.match_all(prompt) if c in TELEMETRY_REPLIES]
+        return self.answer(RouteDecision("telemetry", categories, reason="fallback"), lang_choice, prompt)
+
+    def get_data(self, category: str, lang_choice: str, prompt: str = None) -> str | None:
+        # "¿Temperatura máxima en los últimos 10 minutos?" -> reducción sobre el buffer
+        window = parse_window_query(prompt, self.keyword_matcher.pattern) if prompt else None
+        if window is not None and category not in TELEMETRY_REPLIES:
+            # El clasificador no se entrenó con preguntas sobre ventanas de tiempo
+            category = self.keyword_matcher.match(prompt)
+
+        reply = TELEMETRY_REPLIES.get(category)
         # Si no es una intent de telemetría conocida
-        return None
+        if reply is None or lang_choice not in reply["text"]:
+            return None
+
+        if window is not None:
+            _, seconds = window
+            stats = self.store.stats(reply["channel"], seconds)
+            if stats is not None:
+                fmt = reply["fmt"]
+                return WINDOW_REPLY[lang_choice].format(
+                    label=reply["label"][lang_choice], window=f"{seconds / 60:g} min",
+                    min=fmt.format(stats["min"]), max=fmt.format(stats["max"]),
+                    avg=fmt.format(stats["avg"]), unit=reply["unit"], n=stats["n"]
+                )
+
+        if self.orbit is not None and reply["channel"] in ORBIT_CHANNELS:
+            value = self.orbit.state()[reply["channel"]]
+        else:
+            value = self.store.latest(reply["channel"])
+        if value is None:
+            return None
+        return reply["text"][lang_choice].format(reply["fmt"].format(value))
+
+class TelemetryBatcher:
+    """Agrupa las peticiones que llegan casi a la vez desde varios hilos y las clasifica juntas."""
+
+    def __init__(self, telemetry, window_ms=3.0, max_batch=64, method="predict_batch"):
+        self.telemetry = telemetry
+        self._classify = getattr(telemetry, method)   # predict_batch (etiquetas) o route_batch (decisiones)
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="telemetry-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt) -> Future:
+        future = Future()
+        self._pending.put((prompt, future))
+        return future
+
+    def predict(self, prompt) -> str:
+        return self.submit(prompt).result()
+
+    def close(self):
+        self._pending.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            batch = [item]
+            # Solo se espera la ventana si ya hay otras peticiones en cola: una petición
+            # sola sale en el acto (sin carga, el lote no compensa los ms de espera)
+            deadline = time.perf_counter() + self.window if not self._pending.empty() else 0
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._pending.get(timeout=remaining) if remaining > 0 else self._pending.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._pending.put(None)
+                    break
+                batch.append(item)
+
+            # Las que el llamante ya canceló (timeout, cliente desconectado) no se clasifican;
+            # las demás pasan a RUNNING y ya no se pueden cancelar
+            batch = [(prompt, future) for prompt, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                labels = self._classify([prompt for prompt, _ in batch])
+            except Exception as e:
+                labels, error = [None] * len(batch), e
+            else:
+                error = None
+            for (_, future), label in zip(batch, labels):
+                # Un futuro en mal estado no puede tumbar el hilo: todos los submit() siguientes se colgarían
+                try:
+                    if error is not None:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(label)
+                except Exception as e:
+                    print(f"⚠️ Telemetry batcher could not deliver a result: {e}")
+
 
 class EstigiaCore:
-    def __init__(self, model_name="gemma-2-2b-estigia", max_history=4):
+    def __init__(self, model_name="gemma-2-2b-estigia", max_context_tokens=1536,
+                 keep_alive="30m", prefill_languages=tuple(PROMPTS), response_cache=None,
+                 metrics=REGISTRY, governor=None, output=None, session_store=None,
+                 background_warmup=False, profiler=None, llm=None):
         self.model_name = model_name
-        self.max_history = max_history
-        self.history = []
-        self.ui = PROMPTS["3"] 
-        
-        print(f"🧠 Waking up model '{model_name}' in Ollama...")
+        self.metrics = metrics
+        self.lang_choice = "3"
+        # Caché opcional de respuestas (ResponseCache); None la desactiva
+        self.response_cache = response_cache
+        self.max_context_tokens = max_context_tokens
+        # Tiempo que Ollama mantiene el modelo (y su KV-cache) en memoria tras cada petición
+        self.keep_alive = keep_alive
+        self.ui = PROMPTS["3"]
+        self.history = ConversationWindow(self.ui["sys"], max_tokens=max_context_tokens)
+        # Por turno LLM: tokens estimados del prompt y LLMMetrics (carga, prefill, decodificación)
+        self.turn_stats = []
+        # Por idioma: coste del system prompt en frío vs. ya precargado
+        self.prefill_stats = {}
+        self._prefill_thread = None
+        # Gobernador térmico opcional (AdaptiveGovernor); decide modelo, num_predict y contexto
+        self.governor = governor
+        self.options = None
+        # Salidas del stream (terminal, WebSocket, voz); la terminal agrupa tokens cada pocos ms
+        self.output = output or OutputFanout([TerminalSink()], metrics=metrics)
+        terminal = next((sink for sink in self.output.sinks if isinstance(sink, TerminalSink)), None)
+        self.writer = terminal.writer if terminal else None
+        # Registro persistente de turnos (SessionStore); cada set_language abre una sesión nueva
+        self.session_store = session_store
+        self.session_id = None
+        # Cliente de Ollama compartido (pool, reintentos, cortocircuito y chequeo de salud)
+        self.llm = llm or OllamaClient(metrics=metrics)
+        self.llm.listeners.append(self._on_llm_state)
+        # Fases del arranque (import de ollama, carga del modelo, precarga de prompts)
+        self.profiler = profiler or StartupProfiler()
+        self.warmup_error = None
+        self._ready = threading.Event()
+        self._warmup_thread = None
+
+        if background_warmup:
+            # El REPL arranca ya; el primer turno LLM espera a que termine la carga
+            self._warmup_thread = threading.Thread(target=self.warm_up, args=(prefill_languages, True),
+                                                   name="ollama-warmup", daemon=True)
+            self._warmup_thread.start()
+        else:
+            self.warm_up(prefill_languages)
+            if self.warmup_error is not None:
+                sys.exit(1)
+
+    def warm_up(self, prefill_languages=(), quiet=False):
+        """Importa el cliente de Ollama, despierta el modelo y precarga los system prompts.
+
+        Si Ollama aún no está arriba no se sale: se espera a que el chequeo de salud lo vea.
+        """
         t0 = time.perf_counter()
+        with self.profiler.phase("import ollama"):
+            self.llm.client
+        if not quiet:
+            print(f"🧠 Waking up model '{self.model_name}' in Ollama...")
+        while True:
+            try:
+                with self.profiler.phase("model load") as info:
+                    info["detail"] = self.model_name
+                    self.llm.generate(model=self.model_name, prompt='', keep_alive=self.keep_alive)
+                break
+            except LLMUnavailable as e:
+                print(f"⏳ {e}. Waiting for Ollama to come up...")
+                with self.profiler.phase("wait for Ollama"):
+                    self.llm.wait_until_up()
+            except Exception as e:
+                # No es un corte (p. ej. el modelo no existe): reintentar no lo arregla
+                self.warmup_error = e
+                print(f"❌ Error connecting to Ollama: {e}")
+                return
+        if not quiet:
+            print(f"✅ Model loaded and ready in {time.perf_counter() - t0:.2f} seconds.")
+
+        for choice in prefill_languages:
+            with self.profiler.phase(f"prefill {PROMPTS.get(choice, PROMPTS['3'])['lang']}") as info:
+                self._prefill(choice, measure=True, quiet=quiet)
+                if choice in self.prefill_stats:
+                    # También en el informe de arranque y en el JSON de --startup-profile
+                    stats = self.prefill_stats[choice]
+                    info["detail"] = f"{stats['tokens']} tok, saves {stats['saved']:.2f}s"
+        self.profiler.mark("model_ready")
+        if quiet:
+            prefilled = sum(s["tokens"] for s in self.prefill_stats.values())
+            print(f"\n✅ Model '{self.model_name}' ready in the background ({time.perf_counter() - t0:.2f}s, "
+                  f"{len(self.prefill_stats)} prompts / {prefilled} tokens prefilled).")
+            for choice in self.prefill_stats:
+                self._print_prefill(choice)
+        self._ready.set()
+
+    def wait_ready(self):
+        # Espera a la carga inicial mientras Ollama responda; False si no hay modelo con el que hablar
+        while not self._ready.wait(0.1):
+            if self.warmup_error is not None or not self.llm.available():
+                return False
+        return True
+
+    def _on_llm_state(self, state):
+        # Avisos del cortocircuito, desde el hilo que detecta el cambio
+        if state == "open":
+            print(self.ui["ui_llm_down"])
+        elif state == "closed":
+            print(self.ui["ui_llm_up"])
+            if self._ready.is_set():
+                # Ollama puede haberse reiniciado sin el modelo: se recarga con el prompt del idioma actual
+                threading.Thread(target=self._prefill, args=(self.lang_choice,), daemon=True).start()
+
+    def prefill(self, choice, measure=False, quiet=False):
+        if self.wait_ready():
+            self._prefill(choice, measure, quiet)
+
+    def _prefill(self, choice, measure=False, quiet=False):
+        # Evalúa solo el system prompt para que el primer turno real encuentre el prefijo en la KV-cache
+        ui = PROMPTS.get(choice, PROMPTS["3"])
+        messages = [{'role': 'system', 'content': ui["sys"]}]
         try:
-            ollama.generate(model=self.model_name, prompt='')
-            t1 = time.perf_counter()
-            print(f"✅ Model loaded and ready in {t1 - t0:.2f} seconds.")
+            cold = self.llm.chat(model=self.model_name, messages=messages,
+                                 options={"num_predict": 1}, keep_alive=self.keep_alive)
+            if not measure:
+                return
+            warm = self.llm.chat(model=self.model_name, messages=messages,
+                                 options={"num_predict": 1}, keep_alive=self.keep_alive)
         except Exception as e:
-            print(f"❌ Error connecting to Ollama: {e}")
-            sys.exit(1)
+            print(f"⚠️ Warning: could not prefill {ui['lang']} system prompt: {e}")
+            return
+
+        cold_s = LLMMetrics.from_response(cold).prefill
+        warm_s = LLMMetrics.from_response(warm).prefill
+        self.prefill_stats[choice] = {
+            "tokens": LLMMetrics.from_response(cold).prompt_tokens,
+            "cold": cold_s,
+            "warm": warm_s,
+            "saved": max(cold_s - warm_s, 0.0),
+        }
+        if not quiet:
+            self._print_prefill(choice)
 
-    def set_language(self, choice):
+    def _print_prefill(self, choice):
+        stats = self.prefill_stats[choice]
+        print(f"🔥 {PROMPTS.get(choice, PROMPTS['3'])['lang']}: system prompt prefilled ({stats['tokens']} tokens) "
+              f"| first-turn TTFT saved ≈ {stats['saved']:.2f}s")
+
+    def set_language(self, choice, session_id=None):
         # Si introducen algo raro, por defecto ponemos Inglés (3)
-        self.ui = PROMPTS.get(choice, PROMPTS["3"])
+        self.lang_choice = choice if choice in PROMPTS else "3"
+        self.ui = PROMPTS[self.lang_choice]
         
         # Al reasignar self.history aquí, estamos BORRANDO toda la conversación anterior
-        self.history = [{"role": "system", "content": self.ui["sys"]}]
+        max_tokens = self.governor.settings.max_context_tokens if self.governor is not None else self.max_context_tokens
+        self.history = ConversationWindow(self.ui["sys"], max_tokens=max_tokens)
+        if self.session_store is not None:
+            self.session_id = session_id or self.session_store.new_session(self.lang_choice, self.model_name)
+
+        # Con un solo slot en Ollama, la caché guarda el último idioma precargado:
+        # se refresca en segundo plano mientras el usuario escribe su primera pregunta
+        self._prefill_thread = threading.Thread(target=self.prefill, args=(choice,), daemon=True)
+        self._prefill_thread.start()
         return self.ui
 
-    def chat(self, user_text):
-        self.history.append({'role': 'user', 'content': user_text})
-        
-        if len(self.history) > self.max_history + 1:
-            self.history = [self.history[0]] + self.history[-self.max_history:]
+    def resume(self, session_id=None):
+        """Retoma una sesión guardada (por defecto, la última): idioma y solo los turnos que caben en la ventana."""
+        if self.session_store is None:
+            return None
+        info = self.session_store.session_info(session_id) if session_id else self.session_store.latest_session()
+        if info is None:
+            return None
+        self.set_language(info["lang"], session_id=info["id"])
+        tail = self.session_store.load_tail(info["id"], self.history.max_tokens - self.history.tokens)
+        for message in tail["messages"]:
+            self.history.append(message)
+        return {**info, "loaded": tail["turns"]}
 
+    def _record(self, route, messages, prompt=None, metrics=None):
+        # Solo deja el turno en la cola del SessionStore; la escritura va en su hilo
+        if self.session_store is not None and self.session_id is not None:
+            self.session_store.record_turn(self.session_id, route, self.lang_choice, messages,
+                                           prompt=prompt, metrics=metrics)
+
+    def _begin_turn(self, user_text, context):
+        # Caché y mensaje de usuario; None si se respondió desde la caché
+        cache_key = None
+        # Con telemetría en el prompt la respuesta depende de los valores: no se cachea
+        if self.response_cache is not None and context is None:
+            cache_key = self.response_cache.key(self.model_name, self.lang_choice, user_text,
+                                                self.history.messages())
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                self._replay_cached(user_text, cached)
+                return None
+
+        # El contexto se queda en el historial tal cual lo vio el modelo (prefijo de KV-cache estable)
+        content = user_text if context is None else f"{user_text}\n\n[{self.ui['ui_ctx']}: {context}]"
+        evictions_before = self.history.evictions
+        user_message = {'role': 'user', 'content': content}
+        self.history.append(user_message)
         print("🛰️ Estigia: ", end="", flush=True)
-        
-        start_time = time.perf_counter()
-        first_token_time = None
-        token_count = 0
-        full_response = ""
-        
-        response_stream = ollama.chat(
-            model=self.model_name,
-            messages=self.history,
-            stream=True
-        )
-        
-        for chunk in response_stream:
-            if first_token_time is None:
-                first_token_time = time.perf_counter()
-                
-            token = chunk['message']['content']
-            print(token, end="", flush=True)
-            full_response += token
-            token_count += 1
-            
+        self.output.begin(self.lang_choice, source="llm")
+        return {
+            "user_text": user_text,
+            "user_message": user_message,
+            "cache_key": cache_key,
+            "context": context,
+            "evictions_before": evictions_before,
+            "prompt_tokens": self.history.tokens,
+            "start_time": time.perf_counter(),
+            "first_token_time": None,
+            "parts": [],
+            "final_chunk": {},
+        }
+
+    def _on_chunk(self, turn, chunk):
+        if turn["first_token_time"] is None:
+            turn["first_token_time"] = time.perf_counter()
+        token = chunk['message']['content']
+        self._write(token)
+        turn["parts"].append(token)
+        if chunk.get('done'):
+            # El último chunk trae los tiempos y recuentos de Ollama
+            turn["final_chunk"] = chunk
+
+    def _finish_turn(self, turn, cancelled=False, error=None):
+        output_stats = self.output.end(cancelled=cancelled or error is not None)
         end_time = time.perf_counter()
-        
+        full_response = "".join(turn["parts"])
+        start_time, first_token_time = turn["start_time"], turn["first_token_time"]
         ttft = first_token_time - start_time if first_token_time else 0
-        gen_time = end_time - first_token_time if first_token_time else 0
-        tps = token_count / gen_time if gen_time > 0 else 0
+
+        if cancelled or error is not None:
+            # Lo que ya se ha mostrado queda en el historial, marcado como cortado
+            route = "cancelled" if error is None else "interrupted"
+            print(self.ui["ui_cancel"] if error is None else self.ui["ui_llm_lost"].format(error))
+            self.metrics.inc("estigia_turns_total", route=route)
+            self.turn_stats.append({route: True, "ttft": ttft, "ttfs": output_stats["ttfs"],
+                                    "total": end_time - start_time, "chunks": len(turn["parts"])})
+            assistant_message = {'role': 'assistant', 'content': full_response.rstrip() + " …"}
+            self.history.append(assistant_message)
+            self._record(route, [turn["user_message"], assistant_message], prompt=turn["user_text"],
+                         metrics=self.turn_stats[-1])
+            return full_response
+
+        metrics = LLMMetrics.from_response(turn["final_chunk"], ttft=ttft, total=end_time - start_time)
         
-        print(self.ui["ui_met_llm"].format(ttft, tps, token_count))
+        ttfs = output_stats["ttfs"]
+        print(self.ui["ui_met_llm"].format(metrics.ttft, ttfs or 0.0, metrics.tokens_per_second, metrics.eval_tokens,
+                                           metrics.prompt_tokens, metrics.prefill, metrics.load))
         
-        self.history.append({'role': 'assistant', 'content': full_response})
+        evicted = self.history.evictions > turn["evictions_before"]
+        if self.governor is not None:
+            self.governor.observe(metrics.tokens_per_second)
+        self.metrics.record_llm(metrics, model=self.model_name, lang=self.lang_choice, evicted=evicted,
+                                context=turn["context"] is not None)
+        self.turn_stats.append({
+            "prompt_tokens_est": turn["prompt_tokens"],
+            # Con el prefijo en caché, Ollama solo evalúa los tokens nuevos
+            "prompt_eval_count": metrics.prompt_tokens,
+            "evicted": evicted,
+            # Tiempo hasta la primera frase completa (lo que espera la voz para empezar)
+            "ttfs": ttfs,
+            "sentences": output_stats["sentences"],
+            **metrics.as_dict(),
+        })
+        assistant_message = {'role': 'assistant', 'content': full_response}
+        self.history.append(assistant_message)
+        self._record("context" if turn["context"] is not None else "llm",
+                     [turn["user_message"], assistant_message], prompt=turn["user_text"], metrics=self.turn_stats[-1])
+        # Con num_predict recortado por el gobernador (o si se acabaron los tokens) la respuesta
+        # puede estar cortada: la clave no incluye las opciones y se repetiría tras recuperarse
+        truncated = self.options is not None or turn["final_chunk"].get("done_reason") == "length"
+        if turn["cache_key"] is not None and not truncated:
+            self.response_cache.put(turn["cache_key"], full_response)
+        return full_response
+
+    def _wait_for_model(self):
+        # Carga inicial en segundo plano, precarga del idioma elegido y ajustes del gobernador
+        # (que puede cambiar de modelo y precargarlo); False si no hay LLM. Puede bloquear
+        # segundos: achat() lo ejecuta en un hilo para seguir siendo cancelable
+        if not self.wait_ready():
+            return False
+        if self._prefill_thread is not None:
+            self._prefill_thread.join()
+            self._prefill_thread = None
+        if self.governor is not None:
+            self._apply(self.governor.evaluate())
+        return True
+
+    def _answer_offline(self, user_text, fallback=None, user_message=None):
+        # Sin LLM (circuito abierto o fallo antes del primer token): vía rápida o aviso
+        text = (fallback() if callable(fallback) else fallback) or self.ui["ui_offline"]
+        if user_message is None:
+            user_message = {'role': 'user', 'content': user_text}
+            self.history.append(user_message)
+        print("🛰️ Estigia: 📡 ", end="", flush=True)
+        self.output.say(text, lang=self.lang_choice, source="fallback")
+        print()
+        assistant_message = {'role': 'assistant', 'content': text}
+        self.history.append(assistant_message)
+        self.metrics.inc("estigia_turns_total", route="fallback")
+        self._record("fallback", [user_message, assistant_message], prompt=user_text)
+        return text
+
+    def _fail_turn(self, turn, error, fallback):
+        if turn["parts"]:
+            # Cortada a mitad de respuesta: no se reintenta (se repetiría lo ya mostrado)
+            return self._finish_turn(turn, error=error)
+        self.output.end(cancelled=True)
+        print(self.ui["ui_llm_error"].format(error))
+        return self._answer_offline(turn["user_text"], fallback, user_message=turn["user_message"])
+
+    def _stream_request(self):
+        return dict(model=self.model_name, messages=self.history.messages(), options=self.options,
+                    keep_alive=self.keep_alive)
+
+    def chat(self, user_text, context=None, fallback=None):
+        """Turno LLM en streaming; `fallback` (texto o función) contesta si Ollama no está disponible."""
+        if not self._wait_for_model():
+            return self._answer_offline(user_text, fallback)
+
+        turn = self._begin_turn(user_text, context)
+        if turn is None:
+            return None
+
+        try:
+            for chunk in self.llm.stream_chat(**self._stream_request()):
+                self._on_chunk(turn, chunk)
+        except Exception as e:
+            return self._fail_turn(turn, e, fallback)
+        return self._finish_turn(turn)
+
+    async def achat(self, user_text, context=None, fallback=None):
+        """Igual que chat(), pero cancelable.
+
+        Si se cancela la tarea, el stream se cierra en el acto (Ollama ve la desconexión y
+        libera el slot de inferencia) y la respuesta parcial se guarda en el historial.
+        """
+        try:
+            ready = await asyncio.to_thread(self._wait_for_model)
+        except asyncio.CancelledError:
+            print(self.ui["ui_cancel"])
+            raise
+        if not ready:
+            return self._answer_offline(user_text, fallback)
+
+        turn = self._begin_turn(user_text, context)
+        if turn is None:
+            return None
+
+        if self.writer is not None:
+            self.writer.loop = asyncio.get_running_loop()
+        try:
+            response_stream = await self.llm.astream_chat(**self._stream_request())
+            async for chunk in response_stream:
+                self._on_chunk(turn, chunk)
+        except asyncio.CancelledError:
+            self._finish_turn(turn, cancelled=True)
+            raise
+        except Exception as e:
+            return self._fail_turn(turn, e, fallback)
+        finally:
+            if self.writer is not None:
+                self.writer.loop = None
+        return self._finish_turn(turn)
+
+    def _apply(self, settings):
+        self.options = settings.options()
+        if settings.max_context_tokens != self.history.max_tokens:
+            self.history.resize(settings.max_context_tokens)
+        if settings.model != self.model_name:
+            # El modelo nuevo no tiene el system prompt en su KV-cache: se precarga antes de preguntar
+            self.model_name = settings.model
+            self.prefill(self.lang_choice)
+
+    def _write(self, token):
+        self.output.write(token)
+
+    def say(self, text, source="telemetry", prompt=None, metrics=None):
+        # Respuesta completa sin LLM (telemetría): mismo reparto a las salidas que el stream
+        print("🛰️ Estigia: 📡 ", end="", flush=True)
+        self.output.say(text, lang=self.lang_choice, source=source)
+        print()
+        assistant_message = {'role': 'assistant', 'content': text}
+        self.history.append(assistant_message)
+        self._record(source, [assistant_message], prompt=prompt, metrics=metrics)
+
+    def _replay_cached(self, user_text, response):
+        # Misma ruta de impresión que el streaming del LLM, trozo a trozo
+        start_time = time.perf_counter()
+        print("🛰️ Estigia: ", end="", flush=True)
+        self.output.begin(self.lang_choice, source="cache")
+        for token in re.findall(r"\S+\s*|\s+", response):
+            self._write(token)
+        self.output.end()
+        total_time = time.perf_counter() - start_time
+
+        stats = self.response_cache.stats
+        print(self.ui["ui_met_cache"].format(total_time, stats["hits"], stats["hits"] + stats["misses"]))
+        self.metrics.inc("estigia_turns_total", route="cache")
+        messages = [{'role': 'user', 'content': user_text}, {'role': 'assistant', 'content': response}]
+        for message in messages:
+            self.history.append(message)
+        self._record("cache", messages, prompt=user_text, metrics={"total": total_time})
+
+# Durante una respuesta, una línea vacía (Enter) o '/cancel' la cortan; Ctrl-C también
+CANCEL_COMMANDS = ('', '/cancel')
+
+class InputReader:
+    """Lee stdin en un hilo aparte para que el bucle asyncio siga pintando el stream."""
+
+    def __init__(self, loop):
+        self.lines = asyncio.Queue()
+        self.pending = []   # líneas escritas mientras el modelo contestaba
+        threading.Thread(target=self._run, args=(loop,), name="stdin-reader", daemon=True).start()
+
+    def _run(self, loop):
+        while True:
+            line = sys.stdin.readline()
+            if not line:
+                loop.call_soon_threadsafe(self.lines.put_nowait, None)
+                return
+            loop.call_soon_threadsafe(self.lines.put_nowait, line.rstrip("\r\n"))
+
+    async def ask(self, prompt):
+        print(prompt, end="", flush=True)
+        if self.pending:
+            line = self.pending.pop(0)
+            print(line if line is not None else "")
+        else:
+            line = await self.lines.get()
+        return '/stop' if line is None else line
+
+async def stream_turn(coro, reader):
+    # La respuesta corre como tarea; mientras tanto se sigue leyendo la entrada
+    loop = asyncio.get_running_loop()
+    task = asyncio.ensure_future(coro)
+    try:
+        loop.add_signal_handler(signal.SIGINT, task.cancel)
+        sigint = True
+    except (NotImplementedError, RuntimeError):
+        sigint = False   # Windows: solo Enter / '/cancel'
+    try:
+        while not task.done():
+            next_line = asyncio.ensure_future(reader.lines.get())
+            done, _ = await asyncio.wait({task, next_line}, return_when=asyncio.FIRST_COMPLETED)
+            if next_line not in done:
+                next_line.cancel()
+                continue
+            line = next_line.result()
+            if line is not None and line.strip().lower() in CANCEL_COMMANDS:
+                task.cancel()
+            else:
+                # Se contesta al terminar (fin de entrada incluido: la respuesta en curso se completa)
+                reader.pending.append(line)
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    finally:
+        if sigint:
+            loop.remove_signal_handler(signal.SIGINT)
+
+async def repl(estigia, telemetry):
+    reader = InputReader(asyncio.get_running_loop())
 
-def main():
-    print("\n--- STARTING ESTIGIA SYSTEMS ON RASPBERRY PI ---")
-    
-    telemetry = TelemetrySystem()
-    estigia = EstigiaCore(model_name=model) # <-- Pon tu modelo de ollama aquí
-    
     # BUCLE EXTERNO: Menú de selección de idioma
     while True:
         print("\n" + "="*40)
         print("Select communication language:")
         print("1. Español  🇪🇸\n2. Valencià 🦇\n3. English  🇬🇧")
-        lang_choice = input("Option (1/2/3) or '/stop' to quit: ").strip()
+        lang_choice = (await reader.ask("Option (1/2/3), '/resume' or '/stop' to quit: ")).strip()
         
         if lang_choice.lower() in ['/stop', 'exit', 'quit']:
             print("Shutting down... Goodbye!")
             break
-            
-        ui = estigia.set_language(lang_choice)
+
+        if lang_choice.lower() == '/resume':
+            resumed = estigia.resume()
+            if resumed is None:
+                print("❌ No saved session to resume (set session_store_path).")
+                continue
+            ui = estigia.ui
+            lang_choice = estigia.lang_choice
+            print(ui["ui_resume"].format(resumed["loaded"], resumed["turns"]))
+        else:
+            ui = estigia.set_language(lang_choice)
         
         print(ui["ui_ok"])
         print(ui["ui_stop"] + "\n" + "-"*40)
 
         # BUCLE INTERNO: Chat en el idioma seleccionado
         while True:
-            prompt = input(ui["ui_user"])
+            prompt = await reader.ask(ui["ui_user"])
             
             if prompt.lower() in ['/stop', 'exit', 'quit']:
                 print("Shutting down... Goodbye!")
@@ -322,18 +1258,96 @@ def main():
             if not prompt.strip(): continue
 
             tel_start_time = time.perf_counter()
-            category = telemetry.predict(prompt)
-            sensor_data = telemetry.get_data(category, lang_choice)
+            decision = telemetry.route(prompt)
+            cls_time = time.perf_counter() - tel_start_time
+            sensor_data = telemetry.answer(decision, lang_choice, prompt) if decision.route == "telemetry" else None
             tel_end_time = time.perf_counter()
+            REGISTRY.record_classifier(cls_time, ",".join(decision.categories) or "GENERAL_CHAT", lang=lang_choice,
+                                       route=decision.route, reason=decision.reason)
             
             if sensor_data:
-                print(f"🛰️ Estigia: 📡 {sensor_data}")
                 tel_time = tel_end_time - tel_start_time
+                estigia.say(sensor_data, prompt=prompt, metrics={"total": tel_time, "categories": decision.categories})
                 print(ui["ui_met_sen"].format(tel_time))
-                
-                estigia.history.append({'role': 'assistant', 'content': sensor_data})
+                REGISTRY.inc("estigia_turns_total", route="telemetry")
             else:
-                estigia.chat(prompt)
+                context = telemetry.answer(decision, lang_choice, prompt) if decision.route == "context" else None
+                # Solo se calcula si Ollama no está disponible
+                fallback = lambda: context or telemetry.fallback_answer(decision, lang_choice, prompt)
+                await stream_turn(estigia.achat(prompt, context=context, fallback=fallback), reader)
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Estigia chatbot (terminal)")
+    parser.add_argument("--startup-profile", metavar="PATH",
+                        help="escribe en JSON el desglose de tiempos del arranque (cuando el modelo termina de cargar)")
+    args = parser.parse_args()
+
+    profiler = StartupProfiler(t0=STARTUP_T0)
+    profiler.record("imports", STARTUP_T0, time.perf_counter())
+    print("\n--- STARTING ESTIGIA SYSTEMS ON RASPBERRY PI ---")
+
+    # Las fases lentas van en paralelo: el clasificador en un hilo, el import de ollama +
+    # carga del modelo + precarga de prompts en otro. El REPL solo espera al clasificador
+    # (la vía rápida de telemetría); el primer turno LLM espera al modelo si aún no está.
+    telemetry_ready = profiler.run("classifier + sensors", TelemetrySystem, source=open_source(telemetry_source))
+
+    with profiler.phase("metrics, cache, sinks, sessions"):
+        REGISTRY.jsonl_path = metrics_jsonl_path
+        if metrics_port:
+            serve_prometheus(REGISTRY, port=metrics_port)
+            print(f"📈 Metrics available at http://localhost:{metrics_port}/metrics")
+        cache = ResponseCache(response_cache_path) if response_cache_path else None
+        governor = AdaptiveGovernor(model, max_context_tokens=max_context_tokens, light_model=light_model,
+                                    metrics=REGISTRY) if governor_enabled else None
+        output = OutputFanout([TerminalSink()], metrics=REGISTRY)
+        if websocket_port:
+            sink = output.add(WebSocketSink(port=websocket_port))
+            print(f"🌐 Live transcript at http://localhost:{sink.port}/")
+        if tts_command:
+            try:
+                output.add(TTSSink(command=tts_command))
+                print(f"🔊 Speaking each sentence with '{tts_command}'")
+            except FileNotFoundError as e:
+                print(f"⚠️ {e}. Continuing without voice.")
+        sessions = SessionStore(session_store_path) if session_store_path else None
+
+    # Una conexión persistente para todo el proceso; si Ollama cae, se responde con telemetría
+    llm = OllamaClient(connect_timeout=ollama_connect_timeout, read_timeout=ollama_read_timeout,
+                       metrics=REGISTRY).start_health_checks()
+    print(f"🧠 Waking up model '{model}' in Ollama (background)...")
+    estigia = EstigiaCore(model_name=model, max_context_tokens=max_context_tokens, keep_alive=keep_alive, response_cache=cache,
+                          governor=governor, output=output, session_store=sessions,
+                          background_warmup=True, profiler=profiler, llm=llm) # <-- Pon tu modelo de ollama aquí
+
+    with profiler.phase("wait for classifier"):
+        telemetry = telemetry_ready.result()
+    profiler.mark("repl_ready")
+    print(profiler.report())
+
+    def write_profile():
+        # El perfil se escribe cuando el modelo ya está cargado, para que incluya todas las fases
+        estigia._ready.wait(timeout=600)
+        profiler.write(args.startup_profile)
+        print(f"💾 Startup profile written to {args.startup_profile}")
+
+    if args.startup_profile:
+        threading.Thread(target=write_profile, name="startup-profile", daemon=True).start()
+
+    try:
+        asyncio.run(repl(estigia, telemetry))
+    except KeyboardInterrupt:
+        print("\nShutting down... Goodbye!")
+    finally:
+        conn = llm.connection_stats()
+        print(f"🔌 Ollama: {conn['requests']} requests over {conn['new_connections']} connections | "
+              f"{conn['reused']} reused (≈{conn['saved'] * 1000:.1f} ms of connect saved) | "
+              f"retries {conn['retries']} | failures {conn['failures']}")
+        output.close()
+        if sessions is not None:
+            sessions.close()   # vuelca lo que quede en la cola de escritura
+        if cache is not None:
+            cache.close()      # confirma los últimos usos y respuestas pendientes
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
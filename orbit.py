@@ -0,0 +1,154 @@
+import math
+import sys
+import time
+
+import numpy as np
+
+# ==========================================
+# ESTADO ORBITAL: PROPAGADOR KEPLERIANO VECTORIZADO
+# ==========================================
+# Un único juego de elementos orbitales que se propaga en el tiempo (Kepler + deriva
+# secular por J2). Todas las intents ORBIT_GET_* leen de aquí, así que altitud,
+# anomalías, RAAN... son coherentes entre sí. La ecuación de Kepler se resuelve con
+# Newton sobre arrays de NumPy: miles de instantes en una sola llamada.
+#
+#   python orbit.py track [paso_s]     # traza y altitud de la próxima órbita
+
+MU_EARTH = 398600.4418        # km^3/s^2
+R_EARTH = 6378.137            # km
+J2 = 1.08262668e-3
+UNIX_J2000 = 946728000.0      # 2000-01-01 12:00:00 UTC
+
+
+class OrbitalElements:
+    def __init__(self, a=R_EARTH + 500.0, e=0.0012, i=97.4, raan=120.0, argp=90.0, mean_anom=0.0,
+                 epoch=1767225600.0):
+        self.a = a                    # semieje mayor, km
+        self.e = e
+        self.i = i                    # grados
+        self.raan = raan              # grados
+        self.argp = argp              # argumento de perigeo, grados
+        self.mean_anom = mean_anom    # anomalía media en `epoch`, grados
+        self.epoch = epoch            # s (Unix)
+
+
+def solve_kepler(mean_anom, e, tol=1e-12, max_iter=15):
+    """Anomalía excéntrica E (rad) tal que E - e·sin(E) = M, para un array de M (rad)."""
+    mean_anom = np.asarray(mean_anom, dtype=np.float64)
+    E = mean_anom + e * np.sin(mean_anom) if e < 0.8 else np.full_like(mean_anom, math.pi)
+    for _ in range(max_iter):
+        delta = (E - e * np.sin(E) - mean_anom) / (1 - e * np.cos(E))
+        E -= delta
+        if np.max(np.abs(delta), initial=0.0) < tol:
+            break
+    return E
+
+
+def gmst(t):
+    # Tiempo sidéreo medio de Greenwich (rad) para instantes Unix
+    days = (np.asarray(t, dtype=np.float64) - UNIX_J2000) / 86400
+    return np.radians((280.46061837 + 360.98564736629 * days) % 360)
+
+
+class OrbitPropagator:
+    def __init__(self, elements=None, j2=True, resolution=1.0):
+        self.elements = elements or OrbitalElements()
+        self.j2 = j2
+        self.resolution = resolution   # s: state() reutiliza el cálculo dentro de este intervalo
+        self._state = (None, None)     # (instante cuantizado, estado) se sustituye de una vez
+        self._table = None
+        self._rates()
+
+    def _rates(self):
+        el = self.elements
+        self.n = math.sqrt(MU_EARTH / el.a ** 3)      # movimiento medio, rad/s
+        self.period = 2 * math.pi / self.n
+        self.raan_rate = self.argp_rate = 0.0
+        self.mean_rate = self.n
+        if self.j2:
+            k = 1.5 * self.n * J2 * (R_EARTH / (el.a * (1 - el.e ** 2))) ** 2
+            cos_i = math.cos(math.radians(el.i))
+            self.raan_rate = -k * cos_i
+            self.argp_rate = 0.5 * k * (5 * cos_i ** 2 - 1)
+            self.mean_rate = self.n + 0.5 * k * math.sqrt(1 - el.e ** 2) * (3 * cos_i ** 2 - 1)
+
+    def set_elements(self, elements):
+        self.elements = elements
+        self._rates()
+        self._state = (None, None)
+        self._table = None
+
+    def propagate(self, times):
+        """Estado orbital para un array de instantes Unix; cada campo es un array."""
+        el = self.elements
+        dt = np.asarray(times, dtype=np.float64) - el.epoch
+        M = (math.radians(el.mean_anom) + self.mean_rate * dt) % (2 * math.pi)
+        E = solve_kepler(M, el.e)
+        nu = 2 * np.arctan2(math.sqrt(1 + el.e) * np.sin(E / 2), math.sqrt(1 - el.e) * np.cos(E / 2))
+        r = el.a * (1 - el.e * np.cos(E))
+        raan = math.radians(el.raan) + self.raan_rate * dt
+        argp = math.radians(el.argp) + self.argp_rate * dt
+        return {
+            "alt": r - R_EARTH,
+            "radius": r,
+            "ecc": np.full_like(dt, el.e),
+            "inc": np.full_like(dt, el.i),
+            "raan": np.degrees(raan) % 360,
+            "perigee": np.degrees(argp) % 360,
+            "true_anom": np.degrees(nu) % 360,
+            "mean_anom": np.degrees(M),
+            "_u": argp + nu,        # argumento de latitud (rad), para la traza
+            "_raan": raan,
+        }
+
+    def state(self, now=None):
+        """Estado en `now` (por defecto, ahora) con caché de `resolution` segundos; valores float."""
+        now = time.time() if now is None else now
+        key = math.floor(now / self.resolution) if self.resolution else now
+        cached_key, cached = self._state
+        if cached_key == key:
+            return cached
+        state = {k: float(v[0]) for k, v in self.propagate([now]).items() if not k.startswith("_")}
+        self._state = (key, state)
+        return state
+
+    def ground_track(self, start=None, duration=None, step=30.0):
+        """Tabla (t, lat, lon, alt) desde `start` durante `duration` s (por defecto, una órbita)."""
+        start = time.time() if start is None else start
+        duration = self.period if duration is None else duration
+        t = start + np.arange(0.0, duration + step / 2, step)
+        state = self.propagate(t)
+        u, raan, inc = state["_u"], state["_raan"], math.radians(self.elements.i)
+        # Dirección del satélite en el sistema inercial (vector unitario)
+        x = np.cos(raan) * np.cos(u) - np.sin(raan) * np.sin(u) * math.cos(inc)
+        y = np.sin(raan) * np.cos(u) + np.cos(raan) * np.sin(u) * math.cos(inc)
+        z = np.sin(u) * math.sin(inc)
+        lat = np.degrees(np.arcsin(z))
+        lon = (np.degrees(np.arctan2(y, x) - gmst(t)) + 180) % 360 - 180
+        return {"t": t, "lat": lat, "lon": lon, "alt": state["alt"]}
+
+    def next_orbit(self, now=None, step=30.0):
+        """Traza de la próxima órbita, precalculada y reutilizada hasta que se agota."""
+        now = time.time() if now is None else now
+        table = self._table
+        if table is None or table["step"] != step or now < table["t"][0] or now > table["t"][-1]:
+            table = {**self.ground_track(now, self.period, step), "step": step}
+            self._table = table
+        return table
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != "track":
+        print("Usage: python orbit.py track [step_seconds]")
+        sys.exit(1)
+    step = float(sys.argv[2]) if len(sys.argv) > 2 else 60.0
+    orbit = OrbitPropagator()
+    table = orbit.next_orbit(step=step)
+    print(f"🛰️ Next orbit ({orbit.period / 60:.1f} min)")
+    print(f"{'UTC':<10}{'lat':>9}{'lon':>10}{'alt km':>10}")
+    for t, lat, lon, alt in zip(table["t"], table["lat"], table["lon"], table["alt"]):
+        print(f"{time.strftime('%H:%M:%S', time.gmtime(t)):<10}{lat:>9.2f}{lon:>10.2f}{alt:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
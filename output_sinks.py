@@ -0,0 +1,425 @@
+import base64
+import hashlib
+import json
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+# ==========================================
+# SALIDAS DEL STREAM: TERMINAL, WEBSOCKET Y VOZ
+# ==========================================
+# Cada trozo de respuesta (tokens del LLM, datos de telemetría, respuestas de caché)
+# pasa por un OutputFanout que lo reparte entre varias salidas. Un segmentador corta
+# el stream en frases en cuanto se cierran, para que la voz empiece a hablar mucho
+# antes de que el modelo termine. Las salidas lentas (TTS, clientes web) tienen su
+# propia cola acotada y su hilo: si se atascan se descartan eventos viejos, pero el
+# bucle de tokens nunca espera por ellas.
+
+# Abreviaturas frecuentes que no cierran frase
+ABBREVIATIONS = {"sr", "sra", "dr", "dra", "etc", "ej", "p.ej", "aprox", "núm", "mr", "mrs", "vs", "e.g", "i.e"}
+
+SENTENCE_END_RE = re.compile(r"[.!?…]+[\"'»)\]]*(?=\s)|\n+")
+
+
+class SentenceSegmenter:
+    """Acumula texto en streaming y devuelve las frases completas en cuanto se cierran."""
+
+    def __init__(self, min_chars=0):
+        self.min_chars = min_chars      # frases más cortas se juntan con la siguiente
+        self._buffer = ""
+
+    def feed(self, text):
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END_RE.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+            if not candidate:
+                start = match.end()
+                continue
+            words = candidate.rstrip(".").split()
+            if match.group().startswith(".") and words and words[-1].lower() in ABBREVIATIONS:
+                continue
+            if len(candidate) < self.min_chars:
+                continue
+            sentences.append(candidate)
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self):
+        # Lo que quede al terminar la respuesta (última frase sin puntuación)
+        rest, self._buffer = self._buffer.strip(), ""
+        return rest or None
+
+
+class TokenWriter:
+    """Agrupa los tokens del stream y los vuelca a la terminal como mucho cada `interval` segundos."""
+
+    def __init__(self, stream=None, interval=0.05):
+        self.stream = stream        # None = sys.stdout en el momento de escribir
+        self.interval = interval
+        self.loop = None            # con un bucle asyncio, un temporizador vacía lo pendiente
+        self.writes = 0
+        self._buffer = []
+        self._last_flush = 0.0
+        self._handle = None
+
+    def reset(self):
+        # El primer token de una respuesta sale en el acto (no retrasa el TTFT percibido)
+        self._last_flush = 0.0
+
+    def write(self, text):
+        self._buffer.append(text)
+        elapsed = time.perf_counter() - self._last_flush
+        if elapsed >= self.interval:
+            self.flush()
+        elif self.loop is not None and self._handle is None:
+            self._handle = self.loop.call_later(self.interval - elapsed, self.flush)
+
+    def flush(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._buffer:
+            stream = self.stream or sys.stdout
+            stream.write("".join(self._buffer))
+            stream.flush()
+            self._buffer.clear()
+            self.writes += 1
+            self._last_flush = time.perf_counter()
+
+
+class OutputSink:
+    """Interfaz de una salida. `meta` lleva al menos lang y source (llm, telemetry, cache)."""
+    name = "sink"
+
+    def start(self, meta):
+        pass
+
+    def token(self, text):
+        pass
+
+    def sentence(self, text):
+        pass
+
+    def end(self, meta):
+        pass
+
+    def close(self):
+        pass
+
+
+class TerminalSink(OutputSink):
+    # Síncrona: escribir en la terminal es barato y TokenWriter ya agrupa las escrituras
+    name = "terminal"
+
+    def __init__(self, stream=None, interval=0.05):
+        self.writer = TokenWriter(stream, interval)
+
+    def start(self, meta):
+        self.writer.reset()
+
+    def token(self, text):
+        self.writer.write(text)
+
+    def end(self, meta):
+        self.writer.flush()
+
+
+class BufferedSink(OutputSink):
+    """Salida con cola acotada e hilo propio; si la cola se llena se descarta lo más antiguo."""
+    name = "buffered"
+    accepts = ("start", "token", "sentence", "end")
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.delivered = 0
+        self.errors = 0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._busy = False
+        self._thread = threading.Thread(target=self._run, name=f"sink-{self.name}", daemon=True)
+        self._thread.start()
+
+    def _put(self, kind, payload):
+        if kind not in self.accepts:
+            return
+        with self._cond:
+            if len(self._queue) >= self.maxsize:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append((kind, payload))
+            self._cond.notify()
+
+    def start(self, meta):
+        self._put("start", meta)
+
+    def token(self, text):
+        self._put("token", text)
+
+    def sentence(self, text):
+        self._put("sentence", text)
+
+    def end(self, meta):
+        self._put("end", meta)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                kind, payload = self._queue.popleft()
+                self._busy = True
+            try:
+                self.handle(kind, payload)
+                self.delivered += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"\n⚠️ Output sink '{self.name}' failed: {e}", file=sys.stderr)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def handle(self, kind, payload):
+        raise NotImplementedError
+
+    def drain(self, timeout=None):
+        """Espera a que la cola se vacíe; False si vence el plazo."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=1.0)
+
+
+class TTSSink(BufferedSink):
+    """Lee en voz alta cada frase completa (por defecto con espeak-ng, si está instalado)."""
+    name = "tts"
+    accepts = ("start", "sentence")
+    VOICES = {"1": "es", "2": "ca", "3": "en"}
+
+    def __init__(self, command="espeak-ng", speak=None, maxsize=8):
+        if speak is None and shutil.which(command) is None:
+            raise FileNotFoundError(f"TTS command not found: {command}")
+        self.command = command
+        self.speak = speak or self._speak_command
+        self.voice = self.VOICES["3"]
+        super().__init__(maxsize=maxsize)
+
+    def _speak_command(self, text, voice):
+        subprocess.run([self.command, "-v", voice, text], stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, check=False)
+
+    def handle(self, kind, payload):
+        if kind == "start":
+            self.voice = self.VOICES.get(payload.get("lang"), self.voice)
+        else:
+            self.speak(payload, self.voice)
+
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+WS_PAGE = """<!doctype html>
+<meta charset="utf-8"><title>Estigia</title>
+<body style="background:#0b0e14;color:#d7dae0;font:16px monospace;padding:1em">
+<div id="log"></div>
+<script>
+const log = document.getElementById("log");
+const ws = new WebSocket(`ws://${location.host}/`);
+let current = null;
+ws.onmessage = (msg) => {
+  const event = JSON.parse(msg.data);
+  if (event.type === "start") {
+    current = document.createElement("p");
+    current.textContent = event.source === "telemetry" ? "📡 " : "🛰️ ";
+    log.appendChild(current);
+  } else if (event.type === "token" && current) {
+    current.textContent += event.text;
+    window.scrollTo(0, document.body.scrollHeight);
+  }
+};
+</script>
+"""
+
+
+def ws_frame(text):
+    # Trama de texto servidor -> cliente (sin máscara), RFC 6455
+    data = text.encode("utf-8")
+    if len(data) < 126:
+        header = bytes([0x81, len(data)])
+    elif len(data) < 1 << 16:
+        header = bytes([0x81, 126]) + len(data).to_bytes(2, "big")
+    else:
+        header = bytes([0x81, 127]) + len(data).to_bytes(8, "big")
+    return header + data
+
+
+class WebSocketSink(BufferedSink):
+    """Reenvía el stream como eventos JSON a los navegadores conectados (GET / sirve una página mínima)."""
+    name = "websocket"
+
+    def __init__(self, host="0.0.0.0", port=8765, maxsize=512, send_timeout=1.0):
+        self.send_timeout = send_timeout
+        self.clients = []
+        self._clients_lock = threading.Lock()
+        self._server = socket.create_server((host, port))
+        self.port = self._server.getsockname()[1]
+        threading.Thread(target=self._accept, name="sink-websocket-accept", daemon=True).start()
+        super().__init__(maxsize=maxsize)
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handshake, args=(conn,), daemon=True).start()
+
+    def _handshake(self, conn):
+        try:
+            conn.settimeout(5.0)
+            request = b""
+            while b"\r\n\r\n" not in request and len(request) < 8192:
+                chunk = conn.recv(1024)
+                if not chunk:
+                    raise ConnectionError("closed during handshake")
+                request += chunk
+            headers = {}
+            for line in request.decode("latin-1").split("\r\n")[1:]:
+                if ":" in line:
+                    key, value = line.split(":", 1)
+                    headers[key.strip().lower()] = value.strip()
+            key = headers.get("sec-websocket-key")
+            if key is None:
+                page = WS_PAGE.encode("utf-8")
+                conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n"
+                             b"Content-Length: " + str(len(page)).encode() + b"\r\nConnection: close\r\n\r\n" + page)
+                conn.close()
+                return
+            accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode("ascii")).digest()).decode("ascii")
+            conn.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                          f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode("ascii"))
+            conn.settimeout(self.send_timeout)
+            with self._clients_lock:
+                self.clients.append(conn)
+        except OSError:
+            conn.close()
+
+    def handle(self, kind, payload):
+        if kind in ("start", "end"):
+            event = {"type": kind, **payload}
+        else:
+            event = {"type": kind, "text": payload}
+        frame = ws_frame(json.dumps(event, ensure_ascii=False))
+        with self._clients_lock:
+            clients = list(self.clients)
+        for conn in clients:
+            try:
+                conn.sendall(frame)
+            except OSError:
+                # Cliente caído o demasiado lento (send_timeout): se desconecta
+                with self._clients_lock:
+                    if conn in self.clients:
+                        self.clients.remove(conn)
+                conn.close()
+
+    def close(self):
+        super().close()
+        self._server.close()
+        with self._clients_lock:
+            for conn in self.clients:
+                conn.close()
+            self.clients.clear()
+
+
+class OutputFanout:
+    """Reparte cada trozo de respuesta entre las salidas y mide TTFT y tiempo hasta la primera frase."""
+
+    def __init__(self, sinks=(), metrics=None, min_sentence_chars=0):
+        self.sinks = list(sinks)
+        self.metrics = metrics
+        self.segmenter = SentenceSegmenter(min_sentence_chars)
+        self._meta = {}
+        self._start = None
+        self._first_token = None
+        self._first_sentence = None
+        self._sentences = 0
+
+    def add(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def begin(self, lang=None, source="llm"):
+        self._meta = {"lang": lang, "source": source}
+        self._start = time.perf_counter()
+        self._first_token = self._first_sentence = None
+        self._sentences = 0
+        self.segmenter.flush()
+        for sink in self.sinks:
+            sink.start(self._meta)
+
+    def write(self, text):
+        if self._first_token is None:
+            self._first_token = time.perf_counter()
+        for sink in self.sinks:
+            sink.token(text)
+        for sentence in self.segmenter.feed(text):
+            self._emit_sentence(sentence)
+
+    def _emit_sentence(self, sentence):
+        if self._first_sentence is None:
+            self._first_sentence = time.perf_counter()
+        self._sentences += 1
+        for sink in self.sinks:
+            sink.sentence(sentence)
+
+    def end(self, **meta):
+        """Cierra la respuesta (emite la última frase pendiente); devuelve ttft, ttfs y nº de frases."""
+        rest = self.segmenter.flush()
+        if rest:
+            self._emit_sentence(rest)
+        start = self._start if self._start is not None else time.perf_counter()
+        stats = {
+            "ttft": self._first_token - start if self._first_token else None,
+            "ttfs": self._first_sentence - start if self._first_sentence else None,
+            "sentences": self._sentences,
+        }
+        for sink in self.sinks:
+            sink.end({**self._meta, **meta, **stats})
+        if self.metrics is not None and stats["ttfs"] is not None and self._meta.get("source") == "llm":
+            self.metrics.observe("ttfs", stats["ttfs"])
+        return stats
+
+    def say(self, text, lang=None, source="telemetry"):
+        # Mensaje completo de una vez (telemetría, avisos)
+        self.begin(lang, source)
+        self.write(text)
+        return self.end()
+
+    def stats(self):
+        return {sink.name: {"dropped": sink.dropped, "delivered": sink.delivered, "errors": sink.errors}
+                for sink in self.sinks if isinstance(sink, BufferedSink)}
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# ==========================================
+# CACHÉ DE RESPUESTAS (LRU + TTL + SQLITE)
+# ==========================================
+# En las jornadas de divulgación se repiten las mismas preguntas cientos de veces.
+# La caché guarda la respuesta del LLM por (modelo, idioma, pregunta normalizada,
+# huella de los últimos mensajes) y la reutiliza sin volver a generar.
+# En la tarjeta SD de la Pi cada commit es un fsync: los aciertos solo actualizan `last_used`
+# en memoria y las escrituras se confirman por lotes (y siempre al cerrar).
+
+
+def normalize_prompt(text):
+    # Minúsculas, sin signos de puntuación y con espacios colapsados; se conservan las tildes
+    text = unicodedata.normalize("NFC", text).lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+class ResponseCache:
+    COMMIT_EVERY = 32       # escrituras pendientes antes de confirmar
+    COMMIT_INTERVAL = 30.0  # s: pasado este tiempo, la siguiente operación confirma lo pendiente
+
+    def __init__(self, path=None, max_entries=512, ttl=24 * 3600, fingerprint_messages=2):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fingerprint_messages = fingerprint_messages
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+        self._entries = OrderedDict()   # clave -> (respuesta, creada)
+        self._touched = {}              # clave -> último uso aún no escrito en SQLite
+        self._pending = 0               # escrituras sin confirmar
+        self._last_commit = time.monotonic()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._open(path)
+
+    def _open(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, response TEXT NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        # Se descartan las caducadas y se cargan las más recientes en orden LRU
+        self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        rows = self._db.execute(
+            "SELECT key, response, created FROM responses ORDER BY last_used DESC LIMIT ?",
+            (self.max_entries,)
+        ).fetchall()
+        for key, response, created in reversed(rows):
+            self._entries[key] = (response, created)
+        self._db.execute(
+            "DELETE FROM responses WHERE key NOT IN (SELECT key FROM responses ORDER BY last_used DESC LIMIT ?)",
+            (self.max_entries,)
+        )
+        self._db.commit()
+
+    def key(self, namespace, lang, prompt, history):
+        # Huella corta del contexto: los últimos mensajes antes de la pregunta (sin el system prompt)
+        recent = [m for m in history if m['role'] != 'system'][-self.fingerprint_messages:] \
+            if self.fingerprint_messages else []
+        fingerprint = json.dumps([[m['role'], normalize_prompt(m['content'])] for m in recent], ensure_ascii=False)
+        raw = "\x1f".join([namespace, lang, normalize_prompt(prompt), fingerprint])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            response, created = entry
+            now = time.time()
+            if now - created > self.ttl:
+                del self._entries[key]
+                self._delete(key)
+                self._maybe_commit()
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            if self._db is not None:
+                self._touched[key] = now
+                self._maybe_commit()
+            self.stats["hits"] += 1
+            return response
+
+    def put(self, key, response):
+        if not response.strip():
+            return
+        with self._lock:
+            now = time.time()
+            self._entries[key] = (response, now)
+            self._entries.move_to_end(key)
+            self._touched.pop(key, None)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+                    (key, response, now, now)
+                )
+                self._pending += 1
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._delete(old_key)
+                self.stats["evictions"] += 1
+            self._maybe_commit()
+
+    def _delete(self, key):
+        self._touched.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._pending += 1
+
+    def _maybe_commit(self, force=False):
+        # Vuelca los `last_used` acumulados y confirma si toca (llamar con el lock tomado)
+        if self._db is None:
+            return
+        pending = self._pending + len(self._touched)
+        if not pending:
+            return
+        if not force and pending < self.COMMIT_EVERY and time.monotonic() - self._last_commit < self.COMMIT_INTERVAL:
+            return
+        if self._touched:
+            self._db.executemany("UPDATE responses SET last_used = ? WHERE key = ?",
+                                 [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+        self._db.commit()
+        self._pending = 0
+        self._last_commit = time.monotonic()
+
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._maybe_commit(force=True)
+                self._db.close()
+                self._db = None
@@ -0,0 +1,257 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+# ==========================================
+# SESIONES PERSISTENTES (SQLITE WAL, SOLO AÑADIR)
+# ==========================================
+# Cada turno (mensajes que entraron en el historial, ruta, idioma y métricas) se
+# añade a una tabla que nunca se reescribe. Las escrituras se agrupan en un hilo
+# aparte (write-behind): el bucle de tokens solo deja el turno en una lista.
+# Para retomar una sesión se leen los turnos desde el final hacia atrás hasta
+# llenar la ventana de contexto; el resto de la conversación no se toca.
+#
+#   python session_store.py list sessions/estigia.sqlite
+#   python session_store.py show sessions/estigia.sqlite [session_id]
+
+MESSAGE_OVERHEAD = 4  # igual que ConversationWindow
+
+
+def estimate_message_tokens(messages, chars_per_token=3.0):
+    return sum(int(len(m['content']) / chars_per_token) + 1 + MESSAGE_OVERHEAD for m in messages)
+
+
+class SessionStore:
+    def __init__(self, path, flush_interval=1.0, max_batch=64, chars_per_token=3.0):
+        self.path = path
+        self.flush_interval = flush_interval   # s máximos que un turno espera en memoria
+        self.max_batch = max_batch             # con tantos turnos pendientes se escribe ya
+        self.chars_per_token = chars_per_token
+        self.stats = {"turns": 0, "batches": 0, "write_time": 0.0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Con WAL, NORMAL no pierde integridad ante un corte; como mucho los últimos commits
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, lang TEXT NOT NULL, model TEXT,"
+            " created REAL NOT NULL, updated REAL NOT NULL, turns INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            " session_id TEXT NOT NULL, seq INTEGER NOT NULL, ts REAL NOT NULL,"
+            " lang TEXT NOT NULL, route TEXT NOT NULL, prompt TEXT,"
+            " messages TEXT NOT NULL, tokens INTEGER NOT NULL, metrics TEXT,"
+            " PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+        self._db.commit()
+        self._db_lock = threading.Lock()
+
+        self._pending = []                     # ("session" | "turn", fila) en orden de llegada
+        self._seq = {}                         # session_id -> último seq asignado
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        self._thread.start()
+
+    # --- Escritura (write-behind) ---
+
+    def _enqueue(self, kind, row):
+        with self._cond:
+            self._pending.append((kind, row))
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    def new_session(self, lang, model=None, session_id=None):
+        session_id = session_id or uuid.uuid4().hex
+        self._seq[session_id] = 0
+        self._enqueue("session", (session_id, lang, model, time.time()))
+        return session_id
+
+    def record_turn(self, session_id, route, lang, messages, prompt=None, metrics=None):
+        """Añade un turno; `messages` son los mensajes tal como entraron en el historial."""
+        if session_id not in self._seq:
+            last = self._last_seq(session_id)
+            with self._cond:
+                self._seq.setdefault(session_id, last)
+        with self._cond:
+            self._seq[session_id] += 1
+            seq = self._seq[session_id]
+        row = (session_id, seq, time.time(), lang, route, prompt,
+               json.dumps(messages, ensure_ascii=False),
+               estimate_message_tokens(messages, self.chars_per_token),
+               json.dumps(metrics, ensure_ascii=False, default=str) if metrics else None)
+        self._enqueue("turn", row)
+        self.stats["turns"] += 1
+
+    def reset(self, session_id, lang):
+        # Cambio de idioma dentro de la misma sesión: al retomar no se lee más atrás de esta marca
+        self.record_turn(session_id, "reset", lang, [])
+
+    def _last_seq(self, session_id):
+        # Sin seq en memoria no puede haber turnos suyos pendientes: basta con lo escrito
+        with self._db_lock:
+            row = self._db.execute("SELECT MAX(seq) FROM turns WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] or 0
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._pending) < self.max_batch:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self):
+        """Escribe ya lo pendiente (una transacción para todo el lote)."""
+        # El lote se toma con la conexión bloqueada: dos flush a la vez no se adelantan entre sí
+        with self._db_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            t0 = time.perf_counter()
+            for kind, row in batch:
+                if kind == "session":
+                    session_id, lang, model, now = row
+                    self._db.execute(
+                        "INSERT OR IGNORE INTO sessions (id, lang, model, created, updated) VALUES (?, ?, ?, ?, ?)",
+                        (session_id, lang, model, now, now)
+                    )
+                else:
+                    self._db.execute("INSERT INTO turns VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+                    self._db.execute(
+                        "UPDATE sessions SET updated = ?, turns = MAX(turns, ?), lang = ? WHERE id = ?",
+                        (row[2], row[1], row[3], row[0])
+                    )
+            self._db.commit()
+            self.stats["batches"] += 1
+            self.stats["write_time"] += time.perf_counter() - t0
+        return len(batch)
+
+    def _flush_pending(self, session_id):
+        # Las lecturas de una sesión solo fuerzan la escritura si tiene filas sin escribir
+        with self._cond:
+            pending = any(row[0] == session_id for _, row in self._pending)
+        if pending:
+            self.flush()
+
+    # --- Lectura ---
+
+    def latest_session(self):
+        self.flush()
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT id, lang, model, created, updated, turns FROM sessions ORDER BY updated DESC LIMIT 1"
+            ).fetchone()
+        return self._session_dict(row)
+
+    def session_info(self, session_id):
+        self._flush_pending(session_id)
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT id, lang, model, created, updated, turns FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        return self._session_dict(row)
+
+    def sessions(self, limit=20):
+        self.flush()
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT id, lang, model, created, updated, turns FROM sessions ORDER BY updated DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [self._session_dict(row) for row in rows]
+
+    @staticmethod
+    def _session_dict(row):
+        if row is None:
+            return None
+        keys = ("id", "lang", "model", "created", "updated", "turns")
+        return dict(zip(keys, row))
+
+    def load_tail(self, session_id, max_tokens):
+        """Mensajes de los últimos turnos que caben en `max_tokens` (en orden), leyendo desde el final."""
+        self._flush_pending(session_id)
+        messages, total, loaded, last_seq = [], 0, 0, None
+        with self._db_lock:
+            # El cursor va trayendo filas bajo demanda: se para en cuanto se llena la ventana
+            cursor = self._db.execute(
+                "SELECT seq, route, messages, tokens FROM turns WHERE session_id = ? ORDER BY seq DESC", (session_id,)
+            )
+            for seq, route, raw, tokens in cursor:
+                if last_seq is None:
+                    last_seq = seq
+                if route == "reset":
+                    break
+                if loaded and total + tokens > max_tokens:
+                    break
+                messages[:0] = json.loads(raw)
+                total += tokens
+                loaded += 1
+            cursor.close()
+        # El siguiente record_turn ya no tiene que consultar la base de datos
+        with self._cond:
+            self._seq.setdefault(session_id, last_seq or 0)
+        return {"messages": messages, "turns": loaded, "tokens": total, "seq": last_seq or 0}
+
+    def turns(self, session_id):
+        self.flush()
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT seq, ts, lang, route, prompt, messages, metrics FROM turns WHERE session_id = ? ORDER BY seq",
+                (session_id,)
+            ).fetchall()
+        return [{"seq": seq, "ts": ts, "lang": lang, "route": route, "prompt": prompt,
+                 "messages": json.loads(messages), "metrics": json.loads(metrics) if metrics else None}
+                for seq, ts, lang, route, prompt, messages, metrics in rows]
+
+    def close(self):
+        if self._closed:
+            return
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+        with self._db_lock:
+            self._db.close()
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ("list", "show"):
+        print("Usage: python session_store.py list <db> | show <db> [session_id]")
+        sys.exit(1)
+    store = SessionStore(sys.argv[2])
+    try:
+        if sys.argv[1] == "list":
+            for s in store.sessions():
+                print(f"{s['id']}  lang {s['lang']}  turns {s['turns']:>4}  "
+                      f"updated {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(s['updated']))}")
+            return
+        info = store.session_info(sys.argv[3]) if len(sys.argv) > 3 else store.latest_session()
+        if info is None:
+            print("❌ Session not found.")
+            sys.exit(1)
+        print(f"🗂️ Session {info['id']} ({info['turns']} turns, lang {info['lang']})")
+        for turn in store.turns(info["id"]):
+            print(f"\n#{turn['seq']} [{turn['route']}] {time.strftime('%H:%M:%S', time.localtime(turn['ts']))}")
+            for message in turn["messages"]:
+                print(f"  {message['role']}: {message['content']}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
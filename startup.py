@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+# ==========================================
+# ARRANQUE: FASES EN PARALELO E INFORME DE TIEMPOS
+# ==========================================
+# En frío, la Raspberry Pi tarda en importar el cliente de Ollama, cargar el modelo
+# y preparar el clasificador. Cada fase se mide aquí (en qué hilo, cuándo empieza y
+# cuándo acaba) para poder lanzar en paralelo las que no dependen entre sí y ver qué
+# queda en el camino crítico hasta que el usuario puede escribir.
+
+
+class StartupProfiler:
+    def __init__(self, t0=None):
+        self.t0 = time.perf_counter() if t0 is None else t0   # perf_counter del inicio del proceso
+        self.wall_t0 = time.time() - (time.perf_counter() - self.t0)
+        self.phases = []
+        self.marks = {}
+        self._lock = threading.Lock()
+
+    def now(self):
+        return time.perf_counter() - self.t0
+
+    def record(self, name, start, end, detail=None):
+        # start / end en perf_counter absoluto
+        with self._lock:
+            self.phases.append({
+                "name": name,
+                "detail": detail,
+                "thread": threading.current_thread().name,
+                "start": start - self.t0,
+                "end": end - self.t0,
+                "duration": end - start,
+            })
+
+    @contextmanager
+    def phase(self, name):
+        """Mide un bloque; se puede añadir un detalle con `info["detail"] = ...`."""
+        info = {"detail": None}
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            self.record(name, start, time.perf_counter(), info["detail"])
+
+    def mark(self, name):
+        with self._lock:
+            self.marks[name] = self.now()
+
+    def run(self, name, fn, *args, **kwargs):
+        """Ejecuta `fn` en un hilo propio dentro de la fase `name`; devuelve un Future."""
+        future = Future()
+
+        def target():
+            try:
+                with self.phase(name):
+                    result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+        threading.Thread(target=target, name=name, daemon=True).start()
+        return future
+
+    def report(self, width=30):
+        with self._lock:
+            phases = sorted(self.phases, key=lambda p: p["start"])
+            marks = dict(self.marks)
+        total = max([p["end"] for p in phases] + list(marks.values()) + [1e-9])
+        ready = marks.get("repl_ready")
+        title = f"⏱️ Startup breakdown" + (f" (prompt ready at {ready:.2f}s)" if ready is not None else "")
+        lines = [title, f"   {'phase':<34}{'thread':<16}{'start':>7}{'end':>7}{'time':>7}  timeline"]
+        for p in phases:
+            name = p["name"] + (f" ({p['detail']})" if p["detail"] else "")
+            first = int(p["start"] / total * width)
+            length = max(1, int(round(p["duration"] / total * width)))
+            bar = " " * first + "█" * min(length, width - first)
+            lines.append(f"   {name[:33]:<34}{p['thread'][:15]:<16}{p['start']:>7.2f}{p['end']:>7.2f}"
+                         f"{p['duration']:>7.2f}  |{bar:<{width}}|")
+        for name, at in sorted(marks.items(), key=lambda m: m[1]):
+            lines.append(f"   ▸ {name:<32}{'':<16}{at:>7.2f}")
+        return "\n".join(lines)
+
+    def as_dict(self):
+        with self._lock:
+            return {"started_at": self.wall_t0, "phases": list(self.phases), "marks": dict(self.marks)}
+
+    def write(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(), f, indent=2, ensure_ascii=False)
+        return path
@@ -0,0 +1,351 @@
+import json
+import math
+import os
+import random
+import re
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+from orbit import OrbitPropagator
+
+# ==========================================
+# TELEMETRÍA: FUENTES + MUESTREADOR + BUFFERS CIRCULARES
+# ==========================================
+# Un hilo en segundo plano lee la fuente (simulada, fichero grabado o UDP) y escribe
+# cada canal en su buffer circular de NumPy. El chat solo lee: el último valor es una
+# lectura sin cerrojos y las preguntas tipo "máxima en los últimos 10 minutos" se
+# resuelven con una reducción vectorizada sobre la ventana.
+#
+#   python telemetry_store.py record pase.jsonl --seconds 600      # graba la fuente simulada
+#   python telemetry_store.py replay pase.jsonl --udp 127.0.0.1:9870 # reenvía un pase por UDP
+
+CHANNELS = ("alt", "temp", "ecc", "inc", "raan", "perigee", "true_anom", "mean_anom", "current")
+# Canales en grados: la media se calcula como media circular
+ANGLE_CHANNELS = frozenset({"raan", "perigee", "true_anom", "mean_anom"})
+
+# Canales que salen del propagador orbital cuando la fuente es simulada
+ORBIT_CHANNELS = ("alt", "ecc", "inc", "raan", "perigee", "true_anom", "mean_anom")
+
+
+class RingBuffer:
+    """Buffer circular de un canal: un único escritor (el muestreador) y lectores sin cerrojo."""
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.count = 0   # muestras escritas en total; se publica después de escribir la muestra
+
+    def append(self, timestamp, value):
+        i = self.count % self.capacity
+        self.times[i] = timestamp
+        self.values[i] = value
+        self.count += 1
+
+    def latest(self):
+        count = self.count
+        if not count:
+            return None
+        i = (count - 1) % self.capacity
+        return self.times[i], self.values[i]
+
+    def window(self, seconds, now=None):
+        """Copia (tiempos, valores) de las muestras con antigüedad <= seconds."""
+        count = self.count
+        n = min(count, self.capacity)
+        if not n:
+            return self.times[:0], self.values[:0]
+        now = time.time() if now is None else now
+        if count <= self.capacity:
+            times, values = self.times[:n].copy(), self.values[:n].copy()
+        else:
+            start = count % self.capacity
+            times = np.concatenate((self.times[start:], self.times[:start]))
+            values = np.concatenate((self.values[start:], self.values[:start]))
+        # Si el escritor ha dado la vuelta mientras copiábamos, las muestras pisadas son
+        # las más antiguas; el filtro por tiempo las descarta igualmente
+        mask = times >= now - seconds
+        return times[mask], values[mask]
+
+
+class TelemetryStore:
+    def __init__(self, channels=CHANNELS, capacity=4096):
+        self.buffers = {channel: RingBuffer(capacity) for channel in channels}
+
+    def record(self, timestamp, values):
+        for channel, value in values.items():
+            buffer = self.buffers.get(channel)
+            if buffer is not None and value is not None:
+                buffer.append(timestamp, float(value))
+
+    def latest(self, channel):
+        sample = self.buffers[channel].latest()
+        return None if sample is None else sample[1]
+
+    def stats(self, channel, seconds, now=None):
+        _, values = self.buffers[channel].window(seconds, now)
+        if not len(values):
+            return None
+        if channel in ANGLE_CHANNELS:
+            radians = np.radians(values)
+            avg = math.degrees(math.atan2(np.sin(radians).mean(), np.cos(radians).mean())) % 360
+        else:
+            avg = float(values.mean())
+        return {"min": float(values.min()), "max": float(values.max()), "avg": avg, "n": int(len(values))}
+
+
+# --- FUENTES ---
+# read() devuelve la lista de muestras (timestamp, {canal: valor}) disponibles desde la
+# última llamada; puede estar vacía. `exhausted` indica que la fuente ya no dará más.
+
+class SimulatedSource:
+    """Órbita propagada (orbit.py) más ciclo térmico y de consumo ligados al periodo orbital."""
+
+    def __init__(self, seed=None, epoch=None, orbit=None):
+        self.rng = random.Random(seed)
+        self.orbit = orbit or OrbitPropagator()
+        self.epoch = time.time() if epoch is None else epoch
+        self.phase = self.rng.uniform(0, 2 * math.pi)
+        self.exhausted = False
+
+    def sample(self, now):
+        t = now - self.epoch
+        sun = math.sin(2 * math.pi * t / self.orbit.period + self.phase)   # día/eclipse
+        state = self.orbit.state(now)
+        return {
+            **{channel: state[channel] for channel in ORBIT_CHANNELS},
+            "temp": 27.5 + 9 * sun + self.rng.gauss(0, 0.3),
+            "current": 1.0 + 0.3 * max(sun, 0) + self.rng.gauss(0, 0.03),
+        }
+
+    def read(self):
+        now = time.time()
+        return [(now, self.sample(now))]
+
+
+class FileReplaySource:
+    """Reproduce un pase grabado (JSONL con "t" y canales) respetando su ritmo original."""
+
+    def __init__(self, path, speed=1.0, loop=True):
+        with open(path, encoding="utf-8") as f:
+            self.records = [json.loads(line) for line in f if line.strip()]
+        if not self.records:
+            raise ValueError(f"{path} has no telemetry records")
+        self.speed = speed
+        self.loop = loop
+        self.exhausted = False
+        self._t0 = self.records[0].get("t", 0.0)
+        self._span = self.records[-1].get("t", 0.0) - self._t0
+        self._start = time.time()
+        self._next = 0
+
+    def read(self):
+        now = time.time()
+        samples = []
+        while not self.exhausted:
+            record = self.records[self._next]
+            due = self._start + (record.get("t", self._t0) - self._t0) / self.speed
+            if due > now:
+                break
+            samples.append((due, {k: v for k, v in record.items() if k != "t"}))
+            self._next += 1
+            if self._next == len(self.records):
+                if not self.loop:
+                    self.exhausted = True
+                    break
+                # Siguiente vuelta justo después de la última muestra
+                self._next = 0
+                self._start += (self._span + 1.0) / self.speed
+        return samples
+
+
+class UdpSource:
+    """Recibe muestras JSON por UDP (una por datagrama), p. ej. de la estación o de `replay --udp`."""
+
+    def __init__(self, host="0.0.0.0", port=9870):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+        self.exhausted = False
+
+    def read(self):
+        samples = []
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                return samples
+            try:
+                record = json.loads(data)
+            except ValueError:
+                continue
+            # La hora de recepción manda: los relojes de a bordo y de tierra no coinciden
+            record.pop("t", None)
+            samples.append((time.time(), record))
+
+    def close(self):
+        self.sock.close()
+
+
+def open_source(spec=None):
+    """None -> simulada; 'udp://host:puerto' -> UDP; cualquier otra cosa -> fichero JSONL grabado."""
+    if not spec:
+        return SimulatedSource()
+    if spec.startswith("udp://"):
+        host, _, port = spec[len("udp://"):].rpartition(":")
+        return UdpSource(host or "0.0.0.0", int(port))
+    return FileReplaySource(spec)
+
+
+class TelemetrySampler:
+    """Hilo que vuelca la fuente en el TelemetryStore cada `interval` segundos."""
+
+    def __init__(self, source, store, interval=1.0):
+        self.source = source
+        self.store = store
+        self.interval = interval
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        for timestamp, values in self.source.read():
+            self.store.record(timestamp, values)
+            self.samples += 1
+
+    def start(self):
+        # Primera lectura síncrona: get_data ya tiene datos nada más arrancar
+        self.poll()
+        self._thread = threading.Thread(target=self._run, name="telemetry-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"⚠️ Telemetry sampler error: {e}")
+            if self.source.exhausted:
+                return
+
+
+# --- CONSULTAS SOBRE VENTANAS ---
+
+DURATION_RE = re.compile(
+    r"(\d+(?:[.,]\d+)?)\s*(h|horas?|hores?|hours?|min|minutos?|minuts?|minutes?|s|segundos?|segons?|seconds?)\b"
+)
+LAST_HOUR_RE = re.compile(r"\b(?:última|ultima|darrera|last|past)\s+(?:hora|hour)\b")
+# Palabras completas (o raíces como "máxim" -> máximo/máxima): por subcadena, "speak"
+# contenía "peak" e "immediately" contenía "media"
+STAT_WORDS = {
+    "min": (r"m[íi]nim\w*", r"minimum", r"lowest", r"más baj\w*", r"més baix\w*"),
+    "max": (r"m[áà]xim\w*", r"maxim\w*", r"highest", r"peak", r"más alt\w*", r"més alt\w*"),
+    # "I mean..." es el verbo, no la media
+    "avg": (r"media", r"medio", r"promedio", r"mitjana", r"mitjà", r"average",
+            r"(?<!\bi )(?<!\bwe )(?<!\byou )(?<!\bthey )mean"),
+}
+STAT_RES = {name: re.compile(r"\b(?:" + "|".join(words) + r")\b") for name, words in STAT_WORDS.items()}
+# "Anomalía media" es un canal, no un promedio
+MEAN_ANOMALY_RE = re.compile(r"\bmean\s+anomal\w*|\banomal\w*\s+(?:media|mitjana)\b")
+GAP_RE = re.compile(r"^[^,.;:!?¿¡]*$")
+MAX_GAP_WORDS = 3
+DEFAULT_WINDOW = 10 * 60
+
+
+def _near(text, span, channel_pattern):
+    # ¿Hay un canal a pocas palabras (sin puntuación de por medio) de la palabra estadística?
+    start, end = span
+    for m in channel_pattern.finditer(text):
+        gap = text[m.end():start] if m.end() <= start else text[end:m.start()] if m.start() >= end else None
+        if gap is not None and GAP_RE.match(gap) and len(gap.split()) <= MAX_GAP_WORDS:
+            return True
+    return False
+
+
+def parse_window_query(prompt, channel_pattern=None):
+    """('min'|'max'|'avg'|None, segundos) si la pregunta pide un resumen temporal, o None.
+
+    Hace falta una duración ("últimos 10 min", "last hour") o una palabra estadística
+    junto a un canal de `channel_pattern` ("temperatura máxima").
+    """
+    text = prompt.lower()
+    match = DURATION_RE.search(text)
+    seconds = None
+    if match:
+        amount = float(match.group(1).replace(",", "."))
+        unit = match.group(2)
+        scale = 3600 if unit.startswith("h") else 1 if unit.startswith("s") else 60
+        seconds = amount * scale
+        # Sin la duración, "10 min" no se confunde con "mínimo" (mismo largo: no mueve posiciones)
+        text = text[:match.start()] + " " * (match.end() - match.start()) + text[match.end():]
+    elif LAST_HOUR_RE.search(text):
+        seconds = 3600
+
+    excluded = [m.span() for m in MEAN_ANOMALY_RE.finditer(text)]
+    stat = None
+    for name, pattern in STAT_RES.items():
+        for m in pattern.finditer(text):
+            if any(a <= m.start() < b for a, b in excluded):
+                continue
+            if seconds is None and (channel_pattern is None or not _near(text, m.span(), channel_pattern)):
+                continue
+            stat = name
+            break
+        if stat is not None:
+            break
+    if stat is None and seconds is None:
+        return None
+    return stat, seconds or DEFAULT_WINDOW
+
+
+def record(path, seconds, interval=1.0):
+    # Graba la fuente simulada en JSONL (acelerado: no espera entre muestras)
+    source = SimulatedSource()
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(int(seconds / interval)):
+            t = source.epoch + i * interval
+            f.write(json.dumps({"t": t, **source.sample(t)}) + "\n")
+
+
+def replay_udp(path, address, speed=1.0):
+    host, _, port = address.rpartition(":")
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    source = FileReplaySource(path, speed=speed, loop=False)
+    while not source.exhausted:
+        for _, values in source.read():
+            sock.sendto(json.dumps(values).encode("utf-8"), (host, int(port)))
+        time.sleep(0.05)
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ("record", "replay"):
+        print("Usage: python telemetry_store.py record <pass.jsonl> [--seconds N]\n"
+              "       python telemetry_store.py replay <pass.jsonl> --udp host:port [--speed X]")
+        sys.exit(1)
+    args = sys.argv[3:]
+
+    def option(name, default):
+        return args[args.index(name) + 1] if name in args else default
+
+    path = sys.argv[2]
+    if sys.argv[1] == "record":
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        record(path, float(option("--seconds", 600)))
+        print(f"✅ Recorded simulated pass -> {path}")
+    else:
+        replay_udp(path, option("--udp", "127.0.0.1:9870"), float(option("--speed", 1.0)))
+
+
+if __name__ == "__main__":
+    main()